@@ -4,6 +4,8 @@ import numpy as np
 import pydicom
 import random
 
+from preprocessing import normalize_to_uint8, save_params
+
 
 INPUT_DIR = "xrays"
 OUTPUT_DIR = "xrays_processed"
@@ -54,16 +56,13 @@ for i, path in enumerate(image_paths):
 
 min_h, min_w = int(min_h), int(min_w)
 print(f"[INFO] Target resolution set to {min_w} x {min_h}")
+save_params("cleaner", {"target_size": [min_w, min_h]})
 
 print("[INFO] Beginning image preprocessing...")
 for i, path in enumerate(image_paths):
     try:
         ds = pydicom.dcmread(path)
-        img = ds.pixel_array.astype(np.float32)
-
-        img -= img.min()
-        img /= (img.max() + 1e-8)
-        img = (img * 255).astype(np.uint8)
+        img = normalize_to_uint8(ds.pixel_array)
 
         img = cv2.resize(img, (min_w, min_h), interpolation=cv2.INTER_AREA)
 
@@ -3,10 +3,11 @@ import cv2
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from skimage.measure import shannon_entropy
 from sklearn.preprocessing import MinMaxScaler
 from tqdm import tqdm
 
+from preprocessing import quality_metrics, save_params
+
 IMG_DIR = "xrays_processed"
 OUTPUT_CSV = "image_acquisition_metrics.csv"
 
@@ -24,18 +25,7 @@ for fname in tqdm(image_files, desc="Computing metrics"):
     if img is None:
         continue
 
-    blur = cv2.Laplacian(img, cv2.CV_64F).var()
-    brightness = img.mean()
-    contrast = img.std()
-    entropy = shannon_entropy(img)
-
-    records.append({
-        "image": fname,
-        "blur": blur,
-        "brightness": brightness,
-        "contrast": contrast,
-        "entropy": entropy
-    })
+    records.append({"image": fname, **quality_metrics(img)})
 
 df = pd.DataFrame(records)
 
@@ -74,6 +64,14 @@ for m in METRICS:
 
 df["acquisition_ambiguity"] = np.mean(ambiguities, axis=0)
 
+save_params("evaluator", {
+    "weights": WEIGHTS.tolist(),
+    "min": dict(zip(METRICS, scaler.data_min_.tolist())),
+    "max": dict(zip(METRICS, scaler.data_max_.tolist())),
+    "q1": q1.to_dict(),
+    "q3": q3.to_dict()
+})
+
 df.to_csv(OUTPUT_CSV, index=False)
 print(f"[INFO] Saved acquisition metrics to {OUTPUT_CSV}")
 
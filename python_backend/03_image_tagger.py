@@ -1,6 +1,8 @@
 import pandas as pd
 import os
 
+from preprocessing import save_params
+
 
 CSV_FILE = "image_acquisition_metrics.csv"
 OUTPUT_DIR = "updated_csvs"
@@ -26,6 +28,12 @@ df['AQI_tag'] = df['AQI'].apply(aqi_tag)
 ambiguity_q3 = df['acquisition_ambiguity'].quantile(0.75)
 df['high_ambiguity_flag'] = df['acquisition_ambiguity'] >= ambiguity_q3
 
+save_params("tagger", {
+    "aqi_q1": float(q1_aqi),
+    "aqi_q3": float(q3_aqi),
+    "ambiguity_q3": float(ambiguity_q3)
+})
+
 df['extreme_and_ambiguous_flag'] = (
     ((df['AQI_tag'] == "LOW") | (df['AQI_tag'] == "HIGH")) &
     (df['high_ambiguity_flag'])
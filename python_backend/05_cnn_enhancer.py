@@ -17,6 +17,8 @@ CSV_PATH = "updated_csvs/image_acquisition_metrics_updated.csv"
 OUTPUT_DIR = "output"
 OUTPUT_EMBEDDINGS = os.path.join(OUTPUT_DIR, "enhanced_embeddings.npy")
 OUTPUT_META = os.path.join(OUTPUT_DIR, "enhanced_embeddings_metadata.csv")
+MODEL_DIR = "models"
+OUTPUT_MODEL = os.path.join(MODEL_DIR, "feature_extractor.keras")
 
 IMG_SIZE = (224, 224)
 BATCH_SIZE = 32
@@ -25,6 +27,7 @@ EPOCHS = 2
 LEARNING_RATE = 1e-5
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(MODEL_DIR, exist_ok=True)
 
 df = pd.read_csv(CSV_PATH)
 all_files = df["image"].tolist()
@@ -96,6 +99,10 @@ model.fit(
 
 print("[INFO] Fine-tuning complete.")
 
+# inference.py loads this model once and reuses it for every request
+model.save(OUTPUT_MODEL)
+print(f"[INFO] Saved feature extractor to {OUTPUT_MODEL}")
+
 embeddings = []
 metadata = []
 
@@ -2,41 +2,70 @@ import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from tqdm import tqdm
 
-from sklearn.decomposition import PCA
-from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering
-from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import pairwise_distances
 
+from kmeans_selection import select_kmeans
+from hierarchical import scalable_ward, ward_agreement
+from cluster_bundle import save_bundle
+from projection import load_or_compute_projection
+from plot_density import density_scatter
+from knn_graph import (
+    load_or_build_knn_graph,
+    dbscan_from_graph,
+    k_distance_curve,
+    suggest_eps,
+    connectivity,
+    outlier_scores
+)
+
 
 EMBEDDINGS_PATH = "CNN Output/enhanced_embeddings.npy"
+# Product-quantised copy from 10_embedding_compressor.py, used when the
+# full-precision file is not kept
+PQ_STORE_PATH = "CNN Output/enhanced_embeddings_pq"
+if not os.path.exists(EMBEDDINGS_PATH) and os.path.exists(PQ_STORE_PATH):
+    EMBEDDINGS_PATH = PQ_STORE_PATH
 META_PATH = "CNN Output/enhanced_embeddings_metadata.csv"
 OUT_DIR = "analysis"
+BUNDLE_DIR = "models/clustering_bundle"
+PROJECTION_DIR = f"{OUT_DIR}/projection"
 os.makedirs(OUT_DIR, exist_ok=True)
 
 PCA_COMPONENTS = 50
 VIS_DIMS = 2
+PCA_METHOD = "incremental"  # "incremental" or "randomized"
 KMEANS_MAX_K = 10
+KMEANS_CRITERION = "elbow"  # "elbow", "silhouette" or "gap"
+N_JOBS = -1
+HIER_EXACT_LIMIT = 20000  # above this, Ward runs on micro-cluster summaries
+HIER_USE_CONNECTIVITY = False  # constrain exact Ward to the kNN graph
+KNN_K = 30
+DBSCAN_EPS = 1.5  # None = pick eps from the k-distance knee
+DBSCAN_MIN_SAMPLES = 10
+AMBIGUITY_QUANTILE = 0.95
 
 
-print("[INFO] Loading embeddings and metadata...")
-X = np.load(EMBEDDINGS_PATH)
+print("[INFO] Loading metadata and embedding projection...")
 meta = pd.read_csv(META_PATH)
 
-print(f"[INFO] Embeddings shape: {X.shape}")
-
-
-print("[INFO] Standardizing embeddings...")
-X_scaled = StandardScaler().fit_transform(X)
-
-
-print("[INFO] Running PCA...")
-pca = PCA(n_components=PCA_COMPONENTS, random_state=42)
-X_pca = pca.fit_transform(X_scaled)
+# Standardisation + PCA run out-of-core over the memory-mapped embeddings
+# and are cached for 07_cluster_interpreter.py
+proj = load_or_compute_projection(
+    EMBEDDINGS_PATH,
+    PROJECTION_DIR,
+    n_components=PCA_COMPONENTS,
+    vis_dims=VIS_DIMS,
+    method=PCA_METHOD,
+    random_state=42
+)
+X_pca = proj["pca"]
+X_vis = proj["vis"]
+
+print(f"[INFO] Embeddings shape: ({proj['manifest']['n_samples']}, {proj['manifest']['n_features']})")
 
 plt.figure(figsize=(8,5))
-plt.plot(np.cumsum(pca.explained_variance_ratio_))
+plt.plot(np.cumsum(proj["explained_variance_ratio"]))
 plt.xlabel("PCA Components")
 plt.ylabel("Cumulative Explained Variance")
 plt.title("PCA Variance Explained")
@@ -44,19 +73,19 @@ plt.grid(True)
 plt.savefig(f"{OUT_DIR}/pca_variance.png")
 plt.close()
 
-X_vis = PCA(n_components=VIS_DIMS, random_state=42).fit_transform(X_scaled)
 
-
-print("[INFO] Computing KMeans elbow curve...")
-inertias = []
-
-for k in tqdm(range(2, KMEANS_MAX_K+1), desc="KMeans Elbow"):
-    km = KMeans(n_clusters=k, n_init=10, random_state=42)
-    km.fit(X_pca)
-    inertias.append(km.inertia_)
+print(f"[INFO] Running parallel KMeans model selection ({KMEANS_CRITERION})...")
+selection = select_kmeans(
+    X_pca,
+    range(2, KMEANS_MAX_K+1),
+    criterion=KMEANS_CRITERION,
+    n_jobs=N_JOBS,
+    random_state=42
+)
+inertias = selection["inertias"]
 
 plt.figure(figsize=(7,5))
-plt.plot(range(2, KMEANS_MAX_K+1), inertias, marker="o")
+plt.plot(selection["k_values"], inertias, marker="o")
 plt.xlabel("k")
 plt.ylabel("Inertia")
 plt.title("KMeans Elbow Method")
@@ -64,34 +93,78 @@ plt.grid(True)
 plt.savefig(f"{OUT_DIR}/elbow_curve.png")
 plt.close()
 
-BEST_K = np.argmin(np.diff(inertias)) + 3
+if KMEANS_CRITERION != "elbow":
+    plt.figure(figsize=(7,5))
+    plt.plot(selection["k_values"], selection["scores"], marker="o")
+    plt.xlabel("k")
+    plt.ylabel(KMEANS_CRITERION.capitalize())
+    plt.title(f"KMeans {KMEANS_CRITERION.capitalize()} Scores")
+    plt.grid(True)
+    plt.savefig(f"{OUT_DIR}/kmeans_selection_scores.png")
+    plt.close()
+
+BEST_K = selection["best_k"]
 print(f"[INFO] Selected K = {BEST_K}")
 
-kmeans = KMeans(n_clusters=BEST_K, n_init=20, random_state=42)
-meta["kmeans_cluster"] = kmeans.fit_predict(X_pca)
+# The winning sweep fit is reused directly; no refit from scratch
+kmeans = selection["model"]
+meta["kmeans_cluster"] = kmeans.labels_
 
 
-print("[INFO] Running DBSCAN clustering...")
-dbscan = DBSCAN(eps=1.5, min_samples=10, n_jobs=-1)
-meta["dbscan_cluster"] = dbscan.fit_predict(X_pca)
+print("[INFO] Loading shared kNN graph...")
+knn = load_or_build_knn_graph(X_pca, f"{OUT_DIR}/knn_graph", k=KNN_K, n_jobs=N_JOBS)
+
+k_dist = k_distance_curve(knn, DBSCAN_MIN_SAMPLES)
+eps = DBSCAN_EPS if DBSCAN_EPS is not None else suggest_eps(knn, DBSCAN_MIN_SAMPLES)
+
+plt.figure(figsize=(7,5))
+plt.plot(k_dist)
+plt.axhline(eps, color="red", linestyle="--", label=f"eps = {eps:.3f}")
+plt.xlabel("Points (sorted)")
+plt.ylabel(f"Distance to {DBSCAN_MIN_SAMPLES - 1}th neighbour")
+plt.title("DBSCAN k-distance Curve")
+plt.legend()
+plt.grid(True)
+plt.savefig(f"{OUT_DIR}/k_distance_curve.png")
+plt.close()
+
+print(f"[INFO] Running DBSCAN clustering (eps={eps:.3f})...")
+meta["dbscan_cluster"] = dbscan_from_graph(knn, eps, DBSCAN_MIN_SAMPLES)
+meta["knn_outlier_score"] = outlier_scores(knn, k=min(20, KNN_K))
 
 
 print("[INFO] Running Hierarchical clustering...")
-hier = AgglomerativeClustering(n_clusters=BEST_K, linkage="ward")
-meta["hier_cluster"] = hier.fit_predict(X_pca)
+hier = scalable_ward(
+    X_pca,
+    BEST_K,
+    exact_limit=HIER_EXACT_LIMIT,
+    connectivity=connectivity(knn) if HIER_USE_CONNECTIVITY else None,
+    random_state=42
+)
+meta["hier_cluster"] = hier["labels"]
+
+if hier["mode"] == "micro":
+    agreement = ward_agreement(X_pca, hier["labels"], BEST_K, random_state=42)
+    pd.DataFrame([{"mode": hier["mode"], "n_micro": hier["n_micro"], **agreement}]).to_csv(
+        f"{OUT_DIR}/hierarchical_agreement.csv", index=False
+    )
+    print(f"[INFO] Micro-cluster Ward ({hier['n_micro']} summaries) vs exact Ward "
+          f"on {agreement['sample_size']} samples: ARI={agreement['ari']:.3f}, NMI={agreement['nmi']:.3f}")
 
 
 def plot_clusters(labels, title, fname):
-    plt.figure(figsize=(8,6))
-    scatter = plt.scatter(
-        X_vis[:,0], X_vis[:,1],
-        c=labels,
+    fig, ax = plt.subplots(figsize=(8,6))
+    # Switches to a majority-label raster above plot_density.DENSITY_THRESHOLD points
+    scatter = density_scatter(
+        ax,
+        X_vis,
+        np.asarray(labels),
         cmap="tab20",
         s=6,
         alpha=0.8
     )
     plt.title(title)
-    plt.colorbar(scatter)
+    plt.colorbar(scatter, ax=ax)
     plt.tight_layout()
     plt.savefig(f"{OUT_DIR}/{fname}")
     plt.close()
@@ -107,7 +180,7 @@ centroids = kmeans.cluster_centers_
 dists = pairwise_distances(X_pca, centroids)
 meta["cluster_distance"] = np.min(dists, axis=1)
 
-threshold = meta["cluster_distance"].quantile(0.95)
+threshold = meta["cluster_distance"].quantile(AMBIGUITY_QUANTILE)
 meta["ambiguous"] = meta["cluster_distance"] > threshold
 
 ambiguous_df = meta[meta["ambiguous"]]
@@ -115,6 +188,30 @@ ambiguous_df.to_csv(f"{OUT_DIR}/ambiguous_images.csv", index=False)
 
 meta.to_csv(f"{OUT_DIR}/clustering_results.csv", index=False)
 
+
+print("[INFO] Saving clustering model bundle...")
+
+distance_std = meta.groupby("kmeans_cluster")["cluster_distance"].std().reindex(range(BEST_K)).fillna(0)
+
+bundle_path = save_bundle(
+    BUNDLE_DIR,
+    scaler_mean=proj["scaler_mean"],
+    scaler_scale=proj["scaler_scale"],
+    pca_mean=proj["pca_mean"],
+    pca_components=proj["components"],
+    centroids=centroids,
+    stability=1 / (1 + distance_std.values),
+    ambiguity_threshold=threshold,
+    train_distances=meta["cluster_distance"].values,
+    metadata={
+        "kmeans_k": int(BEST_K),
+        "ambiguity_quantile": AMBIGUITY_QUANTILE,
+        "stability_source": "distance_spread",
+        "n_train": int(len(meta))
+    }
+)
+print(f"[INFO] Bundle saved to {bundle_path}")
+
 print("\n[INFO] Clustering analysis complete.")
 print(f"[INFO] Ambiguous images: {len(ambiguous_df)}")
 print("[INFO] Outputs saved to /analysis")
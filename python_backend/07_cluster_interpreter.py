@@ -4,23 +4,38 @@ import pandas as pd
 from tqdm import tqdm
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
+
+from projection import load_or_compute_projection
+from plot_density import DENSITY_THRESHOLD, density_scatter, label_legend_handles
+from stability import bootstrap_stability
+from exemplars import select_exemplars
+from cluster_bundle import update_stability
 
 EMBEDDINGS_PATH = "CNN Output/enhanced_embeddings.npy"
+# Product-quantised copy from 10_embedding_compressor.py, used when the
+# full-precision file is not kept
+PQ_STORE_PATH = "CNN Output/enhanced_embeddings_pq"
+if not os.path.exists(EMBEDDINGS_PATH) and os.path.exists(PQ_STORE_PATH):
+    EMBEDDINGS_PATH = PQ_STORE_PATH
 CSV_PATH = "analysis/clustering_results.csv"
+PROJECTION_DIR = "analysis/projection"
+BUNDLE_DIR = "models/clustering_bundle"
 OUTPUT_DIR = "INTERPRETER Output/Cluster_interpretation"
-PCA_COMPONENTS = 2
+PCA_COMPONENTS = 50  # must match 06_model_clusterer.py to reuse its cache
+PCA_METHOD = "incremental"
+VIS_DIMS = 2
+N_JOBS = -1
+TIMESERIES_POINTS = 200  # quantile points per cluster in the stability time series
+N_REPRESENTATIVES = 5
+N_BOUNDARY = 5
+IMAGE_REF_COLS = ["image", "embedding_idx"]
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 sns.set(style="whitegrid")
 
 print("[INFO] Loading embeddings and clustering results...")
 
-embeddings = np.load(EMBEDDINGS_PATH)
 df = pd.read_csv(CSV_PATH)
-
-print(f"[INFO] Embeddings shape: {embeddings.shape}")
 print(f"[INFO] CSV columns detected: {list(df.columns)}")
 
 
@@ -47,32 +62,43 @@ if CLUSTER_COL is None:
 
 print(f"[INFO] Using cluster column: '{CLUSTER_COL}'")
 
-print("[INFO] Performing PCA dimensionality reduction...")
-
-scaler = StandardScaler()
-embeddings_scaled = scaler.fit_transform(embeddings)
+print("[INFO] Loading cached PCA projection...")
 
-pca = PCA(n_components=PCA_COMPONENTS, random_state=42)
-pca_result = pca.fit_transform(embeddings_scaled)
+proj = load_or_compute_projection(
+    EMBEDDINGS_PATH,
+    PROJECTION_DIR,
+    n_components=PCA_COMPONENTS,
+    vis_dims=VIS_DIMS,
+    method=PCA_METHOD,
+    random_state=42
+)
+print(f"[INFO] Embeddings shape: ({proj['manifest']['n_samples']}, {proj['manifest']['n_features']})")
 
-df["pca_1"] = pca_result[:, 0]
-df["pca_2"] = pca_result[:, 1]
+df["pca_1"] = proj["vis"][:, 0]
+df["pca_2"] = proj["vis"][:, 1]
 
-print("[INFO] PCA variance explained:", pca.explained_variance_ratio_)
+print("[INFO] PCA variance explained:", proj["explained_variance_ratio"][:VIS_DIMS])
 
 
 plt.figure(figsize=(10, 8))
-sns.scatterplot(
-    data=df,
-    x="pca_1",
-    y="pca_2",
-    hue=CLUSTER_COL,
-    palette="tab10",
-    s=45,
-    alpha=0.85
-)
+if len(df) > DENSITY_THRESHOLD:
+    density_scatter(plt.gca(), proj["vis"], df[CLUSTER_COL].values, cmap="tab10")
+    plt.legend(
+        handles=label_legend_handles(df[CLUSTER_COL].values, cmap="tab10"),
+        title="Cluster", bbox_to_anchor=(1.05, 1), loc="upper left"
+    )
+else:
+    sns.scatterplot(
+        data=df,
+        x="pca_1",
+        y="pca_2",
+        hue=CLUSTER_COL,
+        palette="tab10",
+        s=45,
+        alpha=0.85
+    )
+    plt.legend(title="Cluster", bbox_to_anchor=(1.05, 1), loc="upper left")
 plt.title("PCA Projection of Image Clusters")
-plt.legend(title="Cluster", bbox_to_anchor=(1.05, 1), loc="upper left")
 plt.tight_layout()
 plt.savefig(os.path.join(OUTPUT_DIR, "pca_clusters.png"))
 plt.close()
@@ -95,7 +121,11 @@ if "cluster_distance" in df.columns:
     plt.close()
 
 
-print("[INFO] Computing cluster stability metrics...")
+print("[INFO] Computing bootstrap cluster stability...")
+
+boot = bootstrap_stability(proj["pca"], df[CLUSTER_COL].values, n_jobs=N_JOBS, random_state=42)
+print(f"[INFO] {boot['n_bootstraps']} resamples (converged: {boot['converged']}), "
+      f"ARI = {boot['ari_mean']:.3f} ± {boot['ari_std']:.3f}")
 
 stability_df = (
     df.groupby(CLUSTER_COL)["cluster_distance"]
@@ -103,7 +133,15 @@ stability_df = (
     .reset_index()
 )
 
-stability_df["stability_score"] = 1 / (1 + stability_df["std"])
+boot_df = pd.DataFrame({
+    CLUSTER_COL: boot["clusters"],
+    "jaccard_mean": boot["jaccard_mean"],
+    "jaccard_std": boot["jaccard_std"]
+})
+stability_df = stability_df.merge(boot_df, on=CLUSTER_COL, how="left")
+
+# Mean clusterwise Jaccard across resamples; DBSCAN noise (-1) is not a cluster
+stability_df["stability_score"] = stability_df["jaccard_mean"].fillna(0.0)
 
 stability_df.to_csv(
     os.path.join(OUTPUT_DIR, "cluster_stability_metrics.csv"),
@@ -120,22 +158,62 @@ sns.barplot(
     legend=False
 )
 plt.title("Cluster Stability Score")
-plt.ylabel("Stability (Higher = Better)")
+plt.ylabel("Mean Bootstrap Jaccard (Higher = Better)")
 plt.tight_layout()
 plt.savefig(os.path.join(OUTPUT_DIR, "cluster_stability.png"))
 plt.close()
 
-df_sorted = df.sort_values("cluster_distance").reset_index(drop=True)
-df_sorted["sample_index"] = df_sorted.index
+if CLUSTER_COL == "kmeans_cluster" and os.path.exists(BUNDLE_DIR):
+    scores = stability_df.set_index(CLUSTER_COL)["stability_score"]
+    bundle_path = update_stability(
+        BUNDLE_DIR,
+        scores.reindex(range(int(scores.index.max()) + 1)).fillna(0.0).values,
+        source="bootstrap_jaccard"
+    )
+    print(f"[INFO] Published bootstrap stability to {bundle_path}")
+
+def distance_quantile_curves(distances, labels, n_points):
+    """
+    Per-cluster distance curves along the global distance ranking,
+    subsampled at n_points evenly spaced within-cluster quantiles
+    """
+    order = np.argsort(distances, kind="stable")
+    sorted_dist = distances[order]
+    sorted_labels = labels[order]
+
+    # Stable sort by label keeps each cluster's global ranks increasing
+    by_label = np.argsort(sorted_labels, kind="stable")
+    values, counts = np.unique(sorted_labels, return_counts=True)
+
+    curves = []
+    for label, ranks in zip(values, np.split(by_label, np.cumsum(counts)[:-1])):
+        pick = np.unique(np.linspace(0, len(ranks) - 1, min(n_points, len(ranks))).round().astype(int))
+        curves.append(pd.DataFrame({
+            CLUSTER_COL: label,
+            "quantile": pick / max(len(ranks) - 1, 1),
+            "sample_index": ranks[pick],
+            "cluster_distance": sorted_dist[ranks[pick]]
+        }))
+
+    return pd.concat(curves, ignore_index=True)
+
+
+curves_df = distance_quantile_curves(
+    df["cluster_distance"].values,
+    df[CLUSTER_COL].values,
+    TIMESERIES_POINTS
+)
+curves_df.to_csv(os.path.join(OUTPUT_DIR, "cluster_distance_quantile_curves.csv"), index=False)
 
 plt.figure(figsize=(12, 6))
 sns.lineplot(
-    data=df_sorted,
+    data=curves_df,
     x="sample_index",
     y="cluster_distance",
     hue=CLUSTER_COL,
     palette="tab10",
-    linewidth=1
+    linewidth=1,
+    estimator=None
 )
 plt.title("Cluster Distance Stability Across Dataset")
 plt.xlabel("Sample Index")
@@ -145,6 +223,24 @@ plt.savefig(os.path.join(OUTPUT_DIR, "stability_timeseries.png"))
 plt.close()
 
 
+print("[INFO] Selecting medoid, representative and boundary exemplars...")
+
+exemplars_df = select_exemplars(
+    proj["pca"],
+    df[CLUSTER_COL].values,
+    n_representatives=N_REPRESENTATIVES,
+    n_boundary=N_BOUNDARY,
+    random_state=42
+)
+exemplars_df = exemplars_df.rename(columns={"cluster": CLUSTER_COL})
+for col in IMAGE_REF_COLS:
+    if col in df.columns:
+        exemplars_df[col] = df[col].values[exemplars_df["row"].values]
+
+exemplars_df.to_csv(os.path.join(OUTPUT_DIR, "cluster_exemplars.csv"), index=False)
+print(f"[INFO] Saved {len(exemplars_df)} exemplar references")
+
+
 print("[INFO] Generating AI-style cluster interpretation...")
 
 interpretations = []
@@ -152,9 +248,10 @@ interpretations = []
 for _, row in stability_df.iterrows():
     stability = row["stability_score"]
 
-    if stability > 0.7:
+    # Jaccard guidance (Hennig): >0.75 stable, <0.5 dissolved
+    if stability > 0.75:
         verdict = "Highly stable cluster – consistent, high-confidence images"
-    elif stability > 0.4:
+    elif stability > 0.5:
         verdict = "Moderately stable cluster – contains ambiguous samples"
     else:
         verdict = "Unstable cluster – likely poor-quality or outlier images"
@@ -1,86 +1,199 @@
 import pandas as pd
-import numpy as np
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy.stats import gaussian_kde
-from tqdm import tqdm
 import os
 
+from distribution_summary import summarize_columns, kde_as_counts
+from render_scheduler import render_figures
+from chart_data import histogram_chart, correlation_chart, hexbin_counts, export_charts
+
 CSV_FILE = "image_acquisition_metrics.csv"
 OUTPUT_DIR = "final_visualizations"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+CHART_DATA_DIR = f"{OUTPUT_DIR}/chart_data"
 
 METRICS = ["blur", "brightness", "contrast", "entropy"]
 BINS = 40
+DPI = 200
+MAX_WORKERS = None  # None = one process per stale figure, up to the CPU count
+FORCE_RENDER = False
+HEXBIN_GRIDSIZE = 50
 sns.set_style("whitegrid")
 
-df = pd.read_csv(CSV_FILE)
-print(f"[INFO] Loaded {len(df)} rows from {CSV_FILE}")
-
-fig, axes = plt.subplots(2, 2, figsize=(14,10))
-axes = axes.flatten()
-
-for i, metric in enumerate(tqdm(METRICS, desc="Generating combined histograms")):
-    values = df[metric].dropna().values
-    ax = axes[i]
-
-    counts, bins_edges, patches = ax.hist(values, bins=BINS, alpha=0.6, edgecolor='black')
-    for j, patch in enumerate(patches):
-        patch.set_facecolor(plt.cm.viridis(j / len(patches)))
-
-    kde = gaussian_kde(values)
-    x_grid = np.linspace(min(values), max(values), 1000)
-    ax2 = ax.twinx()
-    ax2.plot(x_grid, kde(x_grid)*len(values)*(bins_edges[1]-bins_edges[0]), color='red', lw=2)
-    ax2.set_ylim(0, max(counts)*1.1)
-    ax2.get_yaxis().set_visible(False)
-
-    ax.set_title(f"{metric.capitalize()} Distribution", fontsize=14, weight='bold')
-    ax.set_xlabel(metric.capitalize())
-    ax.set_ylabel("Count")
-    ax.grid(alpha=0.3)
-
-plt.tight_layout()
-plt.savefig(os.path.join(OUTPUT_DIR, "combined_histograms.png"), dpi=200)
-plt.close(fig)
-
-fig, ax = plt.subplots(figsize=(10,6))
-sns.boxplot(data=df[METRICS], palette="Set2", ax=ax)
-ax.set_title("Boxplots of Acquisition Metrics", fontsize=16, weight='bold')
-plt.xticks(fontsize=12)
-plt.ylabel("Value")
-plt.tight_layout()
-plt.savefig(os.path.join(OUTPUT_DIR, "metrics_boxplot.png"), dpi=200)
-plt.close(fig)
-
-if 'AQI' in df.columns:
+
+def render_combined_histograms(frame, out_path, metrics, dpi, summaries):
+    fig, axes = plt.subplots(2, 2, figsize=(14,10))
+    axes = axes.flatten()
+
+    for i, metric in enumerate(metrics):
+        summary = summaries[metric]
+        ax = axes[i]
+
+        edges = summary["hist"]["edges"]
+        counts, bins_edges, patches = ax.hist(
+            edges[:-1], bins=edges, weights=summary["hist"]["counts"], alpha=0.6, edgecolor='black'
+        )
+        for j, patch in enumerate(patches):
+            patch.set_facecolor(plt.cm.viridis(j / len(patches)))
+
+        ax2 = ax.twinx()
+        ax2.plot(summary["kde"]["x"], kde_as_counts(summary), color='red', lw=2)
+        ax2.set_ylim(0, max(counts)*1.1)
+        ax2.get_yaxis().set_visible(False)
+
+        ax.set_title(f"{metric.capitalize()} Distribution", fontsize=14, weight='bold')
+        ax.set_xlabel(metric.capitalize())
+        ax.set_ylabel("Count")
+        ax.grid(alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=dpi)
+    plt.close(fig)
+
+
+def render_metrics_boxplot(frame, out_path, metrics, dpi, summaries):
+    fig, ax = plt.subplots(figsize=(10,6))
+    box_data = []
+    for metric in metrics:
+        box = summaries[metric]["box"]
+        values = frame[metric].dropna().values
+        box_data.append({
+            "label": metric,
+            "med": box["med"],
+            "q1": box["q1"],
+            "q3": box["q3"],
+            "whislo": box["whislo"],
+            "whishi": box["whishi"],
+            "fliers": values[(values < box["whislo"]) | (values > box["whishi"])]
+        })
+    bxp = ax.bxp(box_data, patch_artist=True, showfliers=True, medianprops={"color": "black"})
+    for patch, color in zip(bxp["boxes"], sns.color_palette("Set2", len(metrics))):
+        patch.set_facecolor(color)
+    ax.set_title("Boxplots of Acquisition Metrics", fontsize=16, weight='bold')
+    plt.xticks(fontsize=12)
+    plt.ylabel("Value")
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=dpi)
+    plt.close(fig)
+
+
+def render_aqi_distribution(frame, out_path, dpi, summary):
     fig, ax = plt.subplots(figsize=(10,6))
-    sns.histplot(df['AQI'], bins=40, kde=True, color='purple', alpha=0.7)
+    edges = summary["hist"]["edges"]
+    ax.hist(edges[:-1], bins=edges, weights=summary["hist"]["counts"], color='purple', alpha=0.7, edgecolor='white')
+    ax.plot(summary["kde"]["x"], kde_as_counts(summary), color='purple', lw=2)
     ax.set_title("Acquisition Quality Index (AQI) Distribution", fontsize=16, weight='bold')
     ax.set_xlabel("AQI")
     ax.set_ylabel("Number of Images")
     plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, "AQI_distribution.png"), dpi=200)
+    plt.savefig(out_path, dpi=dpi)
     plt.close(fig)
 
-if 'AQI' in df.columns and 'acquisition_ambiguity' in df.columns:
+
+def render_aqi_ambiguity_heatmap(frame, out_path, gridsize, dpi):
     plt.figure(figsize=(8,6))
-    hb = plt.hexbin(df['AQI'], df['acquisition_ambiguity'],
-                    gridsize=50, cmap='coolwarm', mincnt=1)
+    hb = plt.hexbin(frame['AQI'], frame['acquisition_ambiguity'],
+                    gridsize=gridsize, cmap='coolwarm', mincnt=1)
     plt.colorbar(hb, label='Count')
     plt.xlabel("AQI")
     plt.ylabel("Acquisition Ambiguity")
     plt.title("AQI vs Acquisition Ambiguity Heatmap", fontsize=14, weight='bold')
     plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, "AQI_vs_ambiguity_heatmap.png"), dpi=200)
+    plt.savefig(out_path, dpi=dpi)
     plt.close()
 
-plt.figure(figsize=(8,6))
-corr = df[METRICS].corr()
-sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", square=True, cbar=True)
-plt.title("Correlation Heatmap of Acquisition Metrics", fontsize=14, weight='bold')
-plt.tight_layout()
-plt.savefig(os.path.join(OUTPUT_DIR, "correlation_heatmap.png"), dpi=200)
-plt.close()
 
-print(f"[INFO] All visualizations saved in '{OUTPUT_DIR}'")
+def render_correlation_heatmap(frame, out_path, metrics, dpi):
+    plt.figure(figsize=(8,6))
+    corr = frame[metrics].corr()
+    sns.heatmap(corr, annot=True, fmt=".2f", cmap="coolwarm", square=True, cbar=True)
+    plt.title("Correlation Heatmap of Acquisition Metrics", fontsize=14, weight='bold')
+    plt.tight_layout()
+    plt.savefig(out_path, dpi=dpi)
+    plt.close()
+
+
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    df = pd.read_csv(CSV_FILE)
+    print(f"[INFO] Loaded {len(df)} rows from {CSV_FILE}")
+
+    # Histograms, KDEs and box statistics are computed once per column and
+    # reused by every figure below
+    summaries = summarize_columns(df, METRICS + ["AQI"], bins=BINS)
+
+    tasks = [
+        {
+            "name": "combined_histograms",
+            "renderer": render_combined_histograms,
+            "columns": METRICS,
+            "params": {"metrics": METRICS, "dpi": DPI},
+            "inputs": {"summaries": {m: summaries[m] for m in METRICS}},
+            "settings": {"bins": BINS},
+            "output": "combined_histograms.png"
+        },
+        {
+            "name": "metrics_boxplot",
+            "renderer": render_metrics_boxplot,
+            "columns": METRICS,
+            "params": {"metrics": METRICS, "dpi": DPI},
+            "inputs": {"summaries": {m: summaries[m] for m in METRICS}},
+            "output": "metrics_boxplot.png"
+        },
+        {
+            "name": "correlation_heatmap",
+            "renderer": render_correlation_heatmap,
+            "columns": METRICS,
+            "params": {"metrics": METRICS, "dpi": DPI},
+            "output": "correlation_heatmap.png"
+        }
+    ]
+
+    if 'AQI' in df.columns:
+        tasks.append({
+            "name": "AQI_distribution",
+            "renderer": render_aqi_distribution,
+            "columns": ["AQI"],
+            "params": {"dpi": DPI},
+            "inputs": {"summary": summaries["AQI"]},
+            "settings": {"bins": BINS},
+            "output": "AQI_distribution.png"
+        })
+
+    if 'AQI' in df.columns and 'acquisition_ambiguity' in df.columns:
+        tasks.append({
+            "name": "AQI_vs_ambiguity_heatmap",
+            "renderer": render_aqi_ambiguity_heatmap,
+            "columns": ["AQI", "acquisition_ambiguity"],
+            "params": {"gridsize": HEXBIN_GRIDSIZE, "dpi": DPI},
+            "output": "AQI_vs_ambiguity_heatmap.png"
+        })
+
+    status = render_figures(tasks, df, OUTPUT_DIR, max_workers=MAX_WORKERS, force=FORCE_RENDER)
+    for name, state in status.items():
+        print(f"[INFO] {name}: {state}")
+
+    # Precomputed aggregates for the web dashboard (a few KB per chart)
+    charts = {
+        f"{col}_distribution": {"type": "distribution", "data": histogram_chart(summary)}
+        for col, summary in summaries.items()
+    }
+    charts["metrics_correlation"] = {"type": "correlation", "data": correlation_chart(df, METRICS)}
+    if 'AQI' in df.columns and 'acquisition_ambiguity' in df.columns:
+        charts["AQI_vs_ambiguity_hexbin"] = {
+            "type": "hexbin",
+            "data": hexbin_counts(df['AQI'].values, df['acquisition_ambiguity'].values, gridsize=HEXBIN_GRIDSIZE)
+        }
+
+    index = export_charts(charts, CHART_DATA_DIR, source=CSV_FILE)
+    total_kb = sum(e["bytes"] for e in index["charts"].values()) / 1024
+    changed = sum(e["changed"] for e in index["charts"].values())
+    print(f"[INFO] Chart data: {len(charts)} charts ({total_kb:.1f} KB, {changed} updated) in '{CHART_DATA_DIR}'")
+
+    print(f"[INFO] All visualizations saved in '{OUTPUT_DIR}'")
+
+
+if __name__ == "__main__":
+    main()
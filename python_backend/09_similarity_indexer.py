@@ -0,0 +1,105 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from ann_index import IvfIndex, exact_search, recall_at_k
+from knn_graph import embedding_fingerprint
+from pq_store import open_embeddings
+
+
+EMBEDDINGS_PATH = "CNN Output/enhanced_embeddings.npy"
+PQ_STORE_PATH = "CNN Output/enhanced_embeddings_pq"
+if not os.path.exists(EMBEDDINGS_PATH) and os.path.exists(PQ_STORE_PATH):
+    EMBEDDINGS_PATH = PQ_STORE_PATH
+META_PATH = "CNN Output/enhanced_embeddings_metadata.csv"
+INDEX_DIR = "models/similarity_index"
+
+NLIST = None  # None = about 4 * sqrt(N) inverted lists
+NPROBE_CANDIDATES = [4, 8, 16, 32, 64, 128]
+TARGET_RECALL = 0.95  # recall@K the default nprobe must reach
+K = 10
+EVAL_QUERIES = 500
+ADD_CHUNK = 100_000
+RETRAIN_GROWTH = 4.0  # retrain the quantizer once the index outgrows its training set this much
+SEED = 42
+
+
+print("[INFO] Loading embeddings and metadata...")
+# Memory-mapped (or a PQ store decoded on demand): only the rows being added are read
+X = open_embeddings(EMBEDDINGS_PATH)
+meta = pd.read_csv(META_PATH)
+keys = meta["image"].astype(str).values if "image" in meta.columns else None
+print(f"[INFO] Embeddings shape: {X.shape}")
+
+
+# Rows already indexed by an earlier run are kept; only new rows are inserted
+index = None
+start_row = 0
+if os.path.exists(os.path.join(INDEX_DIR, "LATEST")):
+    existing = IvfIndex.load(INDEX_DIR)
+    n_done = existing.manifest.get("source_rows", 0)
+    if (
+        existing.dim == X.shape[1]
+        and 0 < n_done <= len(X)
+        and existing.manifest.get("source_fingerprint") == embedding_fingerprint(X, stop=n_done)
+        and len(X) <= RETRAIN_GROWTH * existing.manifest.get("train_rows", n_done)
+    ):
+        index, start_row = existing, n_done
+        print(f"[INFO] Extending index {existing.version} ({n_done} rows already indexed)")
+    else:
+        print("[INFO] Embeddings changed or outgrew the quantizer; rebuilding the index")
+
+if index is None:
+    index = IvfIndex.train(X, nlist=NLIST, seed=SEED)
+    index.manifest["train_rows"] = int(len(X))
+
+t0 = time.perf_counter()
+for start in range(start_row, len(X), ADD_CHUNK):
+    stop = min(start + ADD_CHUNK, len(X))
+    index.add(
+        X[start:stop],
+        ids=np.arange(start, stop),
+        keys=keys[start:stop] if keys is not None else None
+    )
+print(f"[INFO] Inserted {len(X) - start_row} vectors in {time.perf_counter() - t0:.1f}s")
+
+
+print(f"[INFO] Measuring recall@{K} on {EVAL_QUERIES} held-in queries...")
+rng = np.random.default_rng(SEED)
+queries = np.asarray(X[np.sort(rng.choice(len(X), size=min(EVAL_QUERIES, len(X)), replace=False))])
+truth = exact_search(X, queries, K)
+
+evaluation = []
+for nprobe in NPROBE_CANDIDATES:
+    t0 = time.perf_counter()
+    found = index.search(queries, K, nprobe=nprobe)["ids"]
+    latency_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    recall = recall_at_k(found, truth)
+    evaluation.append({"nprobe": nprobe, "recall": recall, "latency_ms": latency_ms})
+    print(f"  nprobe={nprobe:<4d} recall@{K}={recall:.3f}  {latency_ms:.2f} ms/query")
+
+# Smallest nprobe that reaches the target becomes the index default
+reaching = [e for e in evaluation if e["recall"] >= TARGET_RECALL]
+chosen = reaching[0] if reaching else evaluation[-1]
+index.nprobe = chosen["nprobe"]
+if not reaching:
+    print(f"[WARNING] No nprobe reached recall {TARGET_RECALL}; using nprobe={index.nprobe}")
+
+
+print("[INFO] Saving similarity index...")
+index_path = index.save(
+    INDEX_DIR,
+    metadata={
+        "source_rows": int(len(X)),
+        "source_fingerprint": embedding_fingerprint(X),
+        "recall_at_k": K,
+        "recall": float(chosen["recall"]),
+        "latency_ms": float(chosen["latency_ms"]),
+        "evaluation": evaluation
+    }
+)
+print(f"[INFO] Index saved to {index_path}")
+
+print("\n[INFO] Similarity indexing complete.")
+print(f"[INFO] {len(index)} cases in {index.nlist} lists, nprobe={index.nprobe}")
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import numpy as np
+
+from ann_index import exact_search, recall_at_k
+from pq_store import train_codebooks, write_store
+from projection import source_fingerprint
+
+
+# Each embeddings file from 04/05 is compressed into <name>_pq/ next to it
+SOURCES = [
+    "xrays_embeddings.npy",
+    "CNN Output/enhanced_embeddings.npy"
+]
+
+PQ_M = 128  # bytes per embedding: 64 = 64x smaller, 128 = 32x, 256 = 16x
+EVAL_QUERIES = 200
+K = 10
+RERANK = 100  # candidates taken from the codes before exact re-ranking
+SEED = 42
+
+
+def store_path(source):
+    return os.path.splitext(source)[0] + "_pq"
+
+
+for source in SOURCES:
+    if not os.path.exists(source):
+        print(f"[INFO] Skipping {source} (not found)")
+        continue
+
+    out_dir = store_path(source)
+    fingerprint = source_fingerprint(source)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("source_fingerprint") == fingerprint and manifest.get("m") == PQ_M:
+            print(f"[INFO] Reusing PQ store {out_dir}")
+            continue
+
+    X = np.load(source, mmap_mode="r")
+    print(f"[INFO] Compressing {source} {X.shape} with m={PQ_M}...")
+
+    t0 = time.perf_counter()
+    codebooks = train_codebooks(X, PQ_M, seed=SEED)
+    train_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    store = write_store(X, out_dir, codebooks, metadata={"source": source, "source_fingerprint": fingerprint})
+    encode_s = time.perf_counter() - t0
+
+    # Neighbour quality of asymmetric distances against the exact float32 search
+    rng = np.random.default_rng(SEED)
+    queries = np.asarray(X[np.sort(rng.choice(len(X), size=min(EVAL_QUERIES, len(X)), replace=False))])
+    truth = exact_search(X, queries, K)
+
+    t0 = time.perf_counter()
+    candidates = store.search(queries, max(K, RERANK))["rows"]
+    adc_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    adc_recall = recall_at_k(candidates[:, :K], truth)
+    rerank_recall = np.mean([len(np.intersect1d(c, t)) for c, t in zip(candidates, truth)]) / K
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest.update({
+        "train_s": train_s,
+        "encode_s": encode_s,
+        "adc_recall_at_k": K,
+        "adc_recall": float(adc_recall),
+        "rerank_candidates": RERANK,
+        "rerank_recall": float(rerank_recall),
+        "adc_ms_per_query": adc_ms
+    })
+    tmp = f"{manifest_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
+
+    raw_mb = X.nbytes / 1e6
+    pq_mb = (store.codes.nbytes + store.codebooks.nbytes) / 1e6
+    print(f"  {raw_mb:.1f} MB -> {pq_mb:.1f} MB ({raw_mb / pq_mb:.1f}x), MSE {manifest['mse']:.2e}")
+    print(f"  recall@{K}: {adc_recall:.3f} from codes, {rerank_recall:.3f} after re-ranking top {RERANK}")
+    print(f"  ADC search: {adc_ms:.1f} ms/query over {len(X)} rows")
+    print(f"[INFO] Saved PQ store to {out_dir}")
+
+print("\n[INFO] Embedding compression complete.")
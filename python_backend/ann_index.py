@@ -0,0 +1,372 @@
+"""
+Approximate nearest-neighbour index (IVF-Flat) over the L2-normalised
+embeddings, for similar-case retrieval.
+
+A coarse quantizer (spherical k-means) splits the embeddings into nlist
+inverted lists. A query scores the nlist centroids, scans only the nprobe
+best lists and ranks their vectors exactly by inner product, which is the
+cosine similarity for unit vectors. With nlist ~ 4 sqrt(N) a query reads
+about nprobe * N / nlist rows instead of N.
+
+On disk an index is laid out like cluster_bundle.py: immutable versions
+under <root>/<version>/ with <root>/LATEST naming the current one. Vectors
+live in segments (segments/<name>/vectors.npy, ids.npy, keys.npy and
+offsets.npy) sorted by list, so each list is one contiguous slice of a
+memory-mapped array. add() keeps new vectors in memory, where they are
+searchable at once; save() writes them as one new segment plus a version
+that also references the existing segments, so inserts never rewrite the
+base data. A save that would leave more than MAX_SEGMENTS segments merges
+them into one.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+FORMAT_VERSION = 1
+LATEST = "LATEST"
+MANIFEST = "manifest.json"
+SEGMENT_ARRAYS = ("vectors", "ids", "keys", "offsets")
+
+NPROBE = 16
+MAX_SEGMENTS = 8
+TRAIN_SAMPLE = 100_000  # vectors used to fit the coarse quantizer
+ASSIGN_CHUNK = 65_536
+
+
+def default_nlist(n: int) -> int:
+    """
+    Number of inverted lists for n vectors (about 4 sqrt(n)).
+    """
+    return int(max(1, min(n, round(4 * np.sqrt(n)))))
+
+
+def _normalise(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    return X / np.maximum(np.linalg.norm(X, axis=-1, keepdims=True), 1e-12)
+
+
+def train_quantizer(X: np.ndarray, nlist: int, seed: int = 0, sample: int = TRAIN_SAMPLE) -> np.ndarray:
+    """
+    Unit-norm (nlist, D) centroids of spherical k-means on a sample of X.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(X), size=min(sample, len(X)), replace=False))
+    X_train = _normalise(X[rows])
+
+    kmeans = MiniBatchKMeans(
+        n_clusters=nlist,
+        batch_size=max(4096, 4 * nlist),
+        n_init=1,
+        random_state=seed
+    ).fit(X_train)
+    return _normalise(kmeans.cluster_centers_)
+
+
+def assign_lists(X: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Inverted list of every row of X (best centroid by inner product), in chunks.
+    """
+    lists = np.empty(len(X), dtype=np.int32)
+    for start in range(0, len(X), ASSIGN_CHUNK):
+        chunk = np.asarray(X[start:start+ASSIGN_CHUNK], dtype=np.float32)
+        lists[start:start+len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return lists
+
+
+def exact_search(X: np.ndarray, Q: np.ndarray, k: int) -> np.ndarray:
+    """
+    Brute-force top-k rows of X by cosine similarity for each query (ground truth).
+    """
+    Q = _normalise(np.atleast_2d(Q))
+    k = min(k, len(X))
+    best_scores = np.full((len(Q), 0), -np.inf, dtype=np.float32)
+    best_rows = np.empty((len(Q), 0), dtype=np.int64)
+
+    for start in range(0, len(X), ASSIGN_CHUNK):
+        chunk = _normalise(X[start:start+ASSIGN_CHUNK])
+        scores = np.hstack([best_scores, Q @ chunk.T])
+        rows = np.hstack([best_rows, np.broadcast_to(np.arange(start, start + len(chunk)), (len(Q), len(chunk)))])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if scores.shape[1] > k else np.argsort(-scores, axis=1)
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_rows = np.take_along_axis(rows, top, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """
+    Fraction of the true top-k neighbours present in the returned top-k.
+    """
+    hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+class _Segment:
+    """
+    Vectors sorted by inverted list; list l is rows offsets[l]:offsets[l + 1].
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray, keys: np.ndarray, offsets: np.ndarray, name=None):
+        self.vectors = vectors
+        self.ids = ids
+        self.keys = keys
+        self.offsets = offsets
+        self.name = name
+
+    @classmethod
+    def build(cls, vectors, ids, keys, lists, nlist: int) -> "_Segment":
+        order = np.argsort(lists, kind="stable")
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=nlist), out=offsets[1:])
+        return cls(
+            np.ascontiguousarray(vectors[order], dtype=np.float32),
+            np.ascontiguousarray(ids[order], dtype=np.int64),
+            np.ascontiguousarray(keys[order]),
+            offsets
+        )
+
+    @classmethod
+    def merge(cls, segments: Sequence["_Segment"], nlist: int) -> "_Segment":
+        lists = np.concatenate([np.repeat(np.arange(nlist, dtype=np.int32), np.diff(s.offsets)) for s in segments])
+        return cls.build(
+            np.concatenate([s.vectors for s in segments]),
+            np.concatenate([s.ids for s in segments]),
+            np.concatenate([s.keys for s in segments]),
+            lists,
+            nlist
+        )
+
+    @classmethod
+    def load(cls, path: str, name: str) -> "_Segment":
+        # Plain ndarray views over the maps, as in cluster_bundle.py
+        arrays = [np.asarray(np.load(os.path.join(path, f"{a}.npy"), mmap_mode="r")) for a in SEGMENT_ARRAYS]
+        return cls(*arrays, name=name)
+
+    def save(self, root: str) -> str:
+        digest = hashlib.sha1()
+        for name in SEGMENT_ARRAYS:
+            digest.update(getattr(self, name).tobytes())
+        self.name = f"s{time.strftime('%Y%m%d%H%M%S')}-{digest.hexdigest()[:8]}"
+
+        out_dir = os.path.join(root, "segments", self.name)
+        os.makedirs(out_dir, exist_ok=True)
+        for name in SEGMENT_ARRAYS:
+            np.save(os.path.join(out_dir, f"{name}.npy"), getattr(self, name))
+        return self.name
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class IvfIndex:
+    """
+    IVF-Flat index with in-memory inserts and versioned, memory-mapped persistence.
+    """
+
+    def __init__(self, centroids: np.ndarray, nprobe: int = NPROBE, manifest: Optional[Dict] = None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nlist, self.dim = self.centroids.shape
+        self.nprobe = nprobe
+        self.manifest = manifest or {}
+        self.version = self.manifest.get("version")
+        self.path = None
+        self.next_id = int(self.manifest.get("next_id", 0))
+
+        self._segments = ()  # saved segments (memory-mapped when loaded)
+        self._pending = []  # (vectors, ids, keys, lists) added since the last save
+        self._delta = None  # _pending as one segment, rebuilt on the next search
+        self._lock = threading.Lock()
+
+    @classmethod
+    def train(cls, X: np.ndarray, nlist: Optional[int] = None, nprobe: int = NPROBE, seed: int = 0) -> "IvfIndex":
+        """
+        Empty index whose coarse quantizer is fitted on X (call add() to fill it).
+        """
+        nlist = nlist or default_nlist(len(X))
+        print(f"[INFO] Training IVF quantizer (nlist={nlist}) on {min(len(X), TRAIN_SAMPLE)} vectors...")
+        return cls(train_quantizer(X, nlist, seed=seed), nprobe=nprobe)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(s) for s in self._segments) + sum(len(p[1]) for p in self._pending)
+
+    def add(self, X: np.ndarray, ids: Optional[np.ndarray] = None, keys: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Insert embeddings (N, D); they are normalised and searchable immediately.
+
+        ids default to consecutive integers after the largest id so far, keys
+        (e.g. image file names) to the ids as strings.
+
+        Returns:
+            np.ndarray: (N,) int64 ids of the inserted vectors
+        """
+        X = _normalise(np.atleast_2d(X))
+        if X.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings, got {X.shape[1]}")
+        lists = assign_lists(X, self.centroids)
+
+        with self._lock:
+            if ids is None:
+                ids = np.arange(self.next_id, self.next_id + len(X), dtype=np.int64)
+            ids = np.asarray(ids, dtype=np.int64)
+            keys = np.asarray([str(i) for i in ids] if keys is None else list(keys), dtype=str)
+            if not len(ids) == len(keys) == len(X):
+                raise ValueError("ids and keys must have one entry per embedding")
+
+            self._pending.append((X, ids, keys, lists))
+            self._delta = None
+            self.next_id = max(self.next_id, int(ids.max()) + 1) if len(ids) else self.next_id
+        return ids
+
+    def _snapshot(self):
+        """
+        (segments to search, number of pending inserts they include), taken atomically
+        """
+        with self._lock:
+            if self._pending and self._delta is None:
+                self._delta = _Segment.build(
+                    *(np.concatenate(parts) for parts in zip(*self._pending)), nlist=self.nlist
+                )
+            segments = list(self._segments) + ([self._delta] if self._pending else [])
+            return segments, len(self._pending)
+
+    def search(self, Q: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> Dict:
+        """
+        Top-k most similar indexed vectors for each query (N, D) or (D,).
+
+        Returns:
+            dict of (N, k) arrays: "ids" (int64, -1 past the last hit),
+            "keys" (str), "similarity" (cosine, -inf past the last hit)
+        """
+        Q = _normalise(np.atleast_2d(Q))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        segments, _ = self._snapshot()
+
+        coarse = Q @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe] if nprobe < self.nlist else \
+            np.broadcast_to(np.arange(self.nlist), coarse.shape)
+
+        ids = np.full((len(Q), k), -1, dtype=np.int64)
+        keys = np.full((len(Q), k), "", dtype=object)
+        similarity = np.full((len(Q), k), -np.inf, dtype=np.float32)
+
+        for i, (q, probe) in enumerate(zip(Q, probes)):
+            scores, blocks, sizes = [], [], []
+            for seg in segments:
+                for l in probe:
+                    start, stop = seg.offsets[l], seg.offsets[l + 1]
+                    if stop > start:
+                        scores.append(seg.vectors[start:stop] @ q)
+                        blocks.append((seg, start))
+                        sizes.append(stop - start)
+            if not scores:
+                continue
+
+            scores = np.concatenate(scores)
+            n = min(k, len(scores))
+            top = np.argpartition(-scores, n - 1)[:n] if len(scores) > n else np.arange(n)
+            top = top[np.argsort(-scores[top], kind="stable")]
+
+            # Map positions in the concatenated scores back to (segment, row)
+            ends = np.cumsum(sizes)
+            block_of = np.searchsorted(ends, top, side="right")
+            for j, (pos, b) in enumerate(zip(top, block_of)):
+                seg, start = blocks[b]
+                row = start + pos - (ends[b - 1] if b else 0)
+                ids[i, j] = seg.ids[row]
+                keys[i, j] = str(seg.keys[row])
+                similarity[i, j] = scores[pos]
+
+        return {"ids": ids, "keys": keys, "similarity": similarity}
+
+    def save(self, root: str, metadata: Optional[Dict] = None) -> str:
+        """
+        Persist pending inserts as a new segment and publish a new version.
+
+        Returns:
+            str: path of the written version directory
+        """
+        segments, pending = self._snapshot()
+
+        if len(segments) > MAX_SEGMENTS:
+            print(f"[INFO] Merging {len(segments)} index segments...")
+            segments = [_Segment.merge(segments, self.nlist)]
+        for seg in segments:
+            if seg.name is None:
+                seg.save(root)
+
+        centroid_hash = hashlib.sha1(self.centroids.tobytes()).hexdigest()[:12]
+        quantizer = os.path.join("quantizers", f"{centroid_hash}.npy")
+        if not os.path.exists(os.path.join(root, quantizer)):
+            os.makedirs(os.path.join(root, "quantizers"), exist_ok=True)
+            np.save(os.path.join(root, quantizer), self.centroids)
+
+        digest = hashlib.sha1(centroid_hash.encode())
+        for seg in segments:
+            digest.update(seg.name.encode())
+        version = f"v{time.strftime('%Y%m%d%H%M%S')}-{digest.hexdigest()[:8]}"
+
+        manifest = {
+            **{k: v for k, v in self.manifest.items() if k not in ("format_version", "version")},
+            **(metadata or {}),
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "parent_version": self.version,
+            "dim": int(self.dim),
+            "nlist": int(self.nlist),
+            "nprobe": int(self.nprobe),
+            "n_vectors": int(sum(len(s) for s in segments)),
+            "next_id": int(self.next_id),
+            "quantizer": quantizer,
+            "segments": [seg.name for seg in segments]
+        }
+        out_dir = os.path.join(root, version)
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        tmp = os.path.join(root, f".{LATEST}.tmp")
+        with open(tmp, "w") as f:
+            f.write(version)
+        os.replace(tmp, os.path.join(root, LATEST))
+
+        with self._lock:
+            # Inserts made after the snapshot are not in the new segment; keep them pending
+            self._pending = self._pending[pending:]
+            self._delta = None
+            self._segments = tuple(segments)
+        self.manifest, self.version, self.path = manifest, version, out_dir
+        return out_dir
+
+    @classmethod
+    def load(cls, root: str) -> "IvfIndex":
+        """
+        Memory-map the version named by root/LATEST (or root itself if it is a version dir)
+        """
+        if os.path.exists(os.path.join(root, MANIFEST)):
+            version_dir = root
+        else:
+            with open(os.path.join(root, LATEST)) as f:
+                version_dir = os.path.join(root, f.read().strip())
+        base = os.path.dirname(os.path.abspath(version_dir))
+
+        with open(os.path.join(version_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format {manifest.get('format_version')} in {version_dir}")
+
+        index = cls(np.load(os.path.join(base, manifest["quantizer"])), manifest["nprobe"], manifest)
+        index._segments = tuple(
+            _Segment.load(os.path.join(base, "segments", name), name) for name in manifest["segments"]
+        )
+        index.path = version_dir
+        return index
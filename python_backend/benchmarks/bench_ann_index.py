@@ -0,0 +1,153 @@
+"""
+Recall/latency benchmark of the similar-case index (ann_index.py).
+
+Builds an IVF-Flat index over the stored embeddings (--embeddings) or over
+synthetic unit vectors (N_MODES noisy modes in a LATENT_DIM-dimensional
+subspace plus isotropic noise), then measures quantizer training, insert
+throughput, save and memory-mapped load times, and for every nprobe in
+NPROBE the recall@K against brute force and the single-query latency
+(p50/p99). A brute-force scan over all N rows is timed as the reference.
+Queries are held out of the index.
+
+Results go to benchmarks/results/ann_index.json.
+
+Run from python_backend/:
+    python benchmarks/bench_ann_index.py --n 200000
+    python benchmarks/bench_ann_index.py --embeddings "CNN Output/enhanced_embeddings.npy"
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from ann_index import IvfIndex, exact_search, recall_at_k  # noqa: E402
+
+OUTPUT_JSON = os.path.join(BENCH_DIR, "results", "ann_index.json")
+
+N = 100_000
+DIM = 1024
+N_MODES = 500
+LATENT_DIM = 32  # embeddings vary along few directions, like real CNN features
+LATENT_NOISE = 0.5  # spread around each mode in latent space
+NOISE = 0.05  # isotropic noise in the embedding space
+QUERIES = 200
+K = 10
+NPROBE = [1, 4, 8, 16, 32, 64, 128]
+ADD_CHUNK = 50_000
+
+
+def synthetic_embeddings(n: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    modes = rng.normal(size=(N_MODES, LATENT_DIM)).astype(np.float32)
+    basis = rng.normal(size=(LATENT_DIM, dim)).astype(np.float32) / np.sqrt(LATENT_DIM)
+    X = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, ADD_CHUNK):
+        stop = min(start + ADD_CHUNK, n)
+        latent = modes[rng.integers(0, N_MODES, stop - start)]
+        latent += LATENT_NOISE * rng.standard_normal(latent.shape, dtype=np.float32)
+        X[start:stop] = latent @ basis
+        X[start:stop] += NOISE * rng.standard_normal((stop - start, dim), dtype=np.float32)
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+
+def percentiles(samples_ms) -> dict:
+    samples = np.asarray(samples_ms)
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF-Flat similar-case index")
+    parser.add_argument("--embeddings", help=".npy embeddings (default: synthetic)")
+    parser.add_argument("--n", type=int, default=N)
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--nlist", type=int)
+    parser.add_argument("--queries", type=int, default=QUERIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=OUTPUT_JSON)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        X = np.load(args.embeddings, mmap_mode="r")
+        source = args.embeddings
+    else:
+        X = synthetic_embeddings(args.n + args.queries, args.dim, args.seed)
+        source = f"synthetic({N_MODES} modes in {LATENT_DIM}-d)"
+
+    rng = np.random.default_rng(args.seed)
+    held_out = np.zeros(len(X), dtype=bool)
+    held_out[rng.choice(len(X), size=args.queries, replace=False)] = True
+    queries = np.asarray(X[np.flatnonzero(held_out)], dtype=np.float32)
+    rows = np.flatnonzero(~held_out)
+    print(f"[INFO] {len(rows)} vectors of dim {X.shape[1]} from {source}, {len(queries)} held-out queries")
+
+    results = {"source": source, "n": int(len(rows)), "dim": int(X.shape[1]), "k": K}
+
+    t0 = time.perf_counter()
+    index = IvfIndex.train(X[rows], nlist=args.nlist, seed=args.seed)
+    results["train_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for start in range(0, len(rows), ADD_CHUNK):
+        chunk = rows[start:start+ADD_CHUNK]
+        index.add(X[chunk], ids=chunk)
+    elapsed = time.perf_counter() - t0
+    results["add_vectors_per_s"] = len(rows) / elapsed
+    results["nlist"] = index.nlist
+
+    with tempfile.TemporaryDirectory() as root:
+        t0 = time.perf_counter()
+        index.save(root)
+        results["save_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        index = IvfIndex.load(root)
+        results["load_ms"] = (time.perf_counter() - t0) * 1000
+
+        print("[INFO] Computing exact neighbours...")
+        truth = rows[exact_search(X[rows], queries, K)]
+
+        # Reference: one full matvec plus top-k over every in-memory row
+        X_flat = np.ascontiguousarray(X[rows], dtype=np.float32)
+        brute = []
+        for q in queries[:50]:
+            t0 = time.perf_counter()
+            scores = X_flat @ q
+            np.argpartition(-scores, K)[:K]
+            brute.append((time.perf_counter() - t0) * 1000)
+        del X_flat
+        results["brute_force"] = percentiles(brute)
+
+        results["sweep"] = []
+        print(f"{'nprobe':>6} {'recall@' + str(K):>10} {'p50_ms':>8} {'p99_ms':>8}")
+        for nprobe in NPROBE:
+            index.search(queries[0], K, nprobe=nprobe)  # touch the pages once
+            latencies, found = [], []
+            for q in queries:
+                t0 = time.perf_counter()
+                found.append(index.search(q, K, nprobe=nprobe)["ids"][0])
+                latencies.append((time.perf_counter() - t0) * 1000)
+            row = {"nprobe": nprobe, "recall": recall_at_k(np.array(found), truth), **percentiles(latencies)}
+            results["sweep"].append(row)
+            print(f"{nprobe:>6} {row['recall']:>10.3f} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+    print(f"brute force over {len(rows)} rows: p50 {results['brute_force']['p50_ms']:.2f} ms")
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[INFO] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Latency/throughput sweep of the analyze_xray micro-batching window.
+
+CONCURRENCY client threads each send REQUESTS_PER_CLIENT synthetic X-rays
+through a MicroBatcher over the shared analyzer (as analyze_xray does), once per (max_wait_ms,
+max_batch) setting and once unbatched. p50/p99 latencies are compared with
+the targets below. Enable batching (EXODIA_MICRO_BATCHING=1) only if a
+batched row beats the unbatched one on this hardware, and set
+EXODIA_BATCH_MAX_WAIT_MS / EXODIA_BATCH_MAX_SIZE to that row. The result
+cache is disabled, since every row replays the same images.
+
+Last run: DenseNet121 with random weights (same compute as ImageNet's),
+Grad-CAM on, TensorFlow 2.21, one CPU core. Unbatched: 9.2 img/s, p50
+1.7 s. Batched: 7.8-9.3 img/s and p50 1.7-2.0 s across all windows and
+sizes, so batching stays off by default. No row meets the latency
+targets; at 16 clients on one core the p50 is queueing.
+
+Run from python_backend/:  python benchmarks/bench_micro_batching.py
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from micro_batcher import MicroBatcher  # noqa: E402
+
+CONCURRENCY = 16
+REQUESTS_PER_CLIENT = 8
+IMAGE_SIZE = 1024
+WAIT_MS = [0.0, 2.0, 4.0, 8.0, 16.0]
+MAX_BATCH = [8, 16, 32]
+P50_TARGET_MS = 250.0
+P99_TARGET_MS = 600.0
+OUTPUT_JSON = "benchmarks/results/micro_batching.json"
+
+
+def synthetic_png(rng: np.random.Generator) -> bytes:
+    img = cv2.GaussianBlur(rng.integers(0, 256, (IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8), (9, 9), 0)
+    ok, buf = cv2.imencode(".png", img)
+    return buf.tobytes()
+
+
+def run_load(call, images):
+    """
+    Latencies (ms) of CONCURRENCY clients issuing requests back to back.
+    """
+    def client(c):
+        latencies = []
+        for r in range(REQUESTS_PER_CLIENT):
+            start = time.perf_counter()
+            call(images[(c * REQUESTS_PER_CLIENT + r) % len(images)])
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        latencies = np.concatenate(list(pool.map(client, range(CONCURRENCY))))
+    wall = time.perf_counter() - start
+
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "throughput_rps": len(latencies) / wall
+    }
+
+
+def main():
+    # every row replays the same images, so the result cache would turn the
+    # batched rows into cache hits
+    os.environ["EXODIA_CACHE_SIZE"] = "0"
+    with contextlib.redirect_stdout(io.StringIO()):
+        from inference import analyzer
+
+    rng = np.random.default_rng(0)
+    images = [synthetic_png(rng) for _ in range(32)]
+
+    rows = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer.analyze(images[0])  # warm-up
+        rows.append({"mode": "unbatched", "max_wait_ms": None, "max_batch": 1, **run_load(analyzer.analyze, images)})
+
+        for max_batch in MAX_BATCH:
+            for wait in WAIT_MS:
+                batcher = MicroBatcher(analyzer.analyze_prepared, max_batch=max_batch, max_wait_ms=wait)
+                stats = run_load(lambda image: batcher(analyzer.run_preprocessing_pipeline(image)), images)
+                rows.append({
+                    "mode": "batched",
+                    "max_wait_ms": wait,
+                    "max_batch": max_batch,
+                    **stats,
+                    "mean_batch_size": batcher.stats()["mean_batch_size"]
+                })
+                batcher.close()
+
+    print(f"[INFO] {CONCURRENCY} clients x {REQUESTS_PER_CLIENT} requests, targets p50<={P50_TARGET_MS}ms p99<={P99_TARGET_MS}ms")
+    print(f"{'mode':<10}{'wait_ms':>8}{'batch':>7}{'mean_b':>8}{'p50_ms':>9}{'p99_ms':>9}{'rps':>8}  target")
+    for row in rows:
+        row["meets_target"] = row["p50_ms"] <= P50_TARGET_MS and row["p99_ms"] <= P99_TARGET_MS
+        wait = "-" if row["max_wait_ms"] is None else f"{row['max_wait_ms']:.0f}"
+        print(
+            f"{row['mode']:<10}{wait:>8}{row['max_batch']:>7}{row.get('mean_batch_size', 1.0):>8.1f}"
+            f"{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['throughput_rps']:>8.1f}  "
+            f"{'ok' if row['meets_target'] else 'MISS'}"
+        )
+
+    passing = [r for r in rows if r["mode"] == "batched" and r["meets_target"]]
+    if passing:
+        best = max(passing, key=lambda r: r["throughput_rps"])
+        print(f"[INFO] Best setting meeting targets: max_wait_ms={best['max_wait_ms']}, max_batch={best['max_batch']}")
+    else:
+        print("[WARNING] No batched setting meets the latency targets")
+
+    os.makedirs(os.path.dirname(OUTPUT_JSON), exist_ok=True)
+    with open(OUTPUT_JSON, "w") as f:
+        json.dump({
+            "concurrency": CONCURRENCY,
+            "requests_per_client": REQUESTS_PER_CLIENT,
+            "targets": {"p50_ms": P50_TARGET_MS, "p99_ms": P99_TARGET_MS},
+            "results": rows
+        }, f, indent=2)
+    print(f"[INFO] Saved results to {OUTPUT_JSON}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Per-stage and end-to-end benchmark of the inference pipeline on a synthetic
+DICOM corpus (see synthetic_dicom.py), runnable offline.
+
+The pipeline is pointed at a throwaway model directory holding stand-ins for
+every artifact the numbered scripts produce: preprocessing parameters fitted
+on the corpus as in 01-03, a small seeded CNN in place of the DenseNet
+extractor of 04/05 (saved as feature_extractor.keras; without TensorFlow the
+pipeline's placeholder embeddings are used and the results say so), and a
+clustering bundle fitted on the stand-in embeddings as in 06. The result
+cache is disabled so every request does the full work.
+
+Stages (per image, ms): read, decode (also broken down by resolution, bit
+depth and transfer syntax), clean, quality, model_input, embed,
+embed_gradcam (embedding plus Grad-CAM), embed_batch (per image at
+EMBED_BATCH), cluster and report (findings, heatmap peaks and grid). End to
+end: serial analyze() latency and analyze_xray() throughput from CONCURRENCY
+clients.
+
+Results go to benchmarks/results/pipeline.json. --save-baseline also stores
+them as the baseline; otherwise, if a baseline exists, each stage's p50
+latency and throughput are compared with it and the script exits with
+status 1 when any regresses by more than --tolerance. --check is the
+regression mode for CI: a missing baseline is then an error (status 2)
+instead of a note.
+
+benchmarks/baselines/pipeline.json is a committed reference run (its
+"environment" records where); re-record it with --save-baseline on the
+machine that runs --check.
+
+Run from python_backend/:
+    python benchmarks/bench_pipeline.py --check
+    python benchmarks/bench_pipeline.py --save-baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import preprocessing  # noqa: E402
+from cluster_bundle import save_bundle  # noqa: E402
+from synthetic_dicom import generate_corpus  # noqa: E402
+
+CORPUS_DIR = os.path.join(BENCH_DIR, "corpus")
+OUTPUT_JSON = os.path.join(BENCH_DIR, "results", "pipeline.json")
+BASELINE_JSON = os.path.join(BENCH_DIR, "baselines", "pipeline.json")
+RESULT_FORMAT = 1
+
+CORPUS_SIZE = 54
+REPEATS = 3
+EMBED_BATCH = 16
+CONCURRENCY = 8
+EMBEDDING_DIM = 1024
+N_CLUSTERS = 5
+TOLERANCE = 0.2  # fractional slowdown that counts as a regression
+MIN_DELTA_MS = 0.05  # ignore regressions smaller than this on fast stages
+
+
+def summarize(samples_ms: List[float]) -> Dict:
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "n": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "throughput_ips": float(1000.0 / samples.mean()) if samples.mean() > 0 else None
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    value = fn(*args)
+    return value, (time.perf_counter() - start) * 1000
+
+
+def fit_params(images: List[np.ndarray], params_path: str) -> Dict:
+    """
+    Stage 01-03 parameters fitted on the decoded corpus.
+    """
+    h = min(img.shape[0] for img in images)
+    w = min(img.shape[1] for img in images)
+    preprocessing.save_params("cleaner", {"target_size": [w, h]}, params_path)
+    params = preprocessing.load_params(params_path)
+
+    rows = [preprocessing.quality_metrics(preprocessing.clean_image(img, params)) for img in images]
+    table = {m: np.array([r[m] for r in rows]) for m in preprocessing.METRICS}
+    preprocessing.save_params("evaluator", {
+        "weights": list(preprocessing.AQI_WEIGHTS),
+        "min": {m: float(v.min()) for m, v in table.items()},
+        "max": {m: float(v.max()) for m, v in table.items()},
+        "q1": {m: float(np.quantile(v, 0.25)) for m, v in table.items()},
+        "q3": {m: float(np.quantile(v, 0.75)) for m, v in table.items()}
+    }, params_path)
+    params = preprocessing.load_params(params_path)
+
+    scored = [preprocessing.score_quality(r, params) for r in rows]
+    aqi = np.array([s["AQI"] for s in scored])
+    ambiguity = np.array([s["acquisition_ambiguity"] for s in scored])
+    preprocessing.save_params("tagger", {
+        "aqi_q1": float(np.quantile(aqi, 0.25)),
+        "aqi_q3": float(np.quantile(aqi, 0.75)),
+        "ambiguity_q3": float(np.quantile(ambiguity, 0.75))
+    }, params_path)
+    return preprocessing.load_params(params_path)
+
+
+def build_standin_extractor(path: str, seed: int):
+    """
+    Small seeded CNN with the extractor's input and output shapes, or None without TensorFlow.
+    """
+    try:
+        import tensorflow as tf
+    except ImportError:
+        return None
+
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input(shape=(*preprocessing.IMG_SIZE, 3))
+    x = inputs
+    for filters in (16, 32, 64):
+        x = tf.keras.layers.Conv2D(filters, 3, strides=2, padding="same", activation="relu")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(EMBEDDING_DIM)(x)
+    model = tf.keras.Model(inputs, outputs, name="standin_extractor")
+    model.save(path)
+    return model
+
+
+def fit_bundle(bundle_dir: str, embeddings: np.ndarray, seed: int) -> None:
+    """
+    Stage 06 clustering bundle fitted on the stand-in embeddings.
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(embeddings)
+    X = scaler.transform(embeddings)
+    pca = PCA(n_components=min(32, len(X) - 1), random_state=seed).fit(X)
+    X_pca = pca.transform(X)
+    kmeans = KMeans(n_clusters=min(N_CLUSTERS, len(X)), n_init=4, random_state=seed).fit(X_pca)
+    distances = np.min(kmeans.transform(X_pca), axis=1)
+
+    save_bundle(
+        bundle_dir,
+        scaler_mean=scaler.mean_,
+        scaler_scale=scaler.scale_,
+        pca_mean=pca.mean_,
+        pca_components=pca.components_,
+        centroids=kmeans.cluster_centers_,
+        stability=np.full(kmeans.n_clusters, 0.8),
+        ambiguity_threshold=float(np.quantile(distances, 0.9)),
+        train_distances=distances,
+        metadata={"kmeans_k": int(kmeans.n_clusters), "stability_source": "benchmark_standin"}
+    )
+
+
+def build_model_dir(model_dir: str, images: List[np.ndarray], seed: int) -> str:
+    """
+    Write stand-in artifacts for inference.py; returns the extractor kind.
+    """
+    params = fit_params(images, os.path.join(model_dir, "preprocessing_params.json"))
+    model = build_standin_extractor(os.path.join(model_dir, "feature_extractor.keras"), seed)
+
+    inputs = np.stack([preprocessing.model_input(preprocessing.clean_image(img, params)) for img in images])
+    if model is not None:
+        embeddings = model.predict(inputs, batch_size=EMBED_BATCH, verbose=0)
+    else:
+        embeddings = np.random.default_rng(seed).random((len(images), EMBEDDING_DIM))
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    fit_bundle(os.path.join(model_dir, "clustering_bundle"), embeddings.astype(np.float32), seed)
+    return "standin_cnn" if model is not None else "placeholder"
+
+
+def bench_stages(analyzer, corpus_dir: str, files: List[Dict], repeats: int) -> Dict:
+    """
+    Per-image latency of every pipeline stage, run in isolation.
+    """
+    samples = defaultdict(list)
+    decode_by_variant = defaultdict(list)
+    inputs = []
+
+    for _ in range(repeats):
+        for entry in files:
+            data, ms = timed(lambda p: open(p, "rb").read(), os.path.join(corpus_dir, entry["file"]))
+            samples["read"].append(ms)
+
+            decoded, ms = timed(preprocessing.decode_image, data)
+            samples["decode"].append(ms)
+            decode_by_variant[f"{entry['rows']}x{entry['cols']}/{entry['bits']}bit/{entry['syntax']}"].append(ms)
+
+            img, ms = timed(preprocessing.clean_image, decoded, analyzer.params)
+            samples["clean"].append(ms)
+
+            quality, ms = timed(lambda i: preprocessing.score_quality(preprocessing.quality_metrics(i), analyzer.params), img)
+            samples["quality"].append(ms)
+
+            model_input, ms = timed(preprocessing.model_input, img)
+            samples["model_input"].append(ms)
+
+            features, ms = timed(analyzer.extract_embeddings, model_input[None])
+            samples["embed"].append(ms)
+
+            (_, cams), ms = timed(analyzer.extract_features, model_input[None], [True])
+            samples["embed_gradcam"].append(ms)
+
+            cluster_info, ms = timed(analyzer.run_clustering_batch, features)
+            samples["cluster"].append(ms)
+
+            prepared = {"image": img, "input": model_input, "quality": quality, "cache_key": None}
+            _, ms = timed(analyzer.build_result, prepared, features[0], cluster_info[0], cams[0])
+            samples["report"].append(ms)
+
+            inputs.append(model_input)
+
+    for start in range(0, len(inputs) - EMBED_BATCH + 1, EMBED_BATCH):
+        _, ms = timed(analyzer.extract_embeddings, np.stack(inputs[start:start + EMBED_BATCH]))
+        samples["embed_batch"].extend([ms / EMBED_BATCH] * EMBED_BATCH)
+
+    return {
+        "stages": {name: summarize(values) for name, values in samples.items()},
+        "decode_by_variant": {name: summarize(values) for name, values in sorted(decode_by_variant.items())}
+    }
+
+
+def bench_end_to_end(inference, payloads: List[bytes], repeats: int) -> Dict:
+    """
+    Serial analyze() latency and concurrent analyze_xray() throughput.
+    """
+    serial = []
+    for _ in range(repeats):
+        for data in payloads:
+            serial.append(timed(inference.analyzer.analyze, data)[1])
+
+    requests = [payloads[i % len(payloads)] for i in range(len(payloads) * repeats)]
+    latencies = []
+
+    def client(c):
+        return [timed(inference.analyze_xray, data)[1] for data in requests[c::CONCURRENCY]]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(CONCURRENCY) as pool:
+        for values in pool.map(client, range(CONCURRENCY)):
+            latencies.extend(values)
+    wall = time.perf_counter() - start
+
+    concurrent = summarize(latencies)
+    concurrent["throughput_ips"] = len(latencies) / wall
+    concurrent["concurrency"] = CONCURRENCY
+    return {"serial": summarize(serial), "concurrent": concurrent}
+
+
+def environment() -> Dict:
+    import cv2
+    import pydicom
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "pydicom": pydicom.__version__
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """
+    Stage/end-to-end entries whose p50 latency or throughput regressed beyond tolerance.
+    """
+    def entries(results):
+        out = {f"stage:{k}": v for k, v in results["stages"].items()}
+        out.update({f"end_to_end:{k}": v for k, v in results["end_to_end"].items()})
+        return out
+
+    regressions = []
+    base = entries(baseline)
+    for name, cur in entries(current).items():
+        if name not in base:
+            continue
+        old = base[name]
+        p50_delta = cur["p50_ms"] - old["p50_ms"]
+        slower = cur["p50_ms"] > old["p50_ms"] * (1 + tolerance) and p50_delta > MIN_DELTA_MS
+        fewer = (
+            cur.get("throughput_ips") and old.get("throughput_ips")
+            and cur["throughput_ips"] < old["throughput_ips"] * (1 - tolerance)
+            and p50_delta > MIN_DELTA_MS
+        )
+        if slower or fewer:
+            regressions.append({
+                "name": name,
+                "baseline_p50_ms": old["p50_ms"],
+                "p50_ms": cur["p50_ms"],
+                "baseline_throughput_ips": old.get("throughput_ips"),
+                "throughput_ips": cur.get("throughput_ips")
+            })
+    return regressions
+
+
+def print_report(results: Dict, baseline: Dict = None) -> None:
+    base = baseline or {}
+    rows = [(f"{k}", v, base.get("stages", {}).get(k)) for k, v in results["stages"].items()]
+    rows += [(f"e2e/{k}", v, base.get("end_to_end", {}).get(k)) for k, v in results["end_to_end"].items()]
+
+    print(f"{'stage':<18}{'p50_ms':>9}{'p95_ms':>9}{'p99_ms':>9}{'img/s':>9}{'vs base':>9}")
+    for name, stats, old in rows:
+        change = f"{(stats['p50_ms'] / old['p50_ms'] - 1) * 100:+.0f}%" if old and old["p50_ms"] > 0 else "-"
+        print(
+            f"{name:<18}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+            f"{stats['throughput_ips']:>9.1f}{change:>9}"
+        )
+
+    print(f"\n{'decode variant':<36}{'p50_ms':>9}{'p99_ms':>9}")
+    for name, stats in results["decode_by_variant"].items():
+        print(f"{name:<36}{stats['p50_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference pipeline on a synthetic DICOM corpus")
+    parser.add_argument("--corpus-size", type=int, default=CORPUS_SIZE)
+    parser.add_argument("--corpus-dir", default=CORPUS_DIR)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--output", default=OUTPUT_JSON)
+    parser.add_argument("--baseline", default=BASELINE_JSON)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail when there is no baseline to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    if args.check and args.save_baseline:
+        parser.error("--check and --save-baseline are mutually exclusive")
+    if args.check and not os.path.exists(args.baseline):
+        # Fail before the (slow) run rather than after it
+        print(f"[ERROR] No baseline at {args.baseline}; record one with --save-baseline")
+        sys.exit(2)
+
+    manifest = generate_corpus(args.corpus_dir, args.corpus_size, args.seed)
+    files = manifest["files"]
+    payloads = []
+    for entry in files:
+        with open(os.path.join(args.corpus_dir, entry["file"]), "rb") as f:
+            payloads.append(f.read())
+
+    with tempfile.TemporaryDirectory(prefix="exodia-bench-") as model_dir:
+        print("[INFO] Building stand-in model artifacts...")
+        extractor = build_model_dir(model_dir, [preprocessing.decode_image(p) for p in payloads], args.seed)
+
+        os.environ["EXODIA_MODEL_DIR"] = model_dir
+        os.environ["EXODIA_CACHE_SIZE"] = "0"
+        with contextlib.redirect_stdout(io.StringIO()):
+            import inference
+
+            print("[INFO] Benchmarking stages...", file=sys.stderr)
+            stages = bench_stages(inference.analyzer, args.corpus_dir, files, args.repeats)
+            end_to_end = bench_end_to_end(inference, payloads, args.repeats)
+
+    results = {
+        "format_version": RESULT_FORMAT,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "corpus": manifest["config"],
+        "extractor": extractor,
+        "repeats": args.repeats,
+        "embed_batch": EMBED_BATCH,
+        **stages,
+        "end_to_end": end_to_end
+    }
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"[INFO] {len(files)} files x {args.repeats} repeats, extractor: {extractor}")
+    print_report(results, baseline)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[INFO] Saved results to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[INFO] Saved baseline to {args.baseline}")
+        return
+
+    if baseline is None:
+        print("[INFO] No baseline to compare against; run with --save-baseline to create one")
+        return
+
+    for key in ("corpus", "extractor"):
+        if baseline.get(key) != results[key]:
+            print(f"[WARNING] Baseline {key} differs from this run; comparison may not be meaningful")
+    if baseline.get("environment") != results["environment"]:
+        print("[WARNING] Baseline was recorded on a different environment")
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"[ERROR] {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for r in regressions:
+            print(f"  {r['name']}: p50 {r['baseline_p50_ms']:.2f} -> {r['p50_ms']:.2f} ms")
+        sys.exit(1)
+    print(f"[INFO] No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Reproducible synthetic chest X-ray DICOM corpus for the benchmarks.
+
+Each file is a procedurally drawn chest phantom (body outline, lung fields,
+ribs, heart shadow, optional consolidation, quantum noise) stored as a
+MONOCHROME2 DICOM with one of RESOLUTIONS, BIT_DEPTHS and TRANSFER_SYNTAXES.
+Files cycle through a seeded shuffle of every combination, so small corpora
+still mix variants and any corpus of at least
+len(RESOLUTIONS) * len(BIT_DEPTHS) * len(TRANSFER_SYNTAXES) files covers all
+of them; a given (seed, count) always produces identical pixel data.
+Encoders that need optional plugins (JPEG-LS, JPEG 2000) are skipped when
+unavailable.
+
+A manifest.json next to the files records each file's variant, so a corpus
+is only regenerated when its configuration changes.
+
+Run from python_backend/:  python benchmarks/synthetic_dicom.py --count 96 --out benchmarks/corpus
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from typing import Dict, List, Sequence
+
+import cv2
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import (
+    DeflatedExplicitVRLittleEndian,
+    DigitalXRayImageStorageForPresentation,
+    ExplicitVRLittleEndian,
+    ImplicitVRLittleEndian,
+    JPEG2000Lossless,
+    JPEGLSLossless,
+    RLELossless
+)
+
+RESOLUTIONS = [(512, 512), (1024, 1024), (2048, 2500)]
+BIT_DEPTHS = [8, 12, 16]
+TRANSFER_SYNTAXES = {
+    "explicit_le": ExplicitVRLittleEndian,
+    "implicit_le": ImplicitVRLittleEndian,
+    "deflated_le": DeflatedExplicitVRLittleEndian,
+    "rle": RLELossless,
+    "jpeg_ls": JPEGLSLossless,
+    "jpeg2000": JPEG2000Lossless
+}
+UNCOMPRESSED = {"explicit_le", "implicit_le"}
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def available_syntaxes(names: Sequence[str] = tuple(TRANSFER_SYNTAXES)) -> List[str]:
+    """
+    Transfer syntaxes that this pydicom install can both encode and decode.
+    """
+    from pydicom.pixels import get_decoder, get_encoder
+
+    out = []
+    for name in names:
+        uid = TRANSFER_SYNTAXES[name]
+        if name in UNCOMPRESSED or name == "deflated_le":
+            out.append(name)
+            continue
+        try:
+            if get_encoder(uid).is_available and get_decoder(uid).is_available:
+                out.append(name)
+        except (NotImplementedError, ValueError):
+            pass
+    return out
+
+
+def chest_phantom(rng: np.random.Generator, rows: int, cols: int, bits: int) -> np.ndarray:
+    """
+    Synthetic frontal chest radiograph scaled to the given bit depth.
+    """
+    img = np.zeros((rows, cols), dtype=np.float32)
+    cy, cx = rows / 2, cols / 2
+    jitter = lambda scale: 1 + rng.uniform(-scale, scale)
+
+    # Soft tissue of the thorax and the two (radiolucent) lung fields
+    cv2.ellipse(img, (int(cx), int(cy * 1.05)), (int(cols * 0.42 * jitter(0.05)), int(rows * 0.47)), 0, 0, 360, 0.55, -1)
+    for side in (-1, 1):
+        center = (int(cx + side * cols * 0.18 * jitter(0.05)), int(cy * 0.95))
+        axes = (int(cols * 0.14 * jitter(0.1)), int(rows * 0.3 * jitter(0.1)))
+        cv2.ellipse(img, center, axes, side * 8, 0, 360, 0.2, -1)
+
+    # Ribs: curved bright bands across each hemithorax
+    y = np.arange(rows, dtype=np.float32)[:, None]
+    x = np.arange(cols, dtype=np.float32)[None, :]
+    spacing = rows * 0.065 * jitter(0.1)
+    curve = 0.25 * ((x - cx) / cols) ** 2 * rows
+    ribs = 0.5 + 0.5 * np.cos(2 * np.pi * (y - curve) / spacing)
+    thorax = (np.abs(x - cx) < cols * 0.38) & (y > rows * 0.18) & (y < rows * 0.78)
+    img += 0.12 * (ribs ** 8) * thorax
+
+    # Heart shadow and, for some studies, a consolidation
+    cv2.ellipse(img, (int(cx + cols * 0.05), int(cy * 1.15)), (int(cols * 0.12), int(rows * 0.14)), 20, 0, 360, 0.5, -1)
+    if rng.random() < 0.5:
+        side = rng.choice([-1, 1])
+        center = (int(cx + side * cols * 0.18), int(rows * rng.uniform(0.4, 0.65)))
+        patch = np.zeros_like(img)
+        cv2.circle(patch, center, int(min(rows, cols) * rng.uniform(0.04, 0.1)), 0.25, -1)
+        img += cv2.GaussianBlur(patch, (0, 0), min(rows, cols) * 0.02)
+
+    img = cv2.GaussianBlur(img, (0, 0), max(1.0, min(rows, cols) / 400))
+    max_value = (1 << bits) - 1
+    counts = np.clip(img, 0, 1) * max_value
+    counts += rng.normal(0, 0.01 * max_value, size=counts.shape).astype(np.float32)
+    dtype = np.uint8 if bits <= 8 else np.uint16
+    return np.clip(counts, 0, max_value).astype(dtype)
+
+
+def make_dataset(pixels: np.ndarray, bits: int, syntax: str, index: int) -> Dataset:
+    """
+    DICOM dataset holding pixels, encoded with the named transfer syntax.
+    """
+    uid = pydicom.uid.generate_uid(entropy_srcs=[f"exodia-bench-{index}"])
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = DigitalXRayImageStorageForPresentation
+    ds.file_meta.MediaStorageSOPInstanceUID = uid
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds.SOPClassUID = DigitalXRayImageStorageForPresentation
+    ds.SOPInstanceUID = uid
+    ds.Modality = "DX"
+    ds.PatientID = f"SYNTH{index:05d}"
+    ds.ViewPosition = "PA"
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = pixels.dtype.itemsize * 8
+    ds.BitsStored = bits
+    ds.HighBit = bits - 1
+    ds.PixelRepresentation = 0
+    ds.PixelData = pixels.tobytes()
+
+    uid = TRANSFER_SYNTAXES[syntax]
+    if uid.is_compressed:
+        ds.compress(uid, pixels)
+    else:
+        ds.file_meta.TransferSyntaxUID = uid
+    return ds
+
+
+def corpus_config(count: int, seed: int, resolutions, bit_depths, syntaxes) -> Dict:
+    return {
+        "format_version": FORMAT_VERSION,
+        "count": count,
+        "seed": seed,
+        "resolutions": [list(r) for r in resolutions],
+        "bit_depths": list(bit_depths),
+        "syntaxes": list(syntaxes)
+    }
+
+
+def generate_corpus(
+    out_dir: str,
+    count: int,
+    seed: int = 0,
+    resolutions=RESOLUTIONS,
+    bit_depths=BIT_DEPTHS,
+    syntaxes: Sequence[str] = None
+) -> Dict:
+    """
+    Write count synthetic DICOM files to out_dir, reusing an identical existing corpus.
+
+    Returns:
+        dict: manifest {"config": {...}, "files": [{"file", "rows", "cols", "bits", "syntax", "bytes"}, ...]}
+    """
+    syntaxes = available_syntaxes(syntaxes or tuple(TRANSFER_SYNTAXES))
+    config = corpus_config(count, seed, resolutions, bit_depths, syntaxes)
+
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("config") == config and all(
+            os.path.exists(os.path.join(out_dir, e["file"])) for e in manifest["files"]
+        ):
+            print(f"[INFO] Reusing synthetic corpus in {out_dir} ({count} files)")
+            return manifest
+
+    os.makedirs(out_dir, exist_ok=True)
+    variants = list(itertools.product(resolutions, bit_depths, syntaxes))
+    order = np.random.default_rng(seed).permutation(len(variants))
+    variants = [variants[j] for j in order]
+    files = []
+    for i in range(count):
+        (rows, cols), bits, syntax = variants[i % len(variants)]
+        rng = np.random.default_rng([seed, i])
+        pixels = chest_phantom(rng, rows, cols, bits)
+        name = f"synth_{i:05d}_{rows}x{cols}_{bits}bit_{syntax}.dcm"
+        path = os.path.join(out_dir, name)
+        make_dataset(pixels, bits, syntax, i).save_as(path, enforce_file_format=True)
+        files.append({
+            "file": name,
+            "rows": rows,
+            "cols": cols,
+            "bits": bits,
+            "syntax": syntax,
+            "bytes": os.path.getsize(path),
+            "pixel_sha1": hashlib.sha1(pixels.tobytes()).hexdigest()
+        })
+
+    manifest = {"config": config, "files": files}
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[INFO] Wrote {count} synthetic DICOM files to {out_dir} ({', '.join(syntaxes)})")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic chest X-ray DICOM corpus")
+    parser.add_argument("--out", default="benchmarks/corpus")
+    parser.add_argument("--count", type=int, default=len(RESOLUTIONS) * len(BIT_DEPTHS) * 4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--syntaxes", nargs="+", choices=list(TRANSFER_SYNTAXES))
+    args = parser.parse_args()
+    generate_corpus(args.out, args.count, args.seed, syntaxes=args.syntaxes)
+
+
+if __name__ == "__main__":
+    main()
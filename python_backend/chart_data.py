@@ -0,0 +1,204 @@
+"""
+Compact chart data for the web dashboard, exported by 08_aqi_visualizer.py.
+
+Instead of shipping the PNG figures, every chart is written as a small JSON
+document of precomputed aggregates (histogram bins, KDE curve, box-plot
+quantiles, correlation matrix, sparse hexbin counts) that the client can draw
+and filter interactively. Each document carries a schema version and a
+content hash; index.json lists them all so the client can fetch only what
+changed. Files whose content is unchanged are not rewritten.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 1
+INDEX_FILE = "index.json"
+KDE_POINTS = 256        # KDE grid is downsampled to this many points
+SIGNIFICANT_DIGITS = 6
+HEXBIN_GRIDSIZE = 50
+
+
+def _round(values, digits: int = SIGNIFICANT_DIGITS) -> List:
+    """
+    Floats rounded to a fixed number of significant digits, as a plain list.
+    """
+    arr = np.asarray(values, dtype=np.float64)
+    return [float(f"{v:.{digits}g}") if np.isfinite(v) else None for v in arr.ravel()]
+
+
+def histogram_chart(summary: Dict, kde_points: int = KDE_POINTS) -> Dict:
+    """
+    Histogram bins, KDE curve (count units) and box-plot quantiles of one column.
+    """
+    edges = np.asarray(summary["hist"]["edges"])
+    x = np.asarray(summary["kde"]["x"])
+    density = np.asarray(summary["kde"]["density"])
+
+    step = max(1, int(np.ceil(len(x) / kde_points)))
+    bin_width = edges[1] - edges[0] if len(edges) > 1 else 0.0
+
+    return {
+        "n": summary["n"],
+        "mean": _round([summary["mean"]])[0],
+        "std": _round([summary["std"]])[0],
+        "min": _round([summary["min"]])[0],
+        "max": _round([summary["max"]])[0],
+        "histogram": {
+            "edges": _round(edges),
+            "counts": [int(c) for c in summary["hist"]["counts"]]
+        },
+        "kde": {
+            "bandwidth": _round([summary["kde"]["bandwidth"]])[0],
+            "x": _round(x[::step]),
+            "density": _round(density[::step]),
+            "counts": _round(density[::step] * summary["n"] * bin_width)
+        },
+        "box": {k: (v if isinstance(v, int) else _round([v])[0]) for k, v in summary["box"].items()}
+    }
+
+
+def correlation_chart(df: pd.DataFrame, columns: List[str]) -> Dict:
+    """
+    Pearson correlation matrix of the given columns.
+    """
+    columns = [c for c in columns if c in df.columns]
+    corr = df[columns].corr().values
+    return {
+        "columns": columns,
+        "matrix": [_round(row, 4) for row in corr]
+    }
+
+
+def hexbin_counts(x: np.ndarray, y: np.ndarray, gridsize: int = HEXBIN_GRIDSIZE) -> Dict:
+    """
+    Sparse hexagonal bin counts using matplotlib's hexbin lattice.
+
+    Cells are numbered over two interleaved lattices: cell < (nx+1)*(ny+1)
+    is centred at (xmin + i*sx, ymin + j*sy) with i, j = divmod(cell, ny+1);
+    the rest, c = cell - (nx+1)*(ny+1), at (xmin + (i+0.5)*sx, ymin + (j+0.5)*sy)
+    with i, j = divmod(c, ny). Only non-empty cells are listed.
+
+    Returns:
+        dict: {"gridsize", "lattice": [nx, ny], "extent": [xmin, xmax, ymin, ymax],
+               "hex_size": [sx, sy], "cell": cell ids, "count": counts}
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+
+    nx = gridsize
+    ny = max(1, int(nx / np.sqrt(3)))
+    xmin, xmax = (x.min(), x.max()) if len(x) else (0.0, 1.0)
+    ymin, ymax = (y.min(), y.max()) if len(y) else (0.0, 1.0)
+    if xmax == xmin:
+        xmin, xmax = xmin - 0.5, xmax + 0.5
+    if ymax == ymin:
+        ymin, ymax = ymin - 0.5, ymax + 0.5
+    pad = 1e-9 * (xmax - xmin)
+    xmin, xmax = xmin - pad, xmax + pad
+
+    sx = (xmax - xmin) / nx
+    sy = (ymax - ymin) / ny
+    ix = (x - xmin) / sx
+    iy = (y - ymin) / sy
+
+    # Two interleaved rectangular lattices; each point goes to the nearer centre
+    ix1, iy1 = np.round(ix).astype(int), np.round(iy).astype(int)
+    ix2, iy2 = np.floor(ix).astype(int), np.floor(iy).astype(int)
+    d1 = (ix - ix1) ** 2 + 3.0 * (iy - iy1) ** 2
+    d2 = (ix - ix2 - 0.5) ** 2 + 3.0 * (iy - iy2 - 0.5) ** 2
+    first = d1 < d2
+
+    n1 = (nx + 1) * (ny + 1)
+    counts1 = np.bincount(ix1[first] * (ny + 1) + iy1[first], minlength=n1)
+    counts2 = np.bincount(ix2[~first] * ny + iy2[~first], minlength=nx * ny)
+
+    counts = np.concatenate([counts1, counts2])
+    cells = np.flatnonzero(counts)
+
+    return {
+        "gridsize": int(gridsize),
+        "lattice": [int(nx), int(ny)],
+        "extent": _round([xmin, xmax, ymin, ymax], 10),
+        "hex_size": _round([sx, sy], 10),
+        "cell": [int(c) for c in cells],
+        "count": [int(c) for c in counts[cells]]
+    }
+
+
+def _write_if_changed(path: str, payload: bytes) -> bool:
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            if f.read() == payload:
+                return False
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+    return True
+
+
+def export_charts(charts: Dict[str, Dict], out_dir: str, source: str = None) -> Dict:
+    """
+    Write one versioned JSON document per chart plus an index.
+
+    Args:
+        charts: chart name -> {"type": str, "data": dict}
+
+    Returns:
+        dict: the index written to out_dir/index.json, with a per-chart "changed" flag
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    entries = {}
+
+    for name, chart in charts.items():
+        body = json.dumps(chart["data"], separators=(",", ":"), sort_keys=True)
+        content_hash = hashlib.sha1(body.encode()).hexdigest()[:12]
+        document = {
+            "schema_version": SCHEMA_VERSION,
+            "chart": name,
+            "type": chart["type"],
+            "hash": content_hash,
+            "data": chart["data"]
+        }
+        payload = json.dumps(document, separators=(",", ":"), sort_keys=True).encode()
+        file_name = f"{name}.json"
+        changed = _write_if_changed(os.path.join(out_dir, file_name), payload)
+
+        entries[name] = {
+            "type": chart["type"],
+            "file": file_name,
+            "hash": content_hash,
+            "bytes": len(payload),
+            "changed": changed
+        }
+
+    index_path = os.path.join(out_dir, INDEX_FILE)
+    previous = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path) as f:
+                previous = json.load(f)
+        except (OSError, ValueError):
+            previous = {}
+
+    index = {
+        "schema_version": SCHEMA_VERSION,
+        "source": source,
+        "charts": {name: {k: v for k, v in e.items() if k != "changed"} for name, e in entries.items()}
+    }
+    if previous.get("charts") == index["charts"] and previous.get("source") == source:
+        index["generated_at"] = previous.get("generated_at")
+    else:
+        index["generated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    _write_if_changed(index_path, json.dumps(index, indent=2, sort_keys=True).encode())
+    return {**index, "charts": entries}
@@ -0,0 +1,232 @@
+"""
+Versioned clustering model bundle and online cluster assignment.
+
+06_model_clusterer.py saves the fitted scaler, PCA, KMeans centroids,
+per-cluster stability and the ambiguity threshold as plain .npy arrays under
+<root>/<version>/, with <root>/LATEST naming the current version. Loading maps
+the arrays read-only, so several worker processes share one copy.
+
+The scaler and PCA are folded into a single affine projection at save time,
+so assigning one embedding is one (D x P) matvec plus a (K x P) distance.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+LATEST = "LATEST"
+MANIFEST = "manifest.json"
+N_DISTANCE_QUANTILES = 101
+
+ARRAYS = (
+    "projection",
+    "offset",
+    "centroids",
+    "centroid_sq_norms",
+    "stability",
+    "distance_quantiles"
+)
+
+
+def fold_projection(
+    scaler_mean: np.ndarray,
+    scaler_scale: np.ndarray,
+    pca_mean: np.ndarray,
+    pca_components: np.ndarray
+):
+    """
+    Fold StandardScaler + PCA into z = x @ projection + offset.
+    """
+    projection = pca_components.T / scaler_scale[:, None]
+    offset = -(scaler_mean / scaler_scale + pca_mean) @ pca_components.T
+    return projection.astype(np.float32), offset.astype(np.float32)
+
+
+def _write_version(root: str, arrays: Dict, manifest: Dict) -> str:
+    digest = hashlib.sha1()
+    for name in ARRAYS:
+        digest.update(arrays[name].tobytes())
+    version = f"v{time.strftime('%Y%m%d%H%M%S')}-{digest.hexdigest()[:8]}"
+
+    out_dir = os.path.join(root, version)
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(out_dir, f"{name}.npy"), arrays[name])
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump({**manifest, "format_version": FORMAT_VERSION, "version": version}, f, indent=2)
+
+    tmp = os.path.join(root, f".{LATEST}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(root, LATEST))
+
+    return out_dir
+
+
+def save_bundle(
+    root: str,
+    scaler_mean: np.ndarray,
+    scaler_scale: np.ndarray,
+    pca_mean: np.ndarray,
+    pca_components: np.ndarray,
+    centroids: np.ndarray,
+    stability: np.ndarray,
+    ambiguity_threshold: float,
+    train_distances: np.ndarray,
+    metadata: Optional[Dict] = None
+) -> str:
+    """
+    Write a new bundle version under root and point LATEST at it.
+
+    Returns:
+        str: path of the written version directory
+    """
+    projection, offset = fold_projection(scaler_mean, scaler_scale, pca_mean, pca_components)
+    centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+
+    arrays = {
+        "projection": np.ascontiguousarray(projection),
+        "offset": offset,
+        "centroids": centroids,
+        "centroid_sq_norms": np.sum(centroids.astype(np.float64) ** 2, axis=1).astype(np.float32),
+        "stability": np.asarray(stability, dtype=np.float32),
+        "distance_quantiles": np.quantile(
+            train_distances, np.linspace(0, 1, N_DISTANCE_QUANTILES)
+        ).astype(np.float32)
+    }
+
+    manifest = {
+        "n_features": int(projection.shape[0]),
+        "n_components": int(projection.shape[1]),
+        "n_clusters": int(centroids.shape[0]),
+        "ambiguity_threshold": float(ambiguity_threshold),
+        **(metadata or {})
+    }
+    return _write_version(root, arrays, manifest)
+
+
+def update_stability(root: str, stability: np.ndarray, source: str) -> str:
+    """
+    Publish a new version of the latest bundle with replaced stability scores.
+
+    Versions are never modified in place, so running workers keep a
+    consistent view until they reload.
+    """
+    bundle = ClusterBundle.load(root)
+    if len(stability) != bundle.manifest["n_clusters"]:
+        raise ValueError(f"Expected {bundle.manifest['n_clusters']} stability scores, got {len(stability)}")
+
+    arrays = {name: getattr(bundle, name) for name in ARRAYS}
+    arrays["stability"] = np.asarray(stability, dtype=np.float32)
+
+    manifest = {k: v for k, v in bundle.manifest.items() if k not in ("format_version", "version")}
+    manifest["stability_source"] = source
+    manifest["parent_version"] = bundle.version
+    return _write_version(root, arrays, manifest)
+
+
+def latest_bundle_dir(root: str) -> str:
+    with open(os.path.join(root, LATEST)) as f:
+        return os.path.join(root, f.read().strip())
+
+
+class ClusterBundle:
+    """
+    Read-only, memory-mapped clustering bundle with online assignment.
+    """
+
+    def __init__(self, bundle_dir: str):
+        with open(os.path.join(bundle_dir, MANIFEST)) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported bundle format {self.manifest.get('format_version')} in {bundle_dir}"
+            )
+
+        self.path = bundle_dir
+        self.version = self.manifest["version"]
+        self.ambiguity_threshold = np.float32(self.manifest["ambiguity_threshold"])
+
+        # Plain ndarray views over the maps avoid np.memmap's per-op overhead
+        for name in ARRAYS:
+            mapped = np.load(os.path.join(bundle_dir, f"{name}.npy"), mmap_mode="r")
+            setattr(self, name, np.asarray(mapped))
+
+    @classmethod
+    def load(cls, root: str) -> "ClusterBundle":
+        """
+        Load the version named by root/LATEST (or root itself if it is a version dir)
+        """
+        if os.path.exists(os.path.join(root, MANIFEST)):
+            return cls(root)
+        return cls(latest_bundle_dir(root))
+
+    def project(self, X: np.ndarray) -> np.ndarray:
+        """
+        Map raw embeddings (D,) or (N, D) into the clustering PCA space.
+        """
+        return np.asarray(X, dtype=np.float32) @ self.projection + self.offset
+
+    def distance_percentile(self, distance):
+        """
+        Position of a distance within the training distance distribution (0-1).
+        """
+        q = self.distance_quantiles
+        return np.interp(distance, q, np.linspace(0.0, 1.0, len(q)))
+
+    def assign_batch(self, X: np.ndarray) -> Dict:
+        """
+        Assign a batch of embeddings (N, D).
+
+        Returns:
+            dict of arrays: cluster, distance, distance_percentile, stability, ambiguous
+        """
+        Z = self.project(np.atleast_2d(X))
+        d2 = (
+            np.sum(Z * Z, axis=1, keepdims=True)
+            - 2.0 * Z @ self.centroids.T
+            + self.centroid_sq_norms
+        )
+        cluster = np.argmin(d2, axis=1)
+        distance = np.sqrt(np.maximum(d2[np.arange(len(Z)), cluster], 0.0))
+
+        return {
+            "cluster": cluster,
+            "distance": distance,
+            "distance_percentile": self.distance_percentile(distance),
+            "stability": self.stability[cluster],
+            "ambiguous": distance > self.ambiguity_threshold
+        }
+
+    def assign(self, x: np.ndarray) -> Dict:
+        """
+        Assign a single embedding (D,).
+
+        Returns:
+            dict: {
+                "cluster": int,
+                "distance": float,
+                "distance_percentile": float (0-1),
+                "stability": float,
+                "ambiguous": bool
+            }
+        """
+        z = np.asarray(x, dtype=np.float32) @ self.projection + self.offset
+        d2 = self.centroid_sq_norms - 2.0 * (self.centroids @ z) + z @ z
+        cluster = int(np.argmin(d2))
+        distance = float(np.sqrt(max(d2[cluster], 0.0)))
+
+        return {
+            "cluster": cluster,
+            "distance": distance,
+            "distance_percentile": float(self.distance_percentile(distance)),
+            "stability": float(self.stability[cluster]),
+            "ambiguous": bool(distance > self.ambiguity_threshold)
+        }
@@ -0,0 +1,175 @@
+"""
+Per-cluster exemplar selection for 07_cluster_interpreter.py.
+
+For every cluster this finds:
+- a medoid, via CLARA-style search (exact medoids of a few random member
+  samples, each scored against all members in linear time)
+- the representatives closest to that medoid
+- the boundary members with the smallest margin between their own centroid
+  and the nearest other centroid
+
+Nothing builds a full pairwise-distance matrix: the largest one is
+CLARA_SAMPLE_SIZE^2, and everything else is N x K or chunked N x 1. X may be
+memory-mapped (or a PQ store): it is read in CHUNK_ROWS chunks for the
+centroid margins and one cluster's rows at a time for the medoid search, so
+the whole matrix is never loaded at once.
+"""
+
+import numpy as np
+import pandas as pd
+
+CLARA_SAMPLES = 5
+CLARA_SAMPLE_SIZE = 500
+N_REPRESENTATIVES = 5
+N_BOUNDARY = 5
+CHUNK_ROWS = 65_536
+
+
+def _distances_to(X: np.ndarray, point: np.ndarray) -> np.ndarray:
+    out = np.empty(len(X))
+    for start in range(0, len(X), CHUNK_ROWS):
+        diff = X[start:start+CHUNK_ROWS] - point
+        out[start:start+CHUNK_ROWS] = np.sqrt(np.einsum("ij,ij->i", diff, diff))
+    return out
+
+
+def clara_medoid(
+    X: np.ndarray,
+    rng: np.random.Generator,
+    n_samples: int = CLARA_SAMPLES,
+    sample_size: int = CLARA_SAMPLE_SIZE
+):
+    """
+    Approximate medoid of X (row index, mean distance of rows to it).
+    """
+    best, best_cost = 0, np.inf
+    tried = set()
+
+    for _ in range(n_samples if len(X) > sample_size else 1):
+        idx = np.arange(len(X))
+        if len(X) > sample_size:
+            idx = rng.choice(len(X), size=sample_size, replace=False)
+
+        S = X[idx]
+        sq = np.sum(S * S, axis=1)
+        D = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2.0 * S @ S.T, 0.0))
+        candidate = int(idx[np.argmin(D.sum(axis=1))])
+        if candidate in tried:
+            continue
+        tried.add(candidate)
+
+        cost = _distances_to(X, X[candidate]).mean()
+        if cost < best_cost:
+            best, best_cost = candidate, cost
+
+    return best, float(best_cost)
+
+
+def _chunks(X, labels: np.ndarray):
+    """
+    (start, float64 rows, labels) of every chunk that has clustered rows.
+    """
+    for start in range(0, len(X), CHUNK_ROWS):
+        chunk_labels = labels[start:start+CHUNK_ROWS]
+        if np.any(chunk_labels >= 0):
+            yield start, np.asarray(X[start:start+CHUNK_ROWS], dtype=np.float64), chunk_labels
+
+
+def _centroid_margins(X, labels: np.ndarray, clusters: np.ndarray):
+    """
+    Margin between own-centroid distance and nearest other centroid, per row (NaN for noise).
+    """
+    sums = np.zeros((len(clusters), X.shape[1]))
+    counts = np.zeros(len(clusters))
+    for _, chunk, chunk_labels in _chunks(X, labels):
+        for j, c in enumerate(clusters):
+            in_c = chunk_labels == c
+            sums[j] += chunk[in_c].sum(axis=0)
+            counts[j] += np.count_nonzero(in_c)
+    centroids = sums / counts[:, None]
+
+    margin = np.full(len(X), np.nan)
+    rival = np.full(len(X), -1)
+    for start, chunk, chunk_labels in _chunks(X, labels):
+        clustered = np.flatnonzero(chunk_labels >= 0)
+        chunk = chunk[clustered]
+        d = np.sqrt(np.maximum(
+            np.sum(chunk * chunk, axis=1, keepdims=True)
+            - 2.0 * chunk @ centroids.T
+            + np.sum(centroids * centroids, axis=1),
+            0.0
+        ))
+        rows = np.arange(len(chunk))
+        own = np.searchsorted(clusters, chunk_labels[clustered])
+        own_d = d[rows, own]
+        d[rows, own] = np.inf
+        nearest_other = np.argmin(d, axis=1)
+        margin[start + clustered] = d[rows, nearest_other] - own_d
+        rival[start + clustered] = clusters[nearest_other]
+
+    return margin, rival
+
+
+def select_exemplars(
+    X,
+    labels: np.ndarray,
+    n_representatives: int = N_REPRESENTATIVES,
+    n_boundary: int = N_BOUNDARY,
+    random_state: int = 42
+) -> pd.DataFrame:
+    """
+    Medoid, representative and boundary rows for every cluster (noise -1 skipped).
+
+    X is any (N, D) array-like indexable by row slices and row arrays, e.g.
+    np.load(..., mmap_mode="r").
+
+    Returns:
+        DataFrame with columns: cluster, role, rank, row, distance_to_medoid,
+        centroid_margin, nearest_other_cluster
+    """
+    labels = np.asarray(labels)
+    clustered = labels >= 0
+    clusters = np.unique(labels[clustered])
+    rng = np.random.default_rng(random_state)
+
+    margin = np.full(len(X), np.nan)
+    rival = np.full(len(X), -1)
+    if len(clusters) > 1:
+        margin, rival = _centroid_margins(X, labels, clusters)
+
+    records = []
+    for c in clusters:
+        members = np.flatnonzero(labels == c)
+        Xc = np.asarray(X[members], dtype=np.float64)
+
+        medoid, _ = clara_medoid(Xc, rng)
+        to_medoid = _distances_to(Xc, Xc[medoid])
+
+        n_rep = min(n_representatives + 1, len(members))
+        nearest = np.argpartition(to_medoid, n_rep - 1)[:n_rep]
+        nearest = nearest[np.argsort(to_medoid[nearest])]
+        representatives = [i for i in nearest if i != medoid][:n_representatives]
+
+        picks = [("medoid", 0, medoid)]
+        picks += [("representative", r + 1, i) for r, i in enumerate(representatives)]
+
+        if len(clusters) > 1:
+            member_margin = margin[members]
+            n_b = min(n_boundary, len(members))
+            boundary = np.argpartition(member_margin, n_b - 1)[:n_b]
+            boundary = boundary[np.argsort(member_margin[boundary])]
+            picks += [("boundary", r + 1, i) for r, i in enumerate(boundary)]
+
+        for role, rank, i in picks:
+            row = members[i]
+            records.append({
+                "cluster": c,
+                "role": role,
+                "rank": rank,
+                "row": int(row),
+                "distance_to_medoid": float(to_medoid[i]),
+                "centroid_margin": float(margin[row]),
+                "nearest_other_cluster": int(rival[row])
+            })
+
+    return pd.DataFrame(records)
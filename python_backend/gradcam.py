@@ -0,0 +1,137 @@
+"""
+Grad-CAM for the inference path, plus compact encodings of the heatmaps.
+
+04_feature_extractor.py rebuilds its gradient model on every call. Here the
+gradient model and a traced gradient step are built once per extractor, and
+one call returns both the embeddings and the Grad-CAM maps of a whole batch,
+so a heatmap costs one backward pass on top of the forward pass that is
+needed anyway.
+
+Maps are resampled to a GRID_SIZE x GRID_SIZE grid and reported as its
+strongest local maxima (vectorised with scipy.ndimage.maximum_filter) in
+the {x, y, intensity} form the frontend plots, and as the grid itself,
+quantised to uint8 and base64-encoded.
+"""
+
+import base64
+from typing import Dict, List, Optional
+
+import numpy as np
+
+GRID_SIZE = 16
+MAX_REGIONS = 5
+MIN_INTENSITY = 0.3
+PEAK_WINDOW = 3
+
+
+def last_conv_layer(model) -> str:
+    """
+    Name of the last convolutional layer, chosen as in 04_feature_extractor.py.
+    """
+    conv_layers = [l.name for l in model.layers if "conv" in l.name and len(l.output.shape) == 4]
+    if not conv_layers:
+        conv_layers = [l.name for l in model.layers if len(l.output.shape) == 4]
+    if not conv_layers:
+        raise ValueError(f"{model.name} has no convolutional feature map for Grad-CAM")
+    return conv_layers[-1]
+
+
+class GradCam:
+    """
+    Cached gradient model for an embedding extractor.
+
+    The target is the mean of the embedding, as in 04_feature_extractor.py.
+    Each image's map only depends on its own gradients, so a batch gives the
+    same maps as one image at a time.
+    """
+
+    def __init__(self, model, layer_name: Optional[str] = None):
+        import tensorflow as tf
+
+        self.layer_name = layer_name or last_conv_layer(model)
+        grad_model = tf.keras.Model(model.inputs, [model.get_layer(self.layer_name).output, model.output])
+        input_shape = tuple(model.inputs[0].shape[1:])
+
+        @tf.function(input_signature=[tf.TensorSpec((None, *input_shape), tf.float32)])
+        def step(batch):
+            with tf.GradientTape() as tape:
+                conv_outputs, predictions = grad_model(batch, training=False)
+                loss = tf.reduce_sum(tf.reduce_mean(predictions, axis=-1))
+            grads = tape.gradient(loss, conv_outputs)
+            pooled_grads = tf.reduce_mean(grads, axis=(1, 2))
+            heatmaps = tf.nn.relu(tf.einsum("bhwc,bc->bhw", conv_outputs, pooled_grads))
+            heatmaps /= tf.reduce_max(heatmaps, axis=(1, 2), keepdims=True) + 1e-8
+            return predictions, heatmaps
+
+        self._step = step
+
+    def __call__(self, batch: np.ndarray):
+        """
+        (embeddings (B, D), heatmaps (B, h, w) in 0-1) for a batch of model inputs.
+        """
+        predictions, heatmaps = self._step(np.asarray(batch, dtype=np.float32))
+        return predictions.numpy(), heatmaps.numpy()
+
+
+def peak_regions(
+    heatmap: np.ndarray,
+    max_regions: int = MAX_REGIONS,
+    min_intensity: float = MIN_INTENSITY,
+    window: int = PEAK_WINDOW
+) -> List[Dict]:
+    """
+    Strongest local maxima of a heatmap as {"x", "y", "intensity"}, x/y in percent of width/height.
+    """
+    from scipy.ndimage import maximum_filter
+
+    heatmap = np.asarray(heatmap, dtype=np.float32)
+    is_peak = (heatmap == maximum_filter(heatmap, size=window, mode="constant")) & (heatmap >= min_intensity)
+    ys, xs = np.nonzero(is_peak)
+    values = heatmap[ys, xs]
+    order = np.argsort(-values, kind="stable")[:max_regions]
+
+    h, w = heatmap.shape
+    return [
+        {
+            "x": round(float((xs[i] + 0.5) / w * 100), 1),
+            "y": round(float((ys[i] + 0.5) / h * 100), 1),
+            "intensity": round(float(values[i]), 3)
+        }
+        for i in order
+    ]
+
+
+def resample(heatmap: np.ndarray, size: int = GRID_SIZE) -> np.ndarray:
+    """
+    Heatmap resized to size x size (bilinear up, area-averaged down).
+    """
+    import cv2
+
+    heatmap = np.asarray(heatmap, dtype=np.float32)
+    interpolation = cv2.INTER_LINEAR if size >= max(heatmap.shape) else cv2.INTER_AREA
+    return cv2.resize(heatmap, (size, size), interpolation=interpolation)
+
+
+def encode_grid(grid: np.ndarray) -> Dict:
+    """
+    A 0-1 grid quantised to uint8 and base64-encoded.
+
+    Returns:
+        dict: {"width", "height", "encoding": "uint8-base64", "data"}; cell
+        (row, col) is byte row * width + col, intensity = byte / 255
+    """
+    quantised = np.clip(np.rint(np.asarray(grid) * 255), 0, 255).astype(np.uint8)
+    return {
+        "width": int(quantised.shape[1]),
+        "height": int(quantised.shape[0]),
+        "encoding": "uint8-base64",
+        "data": base64.b64encode(quantised.tobytes()).decode("ascii")
+    }
+
+
+def decode_grid(encoded: Dict) -> np.ndarray:
+    """
+    Inverse of encode_grid: (height, width) float32 heatmap in 0-1.
+    """
+    data = np.frombuffer(base64.b64decode(encoded["data"]), dtype=np.uint8)
+    return data.reshape(encoded["height"], encoded["width"]).astype(np.float32) / 255
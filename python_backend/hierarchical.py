@@ -0,0 +1,154 @@
+"""
+Scalable Ward clustering used by 06_model_clusterer.py.
+
+Exact AgglomerativeClustering(linkage="ward") needs O(N^2) memory. For large
+datasets the points are first summarised into micro-clusters (centroid + size);
+Ward's criterion only depends on those two quantities, so a weighted Ward
+merge over the micro-clusters reproduces the exact dendrogram of the summaries
+in O(M^2) time and O(M) memory.
+"""
+
+from typing import Dict
+
+import numpy as np
+from sklearn.cluster import AgglomerativeClustering, MiniBatchKMeans
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+
+EXACT_LIMIT = 20_000
+MICRO_CLUSTERS = 2000
+AGREEMENT_SAMPLE = 3000
+
+
+def _weighted_ward_merges(centers: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """
+    Nearest-neighbour-chain Ward over weighted points.
+
+    Returns an (M-1, 3) array of (slot_a, slot_b, ward_distance) merges, where
+    a merged cluster keeps the slot of its first member.
+    """
+    C = centers.astype(np.float64).copy()
+    n = sizes.astype(np.float64).copy()
+    active = np.ones(len(C), dtype=bool)
+    merges = []
+    chain = []
+    remaining = len(C)
+
+    while remaining > 1:
+        if not chain:
+            chain.append(int(np.flatnonzero(active)[0]))
+        a = chain[-1]
+
+        d = n[a] * n / (n[a] + n) * np.sum((C - C[a]) ** 2, axis=1)
+        d[a] = np.inf
+        d[~active] = np.inf
+        b = int(np.argmin(d))
+
+        if len(chain) > 1 and d[chain[-2]] <= d[b]:
+            b = chain[-2]
+
+        if len(chain) > 1 and b == chain[-2]:
+            chain.pop()
+            chain.pop()
+            total = n[a] + n[b]
+            C[a] = (n[a] * C[a] + n[b] * C[b]) / total
+            n[a] = total
+            active[b] = False
+            merges.append((a, b, d[b]))
+            remaining -= 1
+        else:
+            chain.append(b)
+
+    return np.asarray(merges, dtype=np.float64).reshape(-1, 3)
+
+
+def _cut_merges(merges: np.ndarray, n_items: int, n_clusters: int) -> np.ndarray:
+    """
+    Apply the lowest merges until n_clusters remain and return item labels.
+    """
+    parent = np.arange(n_items)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    order = np.argsort(merges[:, 2], kind="stable")
+    for a, b, _ in merges[order[:max(n_items - n_clusters, 0)]]:
+        parent[find(int(b))] = find(int(a))
+
+    roots = np.array([find(i) for i in range(n_items)])
+    _, labels = np.unique(roots, return_inverse=True)
+    return labels
+
+
+def scalable_ward(
+    X: np.ndarray,
+    n_clusters: int,
+    n_micro: int = MICRO_CLUSTERS,
+    exact_limit: int = EXACT_LIMIT,
+    connectivity=None,
+    random_state: int = 42
+) -> Dict:
+    """
+    Ward clustering that falls back to micro-cluster summaries for large N.
+
+    An optional sparse connectivity matrix (e.g. from knn_graph.connectivity)
+    constrains the exact path.
+
+    Returns:
+        dict: {
+            "labels": np.ndarray of per-row cluster ids,
+            "mode": "exact" or "micro",
+            "n_micro": number of micro-clusters (None for exact)
+        }
+    """
+    if len(X) <= exact_limit:
+        labels = AgglomerativeClustering(
+            n_clusters=n_clusters,
+            linkage="ward",
+            connectivity=connectivity
+        ).fit_predict(X)
+        return {"labels": labels, "mode": "exact", "n_micro": None}
+
+    n_micro = max(min(n_micro, len(X) // 5), n_clusters)
+    micro = MiniBatchKMeans(
+        n_clusters=n_micro,
+        batch_size=4096,
+        n_init=1,
+        random_state=random_state
+    ).fit(X)
+
+    sizes = np.bincount(micro.labels_, minlength=n_micro)
+    used = np.flatnonzero(sizes)
+    remap = np.full(n_micro, -1)
+    remap[used] = np.arange(len(used))
+
+    merges = _weighted_ward_merges(micro.cluster_centers_[used], sizes[used])
+    micro_labels = _cut_merges(merges, len(used), n_clusters)
+
+    return {"labels": micro_labels[remap[micro.labels_]], "mode": "micro", "n_micro": len(used)}
+
+
+def ward_agreement(
+    X: np.ndarray,
+    labels: np.ndarray,
+    n_clusters: int,
+    sample_size: int = AGREEMENT_SAMPLE,
+    random_state: int = 42
+) -> Dict:
+    """
+    Compare labels with exact Ward on a random subsample (ARI and NMI).
+    """
+    rng = np.random.default_rng(random_state)
+    idx = np.arange(len(X))
+    if len(X) > sample_size:
+        idx = np.sort(rng.choice(len(X), size=sample_size, replace=False))
+
+    exact = AgglomerativeClustering(n_clusters=n_clusters, linkage="ward").fit_predict(X[idx])
+
+    return {
+        "ari": float(adjusted_rand_score(exact, labels[idx])),
+        "nmi": float(normalized_mutual_info_score(exact, labels[idx])),
+        "sample_size": int(len(idx))
+    }
@@ -5,21 +5,125 @@
 # and provides the analyze_xray() function for the frontend
 # ============================================================
 
+import asyncio
+import hashlib
+import json
 import os
 import sys
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import numpy as np
-import pandas as pd
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Sequence
 import warnings
 warnings.filterwarnings('ignore')
 
 # Import pipeline modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from metrics import REGISTRY, SIZE_BUCKETS, stage
 try:
-    # Note: In production, you would import actual modules
-    # For now, this serves as the integration point
-    pass
+    from cluster_bundle import ClusterBundle
 except ImportError as e:
+    ClusterBundle = None
     print(f"[WARNING] Some modules not available: {e}")
+try:
+    import preprocessing
+except ImportError as e:
+    preprocessing = None
+    print(f"[WARNING] Some modules not available: {e}")
+try:
+    from result_cache import ResultCache, pixel_key
+except ImportError as e:
+    ResultCache = None
+    print(f"[WARNING] Some modules not available: {e}")
+try:
+    import gradcam
+except ImportError as e:
+    gradcam = None
+    print(f"[WARNING] Some modules not available: {e}")
+try:
+    from ann_index import IvfIndex
+except ImportError as e:
+    IvfIndex = None
+    print(f"[WARNING] Some modules not available: {e}")
+try:
+    from micro_batcher import MicroBatcher
+except ImportError as e:
+    MicroBatcher = None
+    print(f"[WARNING] Some modules not available: {e}")
+
+# TensorFlow is imported on first use (_tensorflow()), so importing this
+# module stays cheap; get_analyzer()/warmup() load the models explicitly
+tf = None
+_tf_checked = False
+
+
+def _tensorflow():
+    """
+    The tensorflow module, imported on first call (None if not installed)
+    """
+    global tf, _tf_checked
+    if not _tf_checked:
+        try:
+            import tensorflow
+            tf = tensorflow
+        except ImportError as e:
+            print(f"[WARNING] Some modules not available: {e}")
+        _tf_checked = True
+    return tf
+
+MODEL_DIR = os.environ.get(
+    "EXODIA_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+)
+BUNDLE_DIR = os.path.join(MODEL_DIR, "clustering_bundle")
+PARAMS_PATH = os.path.join(MODEL_DIR, "preprocessing_params.json")
+EXTRACTOR_PATH = os.path.join(MODEL_DIR, "feature_extractor.keras")
+SIMILARITY_DIR = os.path.join(MODEL_DIR, "similarity_index")
+EMBEDDING_DIM = 1024  # DenseNet121 global-average-pooled features
+INPUT_SIZE = (224, 224)  # model input, as preprocessing.IMG_SIZE
+
+# With MICRO_BATCHING on, concurrent analyze_xray() calls share one forward
+# pass of up to BATCH_MAX_SIZE images, waiting at most BATCH_MAX_WAIT_MS for
+# the batch to fill; it is off because batching did not beat unbatched calls
+# in benchmarks/bench_micro_batching.py (see its docstring for the numbers).
+# BATCH_MAX_SIZE is also the analyze_batch() default batch size.
+MICRO_BATCHING = os.environ.get("EXODIA_MICRO_BATCHING", "0") != "0"
+BATCH_MAX_SIZE = int(os.environ.get("EXODIA_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("EXODIA_BATCH_MAX_WAIT_MS", 0))
+
+# Results are cached by decoded-pixel hash + model version; CACHE_DIR adds an
+# on-disk tier that survives restarts. CACHE_SIZE=0 disables caching.
+CACHE_SIZE = int(os.environ.get("EXODIA_CACHE_SIZE", 1024))
+CACHE_MAX_MB = float(os.environ.get("EXODIA_CACHE_MAX_MB", 64))
+CACHE_TTL_S = float(os.environ.get("EXODIA_CACHE_TTL_S", 24 * 3600))
+CACHE_DIR = os.environ.get("EXODIA_CACHE_DIR") or None
+RESULT_FORMAT = 3  # bump when the result layout changes to invalidate caches
+
+# Grad-CAM heatmaps come from the same pass as the embeddings; EXODIA_GRADCAM=0
+# (or heatmap=False per request) skips the gradient pass altogether
+GRADCAM = os.environ.get("EXODIA_GRADCAM", "1") != "0"
+
+# Similar prior studies from the index built by 09_similarity_indexer.py;
+# NPROBE overrides the index's tuned default. SIMILAR_K=0 disables the lookup
+SIMILAR_K = int(os.environ.get("EXODIA_SIMILAR_K", 5))
+SIMILAR_NPROBE = int(os.environ.get("EXODIA_SIMILAR_NPROBE", 0)) or None
+
+REQUESTS = REGISTRY.counter("exodia_requests_total", "Analysis requests by entry point and outcome")
+REQUEST_SECONDS = REGISTRY.histogram("exodia_request_seconds", "End-to-end analysis latency")
+ERRORS = REGISTRY.counter("exodia_errors_total", "Failed analyses by exception type")
+CACHE_LOOKUPS = REGISTRY.counter("exodia_cache_lookups_total", "Result cache lookups by outcome")
+BATCH_SIZE = REGISTRY.histogram("exodia_batch_size", "Images per feature-extraction batch", SIZE_BUCKETS)
+
+# analyze_xray_async(): requests admitted at once per event loop, threads
+# decoding/scoring images, and the default per-request timeout
+MAX_IN_FLIGHT = int(os.environ.get("EXODIA_MAX_IN_FLIGHT", 256))
+PREPROCESS_WORKERS = int(os.environ.get("EXODIA_PREPROCESS_WORKERS", os.cpu_count() or 4))
+ANALYZE_TIMEOUT_S = float(os.environ.get("EXODIA_ANALYZE_TIMEOUT_S", 60))
+
+# analyze_batch(): images decoded ahead of the model (bounds memory as well)
+BATCH_PREFETCH = int(os.environ.get("EXODIA_BATCH_PREFETCH", 64))
 
 class PneumoniaAnalyzerPipeline:
     """
@@ -34,49 +138,253 @@ class PneumoniaAnalyzerPipeline:
     6. Model Clusterer - Performs unsupervised clustering (KMeans, DBSCAN, Hierarchical)
     7. Cluster Interpreter - Analyzes cluster stability and quality
     8. AQI Visualizer - Generates visualizations
+    9. Similarity Indexer - Retrieves the most similar prior studies
     """
     
     def __init__(self):
-        """Initialize the analysis pipeline"""
+        """
+        Load every model artifact once; analyze() then only runs the per-image work.
+        """
         print("[E.X.O.D.I.A] Initializing pneumonia analysis pipeline...")
         self.embeddings = None
         self.metadata = None
         self.cluster_results = None
         self.stability_scores = None
-        
-    def run_preprocessing_pipeline(self, image_path: str) -> Dict:
+        self.bundle = None
+        self.similarity_index = None
+        self.params = {}
+        self.extractor = None
+
+        if preprocessing is not None:
+            self.params = preprocessing.load_params(PARAMS_PATH)
+        if self.params:
+            print(f"[E.X.O.D.I.A] Loaded preprocessing parameters ({', '.join(sorted(self.params))})")
+        else:
+            print(f"[WARNING] No preprocessing parameters at {PARAMS_PATH}; AQI and tags are not computed")
+
+        self.extractor = self._load_feature_extractor()
+        self.gradcam = None
+        if GRADCAM and gradcam is not None and self.extractor is not None:
+            try:
+                self.gradcam = gradcam.GradCam(self.extractor)
+                print(f"[E.X.O.D.I.A] Grad-CAM on layer {self.gradcam.layer_name}")
+            except ValueError as e:
+                print(f"[WARNING] Grad-CAM not available: {e}")
+
+        if ClusterBundle is not None and os.path.exists(BUNDLE_DIR):
+            self.bundle = ClusterBundle.load(BUNDLE_DIR)
+            print(f"[E.X.O.D.I.A] Loaded clustering bundle {self.bundle.version}")
+        else:
+            print(f"[WARNING] No clustering bundle at {BUNDLE_DIR}; clustering returns placeholder values")
+
+        if IvfIndex is not None and SIMILAR_K > 0 and os.path.exists(SIMILARITY_DIR):
+            self.similarity_index = IvfIndex.load(SIMILARITY_DIR)
+            print(
+                f"[E.X.O.D.I.A] Loaded similarity index {self.similarity_index.version} "
+                f"({self.similarity_index.manifest['n_vectors']} cases)"
+            )
+
+        self.version = self._artifact_version()
+        self.cache = None
+        if ResultCache is not None and CACHE_SIZE > 0:
+            self.cache = ResultCache(
+                max_entries=CACHE_SIZE,
+                max_bytes=int(CACHE_MAX_MB * 1024 * 1024),
+                ttl_s=CACHE_TTL_S,
+                disk_dir=CACHE_DIR
+            )
+        self.warmed = False
+
+    def warmup(self) -> None:
+        """
+        One forward pass and cluster assignment on a blank input, so the first
+        request pays for neither graph tracing nor first-touch page faults
+        """
+        self.warmed = True
+        blank = np.zeros((1, *INPUT_SIZE, 3), dtype=np.float32)
+        if self.extractor is not None:
+            self.extractor(blank, training=False)
+        if self.gradcam is not None:
+            self.gradcam(blank)
+        if self.bundle is not None:
+            self.bundle.assign_batch(np.zeros((1, self.bundle.manifest["n_features"]), dtype=np.float32))
+        if self.similarity_index is not None:
+            self.similarity_index.search(np.ones(self.similarity_index.dim, dtype=np.float32), SIMILAR_K)
+
+    def _load_feature_extractor(self):
+        """
+        Fine-tuned extractor saved by 05_cnn_enhancer.py, else ImageNet DenseNet121 as in 04.
+        """
+        tf = _tensorflow()
+        if tf is None:
+            print("[WARNING] TensorFlow not available; feature extraction returns placeholder embeddings")
+            return None
+
+        if os.path.exists(EXTRACTOR_PATH):
+            model = tf.keras.models.load_model(EXTRACTOR_PATH, compile=False)
+            print(f"[E.X.O.D.I.A] Loaded feature extractor from {EXTRACTOR_PATH}")
+            return model
+
+        print(f"[WARNING] No fine-tuned extractor at {EXTRACTOR_PATH}; using ImageNet DenseNet121")
+        base_model = tf.keras.applications.DenseNet121(
+            weights="imagenet", include_top=False, input_shape=(*INPUT_SIZE, 3)
+        )
+        pooled = tf.keras.layers.GlobalAveragePooling2D()(base_model.output)
+        return tf.keras.Model(inputs=base_model.input, outputs=pooled)
+
+    def _artifact_version(self) -> str:
+        """
+        Identifier of the loaded parameters, extractor and bundle (part of cache keys)
+        """
+        h = hashlib.sha256()
+        h.update(f"format={RESULT_FORMAT}|".encode())
+        h.update(json.dumps(self.params, sort_keys=True).encode())
+        if self.extractor is None:
+            h.update(b"|extractor=placeholder")
+        elif os.path.exists(EXTRACTOR_PATH):
+            stat = os.stat(EXTRACTOR_PATH)
+            h.update(f"|extractor={stat.st_size}-{stat.st_mtime_ns}".encode())
+        else:
+            h.update(b"|extractor=imagenet")
+        h.update(f"|bundle={self.bundle.version if self.bundle is not None else None}".encode())
+        index = self.similarity_index
+        h.update(f"|index={index.version if index is not None else None}|k={SIMILAR_K}|{SIMILAR_NPROBE}".encode())
+        return h.hexdigest()[:16]
+
+    def run_preprocessing_pipeline(self, image_path, heatmap: bool = True) -> Dict:
         """
         Step 1-3: Image cleaning, quality evaluation, tagging
+
+        Args:
+            image_path: path to a DICOM/PNG file, its raw bytes (bytes,
+                bytearray or memoryview), or a shared-memory reference
+                {"shm": name, "size": n} (see preprocessing.decode_image)
+            heatmap: whether the result should include the Grad-CAM heatmap
+
+        Returns:
+            dict: {
+                "image": cleaned uint8 image,
+                "input": (224, 224, 3) float32 model input,
+                "quality": acquisition metrics, AQI, tags and ambiguity,
+                "heatmap": the heatmap flag,
+                "cache_key": result cache key (None if caching is off)
+            }
+            or {"result": ..., "cache_key": ...} when the result is cached
         """
         print("[PIPELINE] Step 1-3: Preprocessing X-ray image...")
-        # This would call: Image_cleaner -> Quality_evaluator -> Image_tagger
-        
-        return {
-            "blur": np.random.random(),
-            "brightness": np.random.randint(50, 200),
-            "contrast": np.random.random() * 100,
-            "entropy": np.random.random() * 8,
-            "AQI": np.random.random(),
-            "AQI_tag": np.random.choice(["LOW", "NORMAL", "HIGH"]),
-            "acquisition_ambiguity": np.random.random()
-        }
-    
-    def run_feature_extraction(self, image_path: str) -> np.ndarray:
+        if preprocessing is None:
+            raise RuntimeError("Image preprocessing requires opencv-python and pydicom")
+        with stage("decode"):
+            decoded = preprocessing.decode_image(image_path)
+
+        cache_key = None
+        if self.cache is not None:
+            with stage("cache_lookup"):
+                cache_key = pixel_key(decoded, self.version if heatmap else f"{self.version}|no-heatmap")
+                cached = self.cache.get(cache_key)
+            CACHE_LOOKUPS.inc(outcome="miss" if cached is None else "hit")
+            if cached is not None:
+                print("[PIPELINE] Result cache hit")
+                return {"result": cached, "cache_key": cache_key}
+
+        with stage("preprocess"):
+            img = preprocessing.clean_image(decoded, self.params)
+            metrics = preprocessing.quality_metrics(img)
+            prepared = {
+                "image": img,
+                "input": preprocessing.model_input(img),
+                "quality": preprocessing.score_quality(metrics, self.params),
+                "heatmap": heatmap,
+                "cache_key": cache_key
+            }
+        return prepared
+
+    def extract_embeddings(self, batch: np.ndarray) -> np.ndarray:
+        """
+        L2-normalised embeddings for a (B, 224, 224, 3) batch of model inputs.
         """
-        Step 4-5: Feature extraction and CNN enhancement
+        BATCH_SIZE.observe(len(batch))
+        with stage("embed"):
+            if self.extractor is None:
+                features = np.random.random((len(batch), EMBEDDING_DIM))
+            else:
+                features = self.extractor(batch, training=False).numpy()
+        return _l2_normalise(features)
+
+    def extract_features(self, batch: np.ndarray, heatmaps: Sequence[bool]):
+        """
+        Embeddings for a batch plus Grad-CAM maps for the images flagged in heatmaps.
+
+        Flagged images go through the gradient model (forward and backward
+        pass, embeddings included); the rest only through the forward pass.
+
+        Returns:
+            (np.ndarray (B, D) embeddings, list of (h, w) heatmaps or None)
+        """
+        want = np.asarray(heatmaps, dtype=bool)
+        if self.gradcam is None or not want.any():
+            return self.extract_embeddings(batch), [None] * len(batch)
+
+        features = np.empty((len(batch), EMBEDDING_DIM), dtype=np.float32)
+        maps = [None] * len(batch)
+        BATCH_SIZE.observe(int(want.sum()))
+        with stage("gradcam"):
+            predictions, cams = self.gradcam(batch[want])
+        features[want] = _l2_normalise(predictions)
+        for i, cam in zip(np.flatnonzero(want), cams):
+            maps[i] = cam
+        if not want.all():
+            features[~want] = self.extract_embeddings(batch[~want])
+        return features, maps
+
+    def run_feature_extraction(self, model_input: np.ndarray, heatmap: bool = True):
+        """
+        Step 4-5: Feature extraction and CNN enhancement (and Grad-CAM)
         """
         print("[PIPELINE] Step 4-5: Extracting and enhancing features...")
-        # This would call: Feature_extractor -> CNN_enhancer
-        
-        # Mock embedding (1024-dim DenseNet121 feature)
-        return np.random.random(1024)
+        features, maps = self.extract_features(model_input[None], [heatmap])
+        return features[0], maps[0]
     
+    def run_clustering_batch(self, embeddings: np.ndarray) -> List[Dict]:
+        """
+        Step 6-7 for a (B, D) batch of embeddings, one assignment in one pass
+        """
+        if self.bundle is None:
+            return [self.run_clustering(e) for e in embeddings]
+
+        with stage("cluster"):
+            assignment = self.bundle.assign_batch(embeddings)
+        return [
+            {
+                "kmeans_cluster": int(assignment["cluster"][i]),
+                "cluster_distance": float(assignment["distance_percentile"][i]),
+                "raw_distance": float(assignment["distance"][i]),
+                "stability_score": float(assignment["stability"][i]),
+                "ambiguous": bool(assignment["ambiguous"][i]),
+                "bundle_version": self.bundle.version
+            }
+            for i in range(len(embeddings))
+        ]
+
     def run_clustering(self, embeddings: np.ndarray) -> Dict:
         """
         Step 6-7: Clustering and interpretation
         """
         print("[PIPELINE] Step 6-7: Running unsupervised clustering...")
-        # This would call: Model_Clusterer -> Cluster_interpreter
+
+        if self.bundle is not None:
+            with stage("cluster"):
+                assignment = self.bundle.assign(embeddings)
+            return {
+                "kmeans_cluster": assignment["cluster"],
+                # Percentile of the centroid distance among training images (0-1),
+                # which keeps the severity/probability heuristics on their 0-1 scale
+                "cluster_distance": assignment["distance_percentile"],
+                "raw_distance": assignment["distance"],
+                "stability_score": assignment["stability"],
+                "ambiguous": assignment["ambiguous"],
+                "bundle_version": self.bundle.version
+            }
         
         return {
             "kmeans_cluster": np.random.randint(0, 5),
@@ -86,6 +394,35 @@ class PneumoniaAnalyzerPipeline:
             "stability_score": np.random.random()
         }
     
+    def find_similar_cases_batch(self, embeddings: np.ndarray, k: int = SIMILAR_K) -> List[List[Dict]]:
+        """
+        Most similar indexed prior studies for each of a (B, D) batch of embeddings
+        """
+        if self.similarity_index is None or k <= 0:
+            return [[] for _ in embeddings]
+
+        with stage("similar"):
+            hits = self.similarity_index.search(embeddings, k, nprobe=SIMILAR_NPROBE)
+        return [
+            [
+                {"id": int(case_id), "key": key, "similarity": round(float(similarity), 4)}
+                for case_id, key, similarity in zip(hits["ids"][i], hits["keys"][i], hits["similarity"][i])
+                if case_id >= 0
+            ]
+            for i in range(len(embeddings))
+        ]
+
+    def find_similar_cases(self, embedding: np.ndarray, k: int = SIMILAR_K) -> List[Dict]:
+        """
+        Top-k most similar prior studies for one embedding (D,)
+
+        Returns:
+            list of dict: [{"id": row in the indexed embeddings, "key": image
+            file name, "similarity": cosine similarity}, ...], best first;
+            empty without a similarity index
+        """
+        return self.find_similar_cases_batch(np.asarray(embedding)[None], k)[0]
+
     def classify_pneumonia_phenotype(self, cluster_info: Dict) -> str:
         """
         Classify pneumonia phenotype based on clustering
@@ -133,53 +470,111 @@ class PneumoniaAnalyzerPipeline:
         
         return findings
     
-    def generate_heatmap_regions(self, image_path: str, cluster_info: Dict) -> List[Dict]:
+    def generate_heatmap_regions(self, heatmap: np.ndarray):
         """
-        Generate heatmap regions showing pneumonia locations
+        Peak regions and encoded grid of a Grad-CAM map (none without one)
+
+        Returns:
+            (list of {"x", "y", "intensity"} with x/y in percent,
+             {"width", "height", "encoding", "data"} grid or None)
         """
-        # In real implementation, would use Grad-CAM from feature extractor
-        distance = cluster_info["cluster_distance"]
-        
-        regions = []
-        if distance > 0.3:  # Only if pneumonia detected
-            # Random regions for demo
-            num_regions = int(distance * 3) + 1
-            for _ in range(num_regions):
-                regions.append({
-                    "x": np.random.randint(20, 80),
-                    "y": np.random.randint(20, 80),
-                    "intensity": min(1.0, distance * (np.random.random() + 0.5))
-                })
-        
-        return regions
+        if heatmap is None:
+            return [], None
+        grid = gradcam.resample(heatmap)
+        grid /= max(float(grid.max()), 1e-8)  # resampling flattens the peak
+        return gradcam.peak_regions(grid), gradcam.encode_grid(grid)
     
-    def analyze(self, image_path: str) -> Dict:
+    def analyze(self, image_path, heatmap: bool = True) -> Dict:
         """
         Main analysis function - chains all pipeline steps
         """
-        print(f"\n[E.X.O.D.I.A] Analyzing X-ray: {image_path}")
+        # Without preprocessing, run_preprocessing_pipeline() raises the error
+        source = preprocessing.describe_source(image_path) if preprocessing is not None else type(image_path).__name__
+        print(f"\n[E.X.O.D.I.A] Analyzing X-ray: {source}")
         print("[PIPELINE] ============================================")
         
         # Step 1-3: Preprocessing
-        quality_metrics = self.run_preprocessing_pipeline(image_path)
+        prepared = self.run_preprocessing_pipeline(image_path, heatmap)
+        if "result" in prepared:
+            return prepared["result"]
         
         # Step 4-5: Feature extraction
-        features = self.run_feature_extraction(image_path)
-        
+        features, cam = self.run_feature_extraction(prepared["input"], heatmap)
+
+        return self.build_result(prepared, features, heatmap=cam)
+
+    def analyze_many(self, image_paths: Sequence, return_exceptions: bool = False, heatmap: bool = True) -> List:
+        """
+        Analyze several images with one batched forward pass and cluster assignment.
+
+        With return_exceptions=True an image that fails preprocessing yields its
+        exception in place of a result instead of failing the whole batch.
+        """
+        prepared = []
+        for image_path in image_paths:
+            try:
+                prepared.append(self.run_preprocessing_pipeline(image_path, heatmap))
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                prepared.append(e)
+
+        return self.analyze_prepared(prepared)
+
+    def analyze_prepared(self, prepared: Sequence) -> List:
+        """
+        Step 4-7 for already preprocessed images, as one batch.
+
+        Exception entries (failed preprocessing) are passed through unchanged;
+        cached entries return their stored result.
+        """
+        results = [p["result"] if isinstance(p, dict) and "result" in p else p for p in prepared]
+        ok = [i for i, p in enumerate(prepared) if isinstance(p, dict) and "result" not in p]
+        if not ok:
+            return results
+
+        print(f"[PIPELINE] Step 4-7: Embedding and clustering a batch of {len(ok)}...")
+        features, cams = self.extract_features(
+            np.stack([prepared[i]["input"] for i in ok]),
+            [prepared[i].get("heatmap", True) for i in ok]
+        )
+        cluster_infos = self.run_clustering_batch(features)
+        similar = self.find_similar_cases_batch(features)
+
+        for i, feature, cluster_info, cam, cases in zip(ok, features, cluster_infos, cams, similar):
+            results[i] = self.build_result(prepared[i], feature, cluster_info, cam, cases)
+        return results
+
+    def build_result(
+        self,
+        prepared: Dict,
+        features: np.ndarray,
+        cluster_info: Dict = None,
+        heatmap: np.ndarray = None,
+        similar_cases: List[Dict] = None
+    ) -> Dict:
+        """
+        Step 6-7 and reporting for one preprocessed image and its embedding
+        """
         # Step 6-7: Clustering
-        cluster_info = self.run_clustering(features)
-        
-        # Classify phenotype
-        phenotype = self.classify_pneumonia_phenotype(cluster_info)
-        
-        # Assess severity
-        severity = self.assess_severity(cluster_info)
-        
-        # Generate findings
-        findings = self.generate_findings(phenotype, severity, cluster_info)
+        if cluster_info is None:
+            cluster_info = self.run_clustering(features)
+        if similar_cases is None:
+            similar_cases = self.find_similar_cases(features)
         
+        with stage("findings"):
+            # Classify phenotype
+            phenotype = self.classify_pneumonia_phenotype(cluster_info)
+
+            # Assess severity
+            severity = self.assess_severity(cluster_info)
+
+            # Generate findings
+            findings = self.generate_findings(phenotype, severity, cluster_info)
+
         # Generate heatmap
-        heatmap_regions = self.generate_heatmap_regions(image_path, cluster_info)
+        with stage("heatmap"):
+            heatmap_regions, heatmap_grid = self.generate_heatmap_regions(heatmap)
         
         # Calculate probability
         probability = int(cluster_info["cluster_distance"] * 100)
@@ -190,24 +585,207 @@ class PneumoniaAnalyzerPipeline:
         print(f"[RESULT] Probability: {probability}%")
         print("[PIPELINE] ============================================\n")
         
-        return {
+        result = {
             "probability": probability,
             "phenotype": phenotype,
             "severity": severity,
             "findings": findings,
-            "heatmap_regions": heatmap_regions
+            "heatmap_regions": heatmap_regions,
+            "heatmap": heatmap_grid,
+            "quality": _to_builtin(prepared["quality"]),
+            "cluster": _to_builtin(cluster_info),
+            "similar_cases": similar_cases
         }
 
+        if self.cache is not None and prepared.get("cache_key"):
+            self.cache.put(prepared["cache_key"], result)
+        return result
+
+
+def _l2_normalise(features: np.ndarray) -> np.ndarray:
+    features = np.asarray(features, dtype=np.float32)
+    norms = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.maximum(norms, 1e-12)
+
+
+def _to_builtin(values: Dict) -> Dict:
+    """
+    numpy scalars -> plain Python values, so results are JSON-serialisable
+    """
+    return {k: v.item() if isinstance(v, np.generic) else v for k, v in values.items()}
+
+
+# Global analyzer instance, created by the first get_analyzer() call
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer() -> PneumoniaAnalyzerPipeline:
+    """
+    The process-wide analyzer, loading every model artifact on first use
+    """
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                analyzer = PneumoniaAnalyzerPipeline()
+                if analyzer.cache is not None:
+                    REGISTRY.gauge("exodia_cache_entries", "Results held in the in-memory cache",
+                                   lambda: analyzer.cache.stats()["entries"])
+                    REGISTRY.gauge("exodia_cache_bytes", "Serialised size of the in-memory cache",
+                                   lambda: analyzer.cache.stats()["bytes"])
+                _analyzer = analyzer
+    return _analyzer
+
+
+def preload() -> None:
+    """
+    Import the heavy dependencies without loading any model or starting threads
+    """
+    _tensorflow()
+    if preprocessing is not None:
+        preprocessing.preload()
+
+
+def warmup() -> PneumoniaAnalyzerPipeline:
+    """
+    Explicit startup: import dependencies, load the models and run one forward pass
+    """
+    preload()
+    analyzer = get_analyzer()
+    if not analyzer.warmed:
+        analyzer.warmup()
+    return analyzer
+
+
+def __getattr__(name):
+    # inference.analyzer is still available; it now loads on first access
+    if name == "analyzer":
+        return get_analyzer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _record_request(entry: str, start: float, error: Exception = None) -> None:
+    REQUEST_SECONDS.observe(time.perf_counter() - start, entry=entry)
+    REQUESTS.inc(entry=entry, outcome="ok" if error is None else "error")
+    if error is not None:
+        ERRORS.inc(type=type(error).__name__)
+
+
+def metrics_text(**const_labels) -> str:
+    """
+    Prometheus text exposition of the pipeline metrics
+    """
+    return REGISTRY.render(**const_labels)
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    """
+    Shared MicroBatcher over analyzer.analyze_prepared (None when batching is off)
+    """
+    global _batcher
+    if MicroBatcher is None or not MICRO_BATCHING or BATCH_MAX_SIZE <= 1:
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(
+                get_analyzer().analyze_prepared,
+                max_batch=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                name="exodia-batcher"
+            )
+    return _batcher
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _executor(name: str, workers: int) -> ThreadPoolExecutor:
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"exodia-{name}")
+        return _executors[name]
+
+
+def _in_flight_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(MAX_IN_FLIGHT)
+    return _semaphores[loop]
+
+
+class _InFlightSlot:
+    """
+    An admitted request's MAX_IN_FLIGHT slot. A request that times out or is
+    cancelled while its work runs on an executor keeps the slot until that
+    work finishes, so abandoned work still counts against the limit.
+    """
+    __slots__ = ("semaphore", "loop", "pending")
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self.semaphore = semaphore
+        self.loop = asyncio.get_running_loop()
+        self.pending = None
+
+    async def run(self, future):
+        """
+        Await a concurrent.futures.Future on behalf of the request.
+        """
+        self.pending = future
+        return await asyncio.wrap_future(future)
+
+    def release(self) -> None:
+        future = self.pending
+        if future is None or future.done():
+            self.semaphore.release()
+        else:
+            future.add_done_callback(lambda _: self._release_threadsafe())
+
+    def _release_threadsafe(self) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.semaphore.release)
+        except RuntimeError:
+            pass  # the event loop is closed, and its semaphore with it
+
+
+def _prepare(image_path, heatmap: bool) -> Dict:
+    return get_analyzer().run_preprocessing_pipeline(image_path, heatmap)
+
+
+def _analyze_prepared(prepared: List[Dict]) -> List[Dict]:
+    return get_analyzer().analyze_prepared(prepared)
+
 
-# Global analyzer instance
-analyzer = PneumoniaAnalyzerPipeline()
+async def _analyze_offloaded(image_path, heatmap: bool, slot: _InFlightSlot) -> Dict:
+    # Decoding and quality scoring release the GIL in OpenCV, so a bounded
+    # thread pool runs them in parallel without blocking the event loop; the
+    # analyzer is resolved there too, so the first request's model load does
+    # not block it either
+    prepared = await slot.run(_executor("preprocess", PREPROCESS_WORKERS).submit(_prepare, image_path, heatmap))
+    if "result" in prepared:
+        return prepared["result"]
+
+    batcher = get_batcher()  # the analyzer is loaded by now
+    if batcher is not None:
+        # Cancelling the awaiting task cancels the Future; if its batch has not
+        # started yet the request is dropped from the queue
+        return await slot.run(batcher.submit(prepared))
+
+    # Without batching, model calls are serialised on one thread
+    results = await slot.run(_executor("model", 1).submit(_analyze_prepared, [prepared]))
+    return results[0]
 
 
 # ============================================================
 # FRONTEND INTEGRATION POINT
 # This function is called by the frontend API
 # ============================================================
-def analyze_xray(image_path: str) -> Dict:
+def analyze_xray(image_path, heatmap: bool = True) -> Dict:
     """
     Main entry point for frontend button click
     
@@ -216,7 +794,9 @@ def analyze_xray(image_path: str) -> Dict:
     → Full pipeline execution → Return results → Display on frontend
     
     Args:
-        image_path (str): Path to X-ray image file
+        image_path: Path to X-ray image file, its raw bytes/memoryview, or a
+            shared-memory reference {"shm": name, "size": n}
+        heatmap: compute the Grad-CAM heatmap; False skips the gradient pass
         
     Returns:
         dict: {
@@ -224,12 +804,229 @@ def analyze_xray(image_path: str) -> Dict:
             "phenotype": str,
             "severity": str,
             "findings": list,
-            "heatmap_regions": list
+            "heatmap_regions": Grad-CAM peaks [{"x", "y", "intensity"}], x/y in %,
+            "heatmap": 16x16 uint8 grid {"width", "height", "encoding", "data"} or None,
+            "quality": dict of acquisition metrics, AQI and tags,
+            "cluster": dict of cluster assignment details,
+            "similar_cases": most similar prior studies [{"id", "key", "similarity"}]
         }
     """
+    start = time.perf_counter()
     try:
-        result = analyzer.analyze(image_path)
+        analyzer = get_analyzer()
+        batcher = get_batcher()
+        if batcher is not None:
+            # Decoding runs in the caller's thread; concurrent callers then
+            # share one batched forward pass and cluster assignment
+            prepared = analyzer.run_preprocessing_pipeline(image_path, heatmap)
+            result = prepared["result"] if "result" in prepared else batcher(prepared)
+        else:
+            result = analyzer.analyze(image_path, heatmap)
+        _record_request("sync", start)
         return result
     except Exception as e:
+        _record_request("sync", start, e)
         print(f"[ERROR] Analysis failed: {str(e)}")
         raise Exception(f"Pneumonia analysis failed: {str(e)}")
+
+
+async def analyze_xray_async(image_path, timeout: float = ANALYZE_TIMEOUT_S, heatmap: bool = True) -> Dict:
+    """
+    Non-blocking analyze_xray() for asyncio services.
+
+    CPU work runs on bounded executors (or the shared micro-batcher), so the
+    event loop stays free for I/O. At most MAX_IN_FLIGHT requests are admitted
+    per event loop; the rest wait for a slot. timeout (seconds, None for no
+    limit) covers the wait and the analysis, and raises asyncio.TimeoutError.
+    Cancelling the calling task abandons the request; work already running on
+    an executor finishes first and holds its slot until then.
+
+    Args:
+        image_path: same sources as analyze_xray()
+        heatmap: as for analyze_xray()
+
+    Returns:
+        dict: same as analyze_xray()
+    """
+    async def admitted():
+        semaphore = _in_flight_semaphore()
+        await semaphore.acquire()
+        slot = _InFlightSlot(semaphore)
+        try:
+            return await _analyze_offloaded(image_path, heatmap, slot)
+        finally:
+            slot.release()
+
+    start = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(admitted(), timeout)
+        _record_request("async", start)
+        return result
+    except asyncio.TimeoutError as e:
+        _record_request("async", start, e)
+        print(f"[ERROR] Analysis timed out after {timeout}s")
+        raise
+    except asyncio.CancelledError:
+        REQUESTS.inc(entry="async", outcome="cancelled")
+        raise
+    except Exception as e:
+        _record_request("async", start, e)
+        print(f"[ERROR] Analysis failed: {str(e)}")
+        raise Exception(f"Pneumonia analysis failed: {str(e)}")
+
+
+def _source_key(index: int, source) -> str:
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, dict) and "shm" in source:
+        return f"shm:{source['shm']}:{source.get('offset', 0)}"
+    return f"#{index}"
+
+
+def _completed_keys(log_path: str) -> set:
+    """
+    Keys already analysed successfully according to an analyze_batch() log
+    """
+    done = set()
+    if not os.path.exists(log_path):
+        return done
+    with open(log_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by an interrupted run
+            if record.get("ok"):
+                done.add(record["key"])
+    return done
+
+
+def analyze_batch(
+    sources: Iterable,
+    ordered: bool = True,
+    batch_size: int = None,
+    prefetch: int = BATCH_PREFETCH,
+    log_path: str = None,
+    heatmap: bool = True
+) -> Iterator[Dict]:
+    """
+    Analyze a stream of studies, yielding one record per study as it finishes.
+
+    Up to prefetch studies are decoded ahead on the preprocessing threads
+    while the model runs batches of batch_size (default BATCH_MAX_SIZE), so
+    an arbitrarily long input is processed with bounded memory. Results come
+    in input order (ordered=True) or as soon as each is ready.
+
+    With log_path every record is appended to that JSON-lines file, and
+    studies whose key already has a successful record there are skipped, so
+    an interrupted run resumes where it stopped; failed studies are retried.
+
+    Args:
+        sources: paths/buffers/shared-memory references as for analyze_xray(),
+            or (key, source) pairs; the key defaults to the path (or "#index")
+        ordered: yield in input order instead of completion order
+        batch_size: images per forward pass
+        prefetch: studies decoded ahead of the one being yielded
+        log_path: JSON-lines output log to append to and resume from
+        heatmap: compute Grad-CAM heatmaps (False skips the gradient pass)
+
+    Returns:
+        iterator of dict: {
+            "index": position in sources,
+            "key": study key,
+            "ok": bool,
+            "result": analyze_xray() result (when ok),
+            "error": message (when not ok)
+        }
+    """
+    analyzer = get_analyzer()
+    batch_size = max(1, batch_size or BATCH_MAX_SIZE)
+    prefetch = max(prefetch, batch_size)
+    done = _completed_keys(log_path) if log_path else set()
+    log = open(log_path, "a") if log_path else None
+    pool = _executor("preprocess", PREPROCESS_WORKERS)
+
+    items = iter(enumerate(sources))
+    exhausted = False
+    decoding = {}   # future -> (seq, index, key, start)
+    ready = []      # decoded studies waiting for a batch
+    finished = {}   # seq -> record, held until it can be yielded in order
+    next_seq = 0
+    next_out = 0
+    skipped = 0
+
+    def record(seq, index, key, start, result=None, error=None):
+        entry = {"index": index, "key": key, "ok": error is None}
+        if error is None:
+            entry["result"] = result
+        else:
+            entry["error"] = str(error)
+        _record_request("batch", start, error)
+        finished[seq] = entry
+
+    try:
+        while True:
+            # Keep the prefetch window full
+            while not exhausted and next_seq - next_out < prefetch:
+                try:
+                    index, item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                key, source = item if isinstance(item, tuple) else (_source_key(index, item), item)
+                if key in done:
+                    skipped += 1
+                    continue
+                future = pool.submit(analyzer.run_preprocessing_pipeline, source, heatmap)
+                decoding[future] = (next_seq, index, key, time.perf_counter())
+                next_seq += 1
+
+            if decoding and len(ready) < batch_size:
+                completed, _ = wait(list(decoding), return_when=FIRST_COMPLETED)
+                for future in completed:
+                    seq, index, key, start = decoding.pop(future)
+                    try:
+                        prepared = future.result()
+                    except Exception as e:
+                        record(seq, index, key, start, error=e)
+                        continue
+                    if "result" in prepared:
+                        record(seq, index, key, start, result=prepared["result"])
+                    else:
+                        ready.append((seq, index, key, start, prepared))
+
+            # Run a full batch, or whatever is decoded once nothing else is coming
+            if ready and (len(ready) >= batch_size or not decoding):
+                batch, ready = ready[:batch_size], ready[batch_size:]
+                try:
+                    results = analyzer.analyze_prepared([entry[4] for entry in batch])
+                    for (seq, index, key, start, _), result in zip(batch, results):
+                        record(seq, index, key, start, result=result)
+                except Exception as e:
+                    for seq, index, key, start, _ in batch:
+                        record(seq, index, key, start, error=e)
+
+            if ordered:
+                emit = []
+                while next_out in finished:
+                    emit.append(finished.pop(next_out))
+                    next_out += 1
+            else:
+                emit = [finished.pop(seq) for seq in sorted(finished)]
+                next_out += len(emit)
+
+            for entry in emit:
+                if log is not None:
+                    log.write(json.dumps(entry, default=str) + "\n")
+                    log.flush()
+                yield entry
+
+            if exhausted and not decoding and not ready and not finished:
+                break
+    finally:
+        for future in decoding:
+            future.cancel()
+        if log is not None:
+            log.close()
+        if skipped:
+            print(f"[INFO] analyze_batch skipped {skipped} studies already in {log_path}")
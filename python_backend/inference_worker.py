@@ -0,0 +1,382 @@
+"""
+Long-lived inference worker for the Express server (server/analyzer-pool.ts).
+
+The worker imports inference.py once, so TensorFlow, the feature extractor
+and the clustering bundle are loaded a single time, and then serves
+requests over a JSON-lines protocol on stdin/stdout:
+
+    -> {"id": "1", "op": "analyze", "bytes": 524288}\n<524288 raw image bytes>
+    <- {"id": "1", "ok": true, "result": {...}, "elapsed_ms": 812.4}
+    -> {"id": "2", "op": "analyze", "shm": "exodia-42", "size": 524288}
+    -> {"id": "3", "op": "analyze", "path": "/data/study.dcm", "heatmap": false}
+    -> {"id": "4", "op": "ping"}
+    <- {"id": "4", "ok": true, "result": {"pid": 123, "in_flight": 0, "served": 41}}
+    -> {"id": "5", "op": "metrics"}
+    <- {"id": "5", "ok": true, "result": [{"name": "exodia_stage_seconds", ...}, ...]}
+
+An analyze request carries the image in one of three ways: "bytes" (the
+header line is followed by exactly that many raw bytes of the uploaded
+file, which are decoded straight from memory), "shm" (name and size of a
+shared-memory segment written by the caller), or "path" (a file to read).
+"heatmap": false skips the Grad-CAM pass for a faster result without one.
+
+On startup it sends {"op": "ready", ...} once the models are loaded.
+Analyze requests run on WORKER_THREADS threads (sharing micro-batched
+forward passes when EXODIA_MICRO_BATCHING=1); pings and metrics requests
+(the worker's metric families, see metrics.py) are answered inline.
+Everything the pipeline prints goes to stderr to keep stdout protocol-only.
+The worker exits when stdin closes.
+
+Preload mode avoids paying the model load once per worker:
+
+    python inference_worker.py --fork-server /tmp/exodia.sock
+    python inference_worker.py --connect /tmp/exodia.sock
+
+The fork server imports inference.py and its dependencies, freezes the GC
+heap and announces {"op": "ready", "mode": "fork-server"}; it exits when its
+stdin closes. Each --connect launcher is a bare interpreter that hands its
+stdin/stdout/stderr to the server over the Unix socket; the server forks a
+worker onto them, which starts with every import already done and shares
+the parent's pages copy-on-write. The launcher stays alive as the worker's
+stand-in: it forwards SIGTERM, and exits with the worker's status (the
+worker exits in turn if its launcher disappears).
+
+What the server loads before forking is set by EXODIA_PRELOAD:
+"models" also loads and warms up the models, so a worker is ready in
+milliseconds; "imports" leaves model loading to each worker. The TensorFlow
+runtime does not survive fork() (a worker forked after it has run hangs on
+its first forward pass), so the default, "auto", is "imports" when
+TensorFlow is installed and "models" otherwise.
+
+With TensorFlow installed the fork server therefore only saves the
+interpreter and import startup (about 2.5 s per worker, mostly importing
+TensorFlow): every forked worker still builds the feature extractor, loads
+its weights and runs its own warm-up pass (about 1.5 s for DenseNet121 on
+CPU), and holds its own copy of the weights. Handing the weights over as
+numpy arrays would only replace the load with a rebuild plus set_weights
+(about 1 s), so it is not done.
+"""
+
+import gc
+import json
+import os
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WORKER_THREADS = int(os.environ.get("EXODIA_WORKER_THREADS", 4))
+PRELOAD = os.environ.get("EXODIA_PRELOAD", "auto")  # "auto", "models" or "imports"
+LAUNCHER_POLL_S = 1.0
+
+
+class Worker:
+    def __init__(self, out):
+        self.out = out
+        self.write_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.in_flight = 0
+        self.served = 0
+        self.failed = 0
+        self.pool = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="exodia-worker")
+
+    def send(self, message: dict) -> None:
+        line = json.dumps(message, default=str)
+        with self.write_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def status(self) -> dict:
+        with self.state_lock:
+            return {
+                "pid": os.getpid(),
+                "in_flight": self.in_flight,
+                "served": self.served,
+                "failed": self.failed
+            }
+
+    def _analyze(self, request_id, source, heatmap: bool) -> None:
+        import inference
+
+        start = time.perf_counter()
+        try:
+            result = inference.analyze_xray(source, heatmap=heatmap)
+            message = {"id": request_id, "ok": True, "result": result}
+            ok = True
+        except Exception as e:
+            message = {"id": request_id, "ok": False, "error": str(e)}
+            ok = False
+        message["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+        with self.state_lock:
+            self.in_flight -= 1
+            self.served += ok
+            self.failed += not ok
+        self.send(message)
+
+    def handle(self, request: dict) -> None:
+        request_id = request.get("id")
+        op = request.get("op")
+
+        if op == "ping":
+            self.send({"id": request_id, "ok": True, "result": self.status()})
+        elif op == "metrics":
+            import metrics
+            self.send({"id": request_id, "ok": True, "result": metrics.REGISTRY.families()})
+        elif op == "analyze":
+            if "data" in request:
+                source = request["data"]
+            elif "shm" in request:
+                source = {"shm": request["shm"], "size": request.get("size"), "offset": request.get("offset", 0)}
+                if source["size"] is None:
+                    del source["size"]
+            elif "path" in request:
+                source = request["path"]
+            else:
+                self.send({"id": request_id, "ok": False, "error": "analyze requires 'bytes', 'shm' or 'path'"})
+                return
+            with self.state_lock:
+                self.in_flight += 1
+            self.pool.submit(self._analyze, request_id, source, bool(request.get("heatmap", True)))
+        else:
+            self.send({"id": request_id, "ok": False, "error": f"unknown op: {op}"})
+
+    def serve(self, stdin) -> None:
+        """
+        Read requests from a binary stream until it closes.
+        """
+        while True:
+            line = stdin.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self.send({"id": None, "ok": False, "error": f"invalid JSON: {e}"})
+                continue
+
+            request.pop("data", None)
+            n_bytes = request.pop("bytes", None)
+            if n_bytes is not None:
+                payload = stdin.read(int(n_bytes))
+                if len(payload) < int(n_bytes):
+                    self.send({"id": request.get("id"), "ok": False, "error": "truncated payload"})
+                    break
+                request["data"] = memoryview(payload)
+
+            self.handle(request)
+
+        self.pool.shutdown(wait=True)
+
+
+def run_worker(protocol_out, start: float, mode: str) -> None:
+    """
+    Load (or reuse) the models, announce readiness and serve stdin until it closes.
+    """
+    import inference
+    import metrics
+
+    analyzer = inference.warmup()
+    worker = Worker(protocol_out)
+    metrics.REGISTRY.gauge("exodia_worker_in_flight", "Analyze requests running on this worker",
+                           lambda: worker.status()["in_flight"])
+    worker.send({
+        "op": "ready",
+        "mode": mode,
+        "pid": os.getpid(),
+        "load_ms": round((time.perf_counter() - start) * 1000, 1),
+        "bundle_version": analyzer.bundle.version if analyzer.bundle is not None else None
+    })
+    worker.serve(sys.stdin.buffer)
+
+
+def _watch_launcher(launcher_pid: int) -> None:
+    while True:
+        time.sleep(LAUNCHER_POLL_S)
+        try:
+            os.kill(launcher_pid, 0)
+        except ProcessLookupError:
+            os._exit(1)
+        except PermissionError:
+            pass
+
+
+def _forked_worker(fds, launcher_pid: int, start: float) -> None:
+    """
+    Body of a forked worker: adopt the launcher's stdio and serve on it.
+    """
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+
+    # Every fork would otherwise draw the same "random" numbers
+    import numpy as np
+    np.random.seed()
+
+    threading.Thread(target=_watch_launcher, args=(launcher_pid,), daemon=True).start()
+    sys.stdout = sys.stderr
+    run_worker(sys.__stdout__, start, "forked")
+
+
+def serve_fork_server(sock_path: str) -> None:
+    """
+    Load once, then fork a worker for every launcher that connects to sock_path.
+    """
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    start = time.perf_counter()
+
+    import inference
+    inference.preload()
+    preload = PRELOAD
+    if preload == "auto":
+        preload = "imports" if inference.tf is not None else "models"
+    if preload == "models":
+        inference.warmup()
+    gc.collect()
+    gc.freeze()  # keep the GC from touching (and so copying) inherited pages
+
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(sock_path)
+    listener.listen(64)
+
+    protocol_out.write(json.dumps({
+        "op": "ready",
+        "mode": "fork-server",
+        "pid": os.getpid(),
+        "preload": preload,
+        "load_ms": round((time.perf_counter() - start) * 1000, 1)
+    }) + "\n")
+    protocol_out.flush()
+
+    # Single-threaded on purpose: fork() only copies the calling thread
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, "accept")
+    selector.register(sys.stdin.fileno(), selectors.EVENT_READ, "stdin")
+    children = {}  # worker pid -> launcher connection
+
+    try:
+        while True:
+            for key, _ in selector.select(timeout=0.5):
+                if key.data == "stdin":
+                    if not os.read(sys.stdin.fileno(), 4096):
+                        return
+                    continue
+
+                conn, _ = listener.accept()
+                try:
+                    msg, fds, _, _ = socket.recv_fds(conn, 64, 3)
+                    launcher_pid = int(msg)
+                    if len(fds) != 3:
+                        raise ValueError(f"expected 3 descriptors, got {len(fds)}")
+                except (OSError, ValueError) as e:
+                    print(f"[WARNING] Rejected worker launcher: {e}")
+                    conn.close()
+                    continue
+
+                fork_start = time.perf_counter()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    selector.close()
+                    listener.close()
+                    conn.close()
+                    for other in children.values():
+                        other.close()
+                    try:
+                        _forked_worker(fds, launcher_pid, fork_start)
+                        code = 0
+                    except BaseException as e:
+                        print(f"[ERROR] Forked worker failed: {e}", file=sys.stderr)
+                        code = 1
+                    sys.stderr.flush()
+                    os._exit(code)
+
+                for fd in fds:
+                    os.close(fd)
+                conn.sendall((json.dumps({"pid": pid}) + "\n").encode())
+                children[pid] = conn
+
+            while children:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                conn = children.pop(pid, None)
+                if conn is not None:
+                    try:
+                        conn.sendall((json.dumps({"exit": os.waitstatus_to_exitcode(status)}) + "\n").encode())
+                    except OSError:
+                        pass
+                    conn.close()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        listener.close()
+        if os.path.exists(sock_path):
+            os.unlink(sock_path)
+
+
+def connect(sock_path: str) -> int:
+    """
+    Launcher side: hand this process's stdio to a forked worker and wait for it.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(sock_path)
+    socket.send_fds(conn, [str(os.getpid()).encode()], [0, 1, 2])
+    replies = conn.makefile("r")
+
+    line = replies.readline()
+    if not line:
+        print("[ERROR] Fork server closed the connection", file=sys.stderr)
+        return 1
+    worker_pid = json.loads(line)["pid"]
+
+    def forward(signum, frame):
+        try:
+            os.kill(worker_pid, signum)
+        except ProcessLookupError:
+            pass
+        sys.exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    line = replies.readline()
+    if not line:
+        # Fork server went away; do not leave the worker behind
+        try:
+            os.kill(worker_pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        return 1
+    code = json.loads(line)["exit"]
+    return code if code >= 0 else 128 - code
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "--fork-server":
+        serve_fork_server(sys.argv[2])
+    elif len(sys.argv) == 3 and sys.argv[1] == "--connect":
+        sys.exit(connect(sys.argv[2]))
+    else:
+        start = time.perf_counter()
+        protocol_out = sys.stdout
+        sys.stdout = sys.stderr
+        run_worker(protocol_out, start, "standalone")
+
+
+if __name__ == "__main__":
+    main()
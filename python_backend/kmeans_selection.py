@@ -0,0 +1,148 @@
+"""
+KMeans model selection used by 06_model_clusterer.py.
+
+The k sweep runs in parallel worker processes and the winning fit is returned
+as-is, so the selected model never has to be refitted.
+"""
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+CRITERIA = ("elbow", "silhouette", "gap")
+
+# Above this many rows each candidate k is fitted with MiniBatchKMeans
+MINIBATCH_THRESHOLD = 100_000
+MINIBATCH_SIZE = 4096
+
+SILHOUETTE_SAMPLE = 10_000
+GAP_SAMPLE = 5_000
+GAP_REFERENCES = 5
+
+
+def make_kmeans(k: int, n_samples: int, n_init: int = 10, random_state: int = 42):
+    """
+    Return a KMeans estimator sized for the dataset (mini-batch for large N)
+    """
+    if n_samples > MINIBATCH_THRESHOLD:
+        return MiniBatchKMeans(
+            n_clusters=k,
+            n_init=n_init,
+            batch_size=MINIBATCH_SIZE,
+            random_state=random_state
+        )
+    return KMeans(n_clusters=k, n_init=n_init, random_state=random_state)
+
+
+def _sample_rows(X: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    if len(X) <= size:
+        return np.arange(len(X))
+    return np.sort(rng.choice(len(X), size=size, replace=False))
+
+
+def _log_dispersion(model, X: np.ndarray) -> float:
+    dists = model.transform(X).min(axis=1)
+    return float(np.log(np.sum(dists ** 2) + 1e-12))
+
+
+def _gap_statistic(model, X: np.ndarray, k: int, random_state: int):
+    """
+    Gap statistic of a fitted model on a subsample of X (Tibshirani et al.)
+    """
+    rng = np.random.default_rng(random_state)
+    sample = X[_sample_rows(X, GAP_SAMPLE, rng)]
+    observed = _log_dispersion(model, sample)
+
+    lo, hi = sample.min(axis=0), sample.max(axis=0)
+    ref_logs = []
+    for b in range(GAP_REFERENCES):
+        ref = rng.uniform(lo, hi, size=sample.shape)
+        ref_model = KMeans(n_clusters=k, n_init=3, random_state=random_state + b).fit(ref)
+        ref_logs.append(np.log(ref_model.inertia_ + 1e-12))
+
+    ref_logs = np.asarray(ref_logs)
+    gap = float(ref_logs.mean() - observed)
+    spread = float(ref_logs.std() * np.sqrt(1 + 1 / GAP_REFERENCES))
+    return gap, spread
+
+
+def _fit_candidate(X: np.ndarray, k: int, criterion: str, n_init: int, random_state: int) -> Dict:
+    model = make_kmeans(k, len(X), n_init=n_init, random_state=random_state)
+    model.fit(X)
+
+    result = {"k": k, "model": model, "inertia": float(model.inertia_), "score": None, "spread": None}
+
+    if criterion == "silhouette":
+        result["score"] = float(silhouette_score(
+            X, model.labels_,
+            sample_size=min(SILHOUETTE_SAMPLE, len(X)),
+            random_state=random_state
+        ))
+    elif criterion == "gap":
+        result["score"], result["spread"] = _gap_statistic(model, X, k, random_state)
+
+    return result
+
+
+def _pick_best(candidates: List[Dict], criterion: str) -> int:
+    if criterion == "silhouette":
+        return int(np.argmax([c["score"] for c in candidates]))
+
+    if criterion == "gap":
+        # Smallest k with gap(k) >= gap(k+1) - s(k+1)
+        for i in range(len(candidates) - 1):
+            nxt = candidates[i + 1]
+            if candidates[i]["score"] >= nxt["score"] - nxt["spread"]:
+                return i
+        return len(candidates) - 1
+
+    # Elbow: k just after the largest inertia drop
+    inertias = [c["inertia"] for c in candidates]
+    if len(inertias) < 2:
+        return 0
+    return int(np.argmin(np.diff(inertias))) + 1
+
+
+def select_kmeans(
+    X: np.ndarray,
+    k_values: Iterable[int],
+    criterion: str = "elbow",
+    n_init: int = 10,
+    n_jobs: int = -1,
+    random_state: int = 42
+) -> Dict:
+    """
+    Fit one KMeans per candidate k in parallel and keep the winning fit.
+
+    Returns:
+        dict: {
+            "best_k": int,
+            "model": fitted estimator for best_k,
+            "k_values": list of int,
+            "inertias": list of float,
+            "scores": list of float or None (criterion score per k),
+            "criterion": str
+        }
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown selection criterion '{criterion}'. Expected one of: {CRITERIA}")
+
+    k_values = sorted(k_values)
+    candidates = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_candidate)(X, k, criterion, n_init, random_state)
+        for k in k_values
+    )
+
+    best = _pick_best(candidates, criterion)
+
+    return {
+        "best_k": candidates[best]["k"],
+        "model": candidates[best]["model"],
+        "k_values": k_values,
+        "inertias": [c["inertia"] for c in candidates],
+        "scores": [c["score"] for c in candidates],
+        "criterion": criterion
+    }
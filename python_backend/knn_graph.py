@@ -0,0 +1,195 @@
+"""
+Persistent k-nearest-neighbour graph shared by the density analyses in
+06_model_clusterer.py (DBSCAN, eps tuning, connectivity, outlier scores).
+
+The graph is built once per embedding version, stored as .npy arrays next to a
+manifest carrying the data fingerprint, and reloaded memory-mapped on later
+runs. Parameter sweeps then only read the stored neighbour lists.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+
+KNN_K = 30
+QUERY_CHUNK = 20_000
+MANIFEST = "manifest.json"
+
+
+def embedding_fingerprint(X: np.ndarray, stop: Optional[int] = None) -> str:
+    """
+    Content hash of an array, or of its first stop rows (shape, dtype and data)
+
+    Rows are read QUERY_CHUNK at a time, so a memory-mapped or decoded-on-demand
+    array (pq_store.PQStore) is never materialised whole.
+    """
+    stop = len(X) if stop is None else min(stop, len(X))
+    h = hashlib.sha1(f"{(stop, *X.shape[1:])}|{X.dtype}".encode())
+    for start in range(0, stop, QUERY_CHUNK):
+        h.update(np.ascontiguousarray(X[start:min(start + QUERY_CHUNK, stop)]).tobytes())
+    return h.hexdigest()
+
+
+def build_knn_graph(X: np.ndarray, k: int = KNN_K, n_jobs: int = -1) -> Dict:
+    """
+    Exact kNN graph (self excluded), queried in bounded-memory chunks.
+    """
+    nn = NearestNeighbors(n_neighbors=k + 1, n_jobs=n_jobs).fit(X)
+
+    indices = np.empty((len(X), k), dtype=np.int32)
+    distances = np.empty((len(X), k), dtype=np.float32)
+
+    for start in range(0, len(X), QUERY_CHUNK):
+        stop = min(start + QUERY_CHUNK, len(X))
+        dist, idx = nn.kneighbors(X[start:stop])
+
+        # Drop each row's own entry (or the farthest one if duplicates hid it)
+        rows = np.arange(start, stop)[:, None]
+        is_self = idx == rows
+        drop = np.where(is_self.any(axis=1), is_self.argmax(axis=1), k)
+        keep = np.ones_like(idx, dtype=bool)
+        keep[np.arange(len(idx)), drop] = False
+
+        indices[start:stop] = idx[keep].reshape(-1, k)
+        distances[start:stop] = dist[keep].reshape(-1, k)
+
+    return {"indices": indices, "distances": distances}
+
+
+def load_or_build_knn_graph(
+    X: np.ndarray,
+    graph_dir: str,
+    k: int = KNN_K,
+    n_jobs: int = -1,
+    fingerprint: Optional[str] = None
+) -> Dict:
+    """
+    Load the stored graph for this data version, or build and persist it.
+
+    Returns:
+        dict: {"indices": (N, k) int32, "distances": (N, k) float32, "fingerprint": str}
+    """
+    fingerprint = fingerprint or embedding_fingerprint(X)
+    manifest_path = os.path.join(graph_dir, MANIFEST)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("fingerprint") == fingerprint and manifest.get("k", 0) >= k:
+            print(f"[INFO] Reusing kNN graph from {graph_dir}")
+            return {
+                "indices": np.load(os.path.join(graph_dir, "indices.npy"), mmap_mode="r")[:, :k],
+                "distances": np.load(os.path.join(graph_dir, "distances.npy"), mmap_mode="r")[:, :k],
+                "fingerprint": fingerprint
+            }
+
+    print(f"[INFO] Building kNN graph (k={k}) over {len(X)} points...")
+    graph = build_knn_graph(X, k=k, n_jobs=n_jobs)
+
+    os.makedirs(graph_dir, exist_ok=True)
+    np.save(os.path.join(graph_dir, "indices.npy"), graph["indices"])
+    np.save(os.path.join(graph_dir, "distances.npy"), graph["distances"])
+    with open(manifest_path, "w") as f:
+        json.dump({"fingerprint": fingerprint, "k": k, "n_samples": len(X)}, f, indent=2)
+
+    graph["fingerprint"] = fingerprint
+    return graph
+
+
+def radius_graph(graph: Dict, eps: float) -> sparse.csr_matrix:
+    """
+    Symmetric sparse distance matrix of stored neighbour pairs within eps.
+
+    Pairs at distance 0 (duplicate rows) are kept as explicitly stored zeros,
+    which DBSCAN(metric="precomputed") still counts as neighbours.
+    """
+    indices, distances = graph["indices"], graph["distances"]
+    n, k = indices.shape
+    mask = np.asarray(distances) <= eps
+
+    rows = np.repeat(np.arange(n), k)[mask.ravel()]
+    cols = np.asarray(indices)[mask].astype(np.int64)
+    dist = np.asarray(distances)[mask]
+
+    # A pair listed by either endpoint is a neighbour of both. The pattern is
+    # symmetrised by hand: sparse maximum()/addition would drop the zeros
+    rows, cols = np.concatenate([rows, cols]), np.concatenate([cols, rows])
+    dist = np.concatenate([dist, dist])
+    order = np.lexsort((cols, rows))
+    rows, cols, dist = rows[order], cols[order], dist[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+    starts = np.flatnonzero(first)
+    if len(dist):
+        dist = np.maximum.reduceat(dist, starts)
+
+    return sparse.csr_matrix((dist, (rows[starts], cols[starts])), shape=(n, n))
+
+
+def k_distance_curve(graph: Dict, min_samples: int) -> np.ndarray:
+    """
+    Sorted distance of every point to its (min_samples - 1)-th neighbour.
+    """
+    col = min_samples - 2
+    if not 0 <= col < graph["distances"].shape[1]:
+        raise ValueError(f"min_samples={min_samples} needs 2 <= min_samples <= k + 1")
+    return np.sort(np.asarray(graph["distances"][:, col]))
+
+
+def suggest_eps(graph: Dict, min_samples: int) -> float:
+    """
+    Knee of the k-distance curve (point farthest from the end-to-end chord).
+    """
+    curve = k_distance_curve(graph, min_samples)
+    x = np.linspace(0.0, 1.0, len(curve))
+    span = curve[-1] - curve[0]
+    y = (curve - curve[0]) / span if span > 0 else np.zeros_like(curve)
+    return float(curve[int(np.argmax(x - y))])
+
+
+def dbscan_from_graph(graph: Dict, eps: float, min_samples: int) -> np.ndarray:
+    """
+    DBSCAN labels computed from the stored graph instead of a new search.
+
+    Core points and border assignments are exact as long as min_samples - 1 <= k;
+    only direct links between two very dense core points may be missing, and
+    those are normally still connected through shared neighbours.
+    """
+    if min_samples - 1 > graph["indices"].shape[1]:
+        raise ValueError(f"min_samples={min_samples} exceeds stored graph k + 1")
+    model = DBSCAN(eps=eps, min_samples=min_samples, metric="precomputed")
+    return model.fit_predict(radius_graph(graph, eps))
+
+
+def connectivity(graph: Dict, n_neighbors: Optional[int] = None) -> sparse.csr_matrix:
+    """
+    Symmetric binary connectivity matrix for AgglomerativeClustering.
+    """
+    indices = np.asarray(graph["indices"])
+    if n_neighbors is not None:
+        indices = indices[:, :n_neighbors]
+    n, k = indices.shape
+    conn = sparse.csr_matrix(
+        (np.ones(n * k, dtype=np.int8), (np.repeat(np.arange(n), k), indices.ravel())),
+        shape=(n, n)
+    )
+    return ((conn + conn.T) > 0).astype(np.int8)
+
+
+def outlier_scores(graph: Dict, k: int = 20) -> np.ndarray:
+    """
+    Local Outlier Factor from the stored graph (values well above 1 = outlier).
+    """
+    indices = np.asarray(graph["indices"][:, :k])
+    distances = np.asarray(graph["distances"][:, :k], dtype=np.float64)
+
+    k_dist = distances[:, -1]
+    reach = np.maximum(k_dist[indices], distances)
+    lrd = 1.0 / (reach.mean(axis=1) + 1e-12)
+    return lrd[indices].mean(axis=1) / lrd
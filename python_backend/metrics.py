@@ -0,0 +1,227 @@
+"""
+Lightweight in-process metrics for the inference pipeline.
+
+Counters, histograms and per-stage timers are kept in a process-wide
+registry and can be exported in the Prometheus text format (render()) or as
+plain dicts (families()) for aggregation across worker processes. Process
+RSS is sampled on export.
+
+Set EXODIA_METRICS=0 to disable: stage() then returns a shared no-op
+context manager and inc()/observe() return immediately, so instrumented
+code pays one attribute lookup and a branch.
+"""
+
+import bisect
+import os
+import resource
+import threading
+import time
+from typing import Callable, Dict, List, Sequence
+
+ENABLED = os.environ.get("EXODIA_METRICS", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    items = key + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List:
+        with self._lock:
+            return [(self.name, dict(k), v) for k, v in self._values.items()]
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self) -> List:
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    out.append((f"{self.name}_bucket", {**labels, "le": repr(float(bound))}, cumulative))
+                out.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, series[-1]))
+                out.append((f"{self.name}_sum", labels, series[-2]))
+                out.append((f"{self.name}_count", labels, series[-1]))
+        return out
+
+
+class Gauge:
+    """
+    Value computed by a callback when metrics are exported.
+    """
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+
+    def samples(self) -> List:
+        try:
+            return [(self.name, {}, float(self.fn()))]
+        except Exception:
+            return []
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, *args):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args)
+            return self._metrics[name]
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets)
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], float]) -> Gauge:
+        return self._get(Gauge, name, help_text, fn)
+
+    def families(self) -> List[Dict]:
+        """
+        Every metric as {"name", "type", "help", "samples": [[name, labels, value], ...]}.
+        """
+        types = {Counter: "counter", Histogram: "histogram", Gauge: "gauge"}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [
+            {
+                "name": m.name,
+                "type": types[type(m)],
+                "help": m.help,
+                "samples": [list(s) for s in m.samples()]
+            }
+            for m in metrics
+        ]
+
+    def render(self, **const_labels) -> str:
+        """
+        Prometheus text exposition of all metrics.
+        """
+        extra = _label_key(const_labels)
+        lines = []
+        for family in self.families():
+            lines.append(f"# HELP {family['name']} {family['help']}")
+            lines.append(f"# TYPE {family['name']} {family['type']}")
+            for name, labels, value in family["samples"]:
+                lines.append(f"{name}{_format_labels(_label_key(labels), extra)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def current_rss_bytes() -> float:
+    """
+    Resident set size of this process (peak RSS where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+REGISTRY.gauge("exodia_process_rss_bytes", "Resident set size of the process", current_rss_bytes)
+REGISTRY.gauge("exodia_process_peak_rss_bytes", "Peak resident set size of the process", peak_rss_bytes)
+
+STAGE_SECONDS = REGISTRY.histogram("exodia_stage_seconds", "Time spent per pipeline stage")
+
+
+class _StageTimer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def stage(name: str):
+    """
+    Context manager recording the duration of a pipeline stage.
+    """
+    return _StageTimer(name) if ENABLED else _NOOP
+
+
+def render(**const_labels) -> str:
+    return REGISTRY.render(**const_labels)
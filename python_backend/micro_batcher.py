@@ -0,0 +1,143 @@
+"""
+Dynamic micro-batching for concurrent inference requests.
+
+Callers submit single items from any thread and get a Future back. A worker
+thread takes the first waiting item, keeps collecting until either
+max_batch items are queued or max_wait_ms have passed since that first
+item, and hands the whole batch to process_batch(). Results (or per-item
+exceptions) are routed back to each caller's Future.
+
+process_batch(items) must return one entry per item, in order; an entry that
+is an Exception instance fails only that caller. If process_batch raises
+something that is not an Exception (SystemExit, KeyboardInterrupt, ...), the
+batcher closes: that batch and everything still queued fail with it, and
+later submit() calls raise RuntimeError.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+MAX_BATCH = 16
+MAX_WAIT_MS = 4.0
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Queue + worker thread that groups single requests into batches.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List], List],
+        max_batch: int = MAX_BATCH,
+        max_wait_ms: float = MAX_WAIT_MS,
+        name: str = "micro-batcher"
+    ):
+        self.process_batch = process_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self.n_batches = 0
+        self.n_items = 0
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item) -> Future:
+        """
+        Queue one item; the returned Future resolves to its result.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout: float = None):
+        return self.submit(item).result(timeout)
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.n_batches,
+            "items": self.n_items,
+            "mean_batch_size": self.n_items / self.n_batches if self.n_batches else 0.0,
+            "queued": self._queue.qsize()
+        }
+
+    def close(self, timeout: float = None) -> None:
+        """
+        Stop accepting work, finish what is queued and join the worker.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._worker.join(timeout)
+
+    def _abort(self, error: BaseException) -> None:
+        # The worker is stopping for good: close, and fail everything queued
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if entry is not _STOP and entry[1].set_running_or_notify_cancel():
+                entry[1].set_exception(error)
+
+    def _collect(self, first) -> List:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            # Callers that cancelled while queued are dropped before the batch runs
+            batch = [(item, f) for item, f in self._collect(first) if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            self.n_batches += 1
+            self.n_items += len(batch)
+            try:
+                results = self.process_batch([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"process_batch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                self._abort(e)
+                return
+
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
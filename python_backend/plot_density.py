@@ -0,0 +1,109 @@
+"""
+Scatter rendering that degrades to a binned raster for large point counts.
+
+Below DENSITY_THRESHOLD points the usual marker scatter is drawn. Above it,
+points are aggregated onto a fixed grid and drawn as a single image: each
+cell is coloured by its majority label (or by density when no labels are
+given), with opacity following log point density. Drawing cost then depends
+on the grid size, not on N.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm, Normalize
+from matplotlib.patches import Patch
+
+DENSITY_THRESHOLD = 50_000
+GRID_BINS = 300
+
+
+def _bin_index(xy: np.ndarray, bins: int):
+    lo = xy.min(axis=0)
+    hi = xy.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    cell = np.minimum(((xy - lo) / span * bins).astype(np.int64), bins - 1)
+    extent = (lo[0], lo[0] + span[0], lo[1], lo[1] + span[1])
+    return cell[:, 1] * bins + cell[:, 0], extent
+
+
+def majority_label_grid(xy: np.ndarray, labels: np.ndarray, bins: int = GRID_BINS):
+    """
+    Aggregate labelled points onto a bins x bins grid.
+
+    Returns:
+        (majority, counts, extent): majority label per cell (NaN where empty),
+        point count per cell, and the (xmin, xmax, ymin, ymax) extent
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    flat, extent = _bin_index(xy, bins)
+
+    values, codes = np.unique(np.asarray(labels), return_inverse=True)
+    pair, pair_counts = np.unique(flat * len(values) + codes.ravel(), return_counts=True)
+    cell, code = np.divmod(pair, len(values))
+
+    # Highest count first within each cell, then keep the first row per cell
+    order = np.lexsort((-pair_counts, cell))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cell[order][1:] != cell[order][:-1]
+    winners = order[first]
+
+    majority = np.full(bins * bins, np.nan)
+    majority[cell[winners]] = values[code[winners]]
+    counts = np.bincount(flat, minlength=bins * bins)
+
+    return majority.reshape(bins, bins), counts.reshape(bins, bins), extent
+
+
+def density_scatter(
+    ax,
+    xy: np.ndarray,
+    labels: Optional[np.ndarray] = None,
+    cmap: str = "tab20",
+    threshold: int = DENSITY_THRESHOLD,
+    bins: int = GRID_BINS,
+    **scatter_kwargs
+):
+    """
+    Draw points on ax, switching to a rasterised grid above threshold.
+
+    Returns the mappable (for plt.colorbar) of whichever mode was used.
+    """
+    xy = np.asarray(xy)
+
+    if len(xy) <= threshold:
+        return ax.scatter(xy[:, 0], xy[:, 1], c=labels, cmap=cmap, **scatter_kwargs)
+
+    if labels is None:
+        flat, extent = _bin_index(xy, bins)
+        counts = np.bincount(flat, minlength=bins * bins).reshape(bins, bins).astype(float)
+        counts[counts == 0] = np.nan
+        return ax.imshow(
+            counts, origin="lower", extent=extent, aspect="auto",
+            cmap=cmap, norm=LogNorm(), interpolation="nearest"
+        )
+
+    labels = np.asarray(labels)
+    majority, counts, extent = majority_label_grid(xy, labels, bins)
+    norm = Normalize(vmin=labels.min(), vmax=labels.max())
+
+    rgba = plt.get_cmap(cmap)(norm(np.nan_to_num(majority)))
+    rgba[..., 3] = np.where(
+        counts > 0,
+        0.25 + 0.75 * np.log1p(counts) / np.log1p(counts.max()),
+        0.0
+    )
+
+    ax.imshow(rgba, origin="lower", extent=extent, aspect="auto", interpolation="nearest")
+    return plt.cm.ScalarMappable(norm=norm, cmap=cmap)
+
+
+def label_legend_handles(labels: Sequence, cmap: str = "tab10"):
+    """
+    Legend patches matching density_scatter colours for each distinct label.
+    """
+    values = np.unique(np.asarray(labels))
+    norm = Normalize(vmin=values.min(), vmax=values.max())
+    colors = plt.get_cmap(cmap)(norm(values))
+    return [Patch(color=c, label=str(v)) for v, c in zip(values, colors)]
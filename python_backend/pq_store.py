@@ -0,0 +1,216 @@
+"""
+Product-quantised embedding store: a compact, array-like stand-in for the
+(N, 1024) float32 embedding files.
+
+Each embedding is split into m subvectors of D / m dimensions and every
+subvector is replaced by the index of its nearest of 256 centroids (one
+k-means codebook per subspace, trained on a sample of the embeddings). A
+row then costs m bytes instead of 4 D: m = 64 is a 64x reduction, m = 256
+is 16x.
+
+A store directory holds codebooks.npy (m, 256, D / m), codes.npy (N, m)
+uint8 and manifest.json, which is written last so a store is never read
+half-built. Codes are memory-mapped; PQStore decodes rows on demand through
+indexing (store[a:b], store[rows]) with the shape/dtype/len of the original
+array, so the chunked readers in projection.py and 09_similarity_indexer.py
+use it as they use np.load(..., mmap_mode="r"). search() ranks rows by
+asymmetric distance (exact query, quantised rows) from per-query lookup
+tables, without decoding anything.
+"""
+
+import json
+import os
+from typing import Dict
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+KSUB = 256  # centroids per subspace, so a code fits one byte
+TRAIN_SAMPLE = 128 * KSUB  # rows per codebook fit; more barely lowers the error
+CHUNK_ROWS = 16_384
+ADC_CHUNK_ROWS = 4096  # codes transposed per step; small enough to stay in cache
+
+
+def train_codebooks(X: np.ndarray, m: int, sample: int = TRAIN_SAMPLE, seed: int = 0) -> np.ndarray:
+    """
+    (m, KSUB, D / m) k-means codebooks, one per subspace, fitted on a sample of X.
+    """
+    from sklearn.cluster import KMeans
+
+    n, d = X.shape
+    if d % m:
+        raise ValueError(f"Embedding dimension {d} is not divisible by m={m}")
+    if n < KSUB:
+        raise ValueError(f"Need at least {KSUB} embeddings to train the codebooks, got {n}")
+
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(n, size=min(sample, n), replace=False))
+    X_train = np.asarray(X[rows], dtype=np.float32)
+    dsub = d // m
+
+    codebooks = np.empty((m, KSUB, dsub), dtype=np.float32)
+    for j in range(m):
+        kmeans = KMeans(n_clusters=KSUB, n_init=1, max_iter=25, random_state=seed)
+        codebooks[j] = kmeans.fit(X_train[:, j * dsub:(j + 1) * dsub]).cluster_centers_
+    return codebooks
+
+
+def encode(X: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """
+    (N, m) uint8 codes: nearest centroid of every subvector.
+    """
+    m, _, dsub = codebooks.shape
+    X = np.asarray(X, dtype=np.float32)
+    sq_norms = np.sum(codebooks ** 2, axis=2)  # (m, KSUB)
+    codes = np.empty((len(X), m), dtype=np.uint8)
+    for j in range(m):
+        # argmin ||x - c||^2 = argmin ||c||^2 - 2 x.c
+        scores = sq_norms[j] - 2.0 * (X[:, j * dsub:(j + 1) * dsub] @ codebooks[j].T)
+        codes[:, j] = np.argmin(scores, axis=1)
+    return codes
+
+
+def decode(codes: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    """
+    (N, D) float32 reconstructions of (N, m) codes.
+    """
+    codes = np.asarray(codes)
+    m = codebooks.shape[0]
+    return codebooks[np.arange(m), codes].reshape(len(codes), -1)
+
+
+def write_store(
+    X: np.ndarray,
+    out_dir: str,
+    codebooks: np.ndarray,
+    chunk_rows: int = CHUNK_ROWS,
+    metadata: Dict = None
+) -> "PQStore":
+    """
+    Encode X chunk by chunk into a store at out_dir (replacing any existing one).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    n, d = X.shape
+    m = codebooks.shape[0]
+    np.save(os.path.join(out_dir, "codebooks.npy"), codebooks)
+    codes = np.lib.format.open_memmap(os.path.join(out_dir, "codes.npy"), mode="w+", dtype=np.uint8, shape=(n, m))
+
+    sq_error = 0.0
+    for start in range(0, n, chunk_rows):
+        chunk = np.asarray(X[start:start+chunk_rows], dtype=np.float32)
+        codes[start:start+len(chunk)] = chunk_codes = encode(chunk, codebooks)
+        sq_error += float(np.sum((decode(chunk_codes, codebooks) - chunk) ** 2, dtype=np.float64))
+    codes.flush()
+    del codes
+
+    with open(manifest_path, "w") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "n_samples": int(n),
+            "n_features": int(d),
+            "m": int(m),
+            "ksub": KSUB,
+            "bytes_per_vector": int(m),
+            "compression": round(d * 4 / m, 1),
+            "mse": sq_error / (n * d),
+            **(metadata or {})
+        }, f, indent=2)
+    return PQStore(out_dir)
+
+
+def open_embeddings(path: str):
+    """
+    Embeddings as an (N, D) array-like: a PQStore directory, or a memory-mapped .npy file.
+    """
+    if os.path.isdir(path):
+        return PQStore(path)
+    return np.load(path, mmap_mode="r")
+
+
+class PQStore:
+    """
+    Memory-mapped PQ codes that index like the (N, D) float32 array they encode.
+    """
+
+    dtype = np.dtype(np.float32)
+    ndim = 2
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported PQ store format {self.manifest.get('format_version')} in {path}")
+
+        self.path = path
+        self.codebooks = np.load(os.path.join(path, "codebooks.npy"))
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.m, self.ksub, self.dsub = self.codebooks.shape
+        self.shape = (len(self.codes), self.m * self.dsub)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        """
+        Decode the selected rows (any numpy index on the first axis, e.g. a slice or row array).
+        """
+        rest = ()
+        if isinstance(key, tuple):
+            key, rest = key[0], key[1:]
+        codes = self.codes[key]
+        out = decode(codes.reshape(-1, self.m), self.codebooks).reshape(*codes.shape[:-1], -1)
+        return out[(slice(None),) * (out.ndim - 1) + rest] if rest else out
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:]
+        return out if dtype is None else out.astype(dtype)
+
+    def distance_tables(self, Q: np.ndarray) -> np.ndarray:
+        """
+        (N, m, KSUB) squared distances from each query subvector to every centroid.
+        """
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32)).reshape(-1, self.m, self.dsub)
+        return (
+            np.sum(Q ** 2, axis=2)[:, :, None]
+            - 2.0 * np.einsum("nmd,mkd->nmk", Q, self.codebooks)
+            + np.sum(self.codebooks ** 2, axis=2)[None]
+        )
+
+    def adc_distances(self, q: np.ndarray, start: int = 0, stop: int = None) -> np.ndarray:
+        """
+        Asymmetric squared L2 distances from one query (D,) to rows start:stop.
+        """
+        table = self.distance_tables(q)[0]
+        codes = self.codes[start:stop]
+        out = np.zeros(len(codes), dtype=np.float32)
+        for i in range(0, len(codes), ADC_CHUNK_ROWS):
+            # Column-major copy, so each subspace's codes are one contiguous run
+            chunk = np.ascontiguousarray(codes[i:i+ADC_CHUNK_ROWS].T)
+            acc = out[i:i+chunk.shape[1]]
+            # One 256-entry table lookup per subspace, summed over subspaces
+            for j in range(self.m):
+                acc += table[j].take(chunk[j])
+        return out
+
+    def search(self, Q: np.ndarray, k: int = 10) -> Dict:
+        """
+        Top-k rows by asymmetric distance for each query (N, D) or (D,).
+
+        Returns:
+            dict of (N, k) arrays: "rows" (int64) and "distances" (squared L2), nearest first
+        """
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+        k = min(k, len(self))
+        rows = np.empty((len(Q), k), dtype=np.int64)
+        distances = np.empty((len(Q), k), dtype=np.float32)
+        for i, q in enumerate(Q):
+            d = self.adc_distances(q)
+            top = np.argpartition(d, k - 1)[:k] if len(d) > k else np.arange(k)
+            top = top[np.argsort(d[top], kind="stable")]
+            rows[i], distances[i] = top, d[top]
+        return {"rows": rows, "distances": distances}
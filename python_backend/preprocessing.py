@@ -0,0 +1,227 @@
+"""
+Single-image preprocessing shared by the training scripts and inference.py.
+
+Stages 01-03 fit their dataset-level parameters (target resolution, metric
+scaling, quartile thresholds) on the whole training set and record them in
+models/preprocessing_params.json via save_params(). At inference time the
+same per-image transforms are applied with those stored parameters, so a
+single X-ray is cleaned, scored and tagged exactly as it would have been in
+the training run.
+"""
+
+import io
+import json
+import os
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict
+
+import cv2
+import numpy as np
+
+PARAMS_FILE = "models/preprocessing_params.json"
+METRICS = ["blur", "brightness", "contrast", "entropy"]
+AQI_WEIGHTS = [0.3, 0.2, 0.3, 0.2]
+IMG_SIZE = (224, 224)
+
+# ImageNet statistics used by tensorflow.keras.applications.densenet.preprocess_input
+DENSENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+DENSENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def load_params(path: str = PARAMS_FILE) -> Dict:
+    """
+    Stored preprocessing parameters ({} if the file does not exist yet).
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_params(section: str, values: Dict, path: str = PARAMS_FILE) -> None:
+    """
+    Store one stage's parameters under params[section], keeping the other stages'.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    params = load_params(path)
+    params[section] = values
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(params, f, indent=2)
+    os.replace(tmp, path)
+    print(f"[INFO] Saved {section} preprocessing parameters to {path}")
+
+
+def is_dicom(data) -> bool:
+    return len(data) >= 132 and bytes(data[128:132]) == b"DICM"
+
+
+def describe_source(source) -> str:
+    """
+    Short label of an image source for logging.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return str(source)
+    if isinstance(source, dict):
+        return f"<shared memory {source.get('shm')}>"
+    return f"<{len(memoryview(source).cast('B'))} bytes>"
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a segment owned by another process without taking over its cleanup.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _decode_buffer(data) -> np.ndarray:
+    if is_dicom(data):
+        import pydicom
+        return pydicom.dcmread(io.BytesIO(data)).pixel_array
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("Unsupported or corrupt image data")
+    return img
+
+
+def decode_image(source) -> np.ndarray:
+    """
+    Decode a DICOM or PNG/JPEG image to a grayscale array.
+
+    source is a file path, a bytes-like object (bytes, bytearray, memoryview,
+    decoded in place without a copy for PNG/JPEG), or a shared-memory reference
+    {"shm": segment name, "size": bytes, "offset": 0} to a segment written by
+    another process; the segment is attached read-only and left to its owner.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            img = _decode_buffer(f.read())
+    elif isinstance(source, dict):
+        shm = _attach_shared_memory(source["shm"])
+        try:
+            offset = int(source.get("offset", 0))
+            size = int(source.get("size", shm.size - offset))
+            view = shm.buf[offset:offset + size]
+            try:
+                img = _decode_buffer(view)
+            finally:
+                view.release()
+        finally:
+            shm.close()
+    else:
+        img = _decode_buffer(memoryview(source).cast("B"))
+
+    if img.ndim == 3:
+        img = img[..., 0] if img.shape[-1] in (3, 4) else img[0]
+    return img
+
+
+def preload() -> None:
+    """
+    Import the DICOM reader up front (it is otherwise imported on first DICOM).
+    """
+    import pydicom
+    import pydicom.pixels  # noqa: F401
+
+
+def normalize_to_uint8(img: np.ndarray) -> np.ndarray:
+    """
+    Min-max rescale to 0-255, as in 01_image_cleaner.py.
+    """
+    img = img.astype(np.float32)
+    img -= img.min()
+    img /= (img.max() + 1e-8)
+    return (img * 255).astype(np.uint8)
+
+
+def clean_image(img: np.ndarray, params: Dict) -> np.ndarray:
+    """
+    Normalise and resize to the training set's target resolution.
+    """
+    img = normalize_to_uint8(img)
+    target = params.get("cleaner", {}).get("target_size")
+    if target:
+        img = cv2.resize(img, (int(target[0]), int(target[1])), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def shannon_entropy(img: np.ndarray) -> float:
+    """
+    Base-2 Shannon entropy of the grey levels (same as skimage.measure.shannon_entropy).
+    """
+    counts = np.bincount(img.ravel())
+    p = counts[counts > 0] / img.size
+    return float(-np.sum(p * np.log2(p)))
+
+
+def quality_metrics(img: np.ndarray) -> Dict:
+    """
+    Raw acquisition metrics of a cleaned uint8 image, as in 02_quality_evaluator.py.
+    """
+    return {
+        "blur": float(cv2.Laplacian(img, cv2.CV_64F).var()),
+        "brightness": float(img.mean()),
+        "contrast": float(img.std()),
+        "entropy": shannon_entropy(img)
+    }
+
+
+def _tag(value: float, q1: float, q3: float) -> str:
+    if value <= q1:
+        return "LOW"
+    elif value >= q3:
+        return "HIGH"
+    return "NORMAL"
+
+
+def score_quality(metrics: Dict, params: Dict) -> Dict:
+    """
+    AQI, per-metric tags and acquisition ambiguity from stored stage 02/03 parameters.
+    """
+    result = dict(metrics)
+    evaluator = params.get("evaluator")
+    if not evaluator:
+        return result
+
+    weights = np.asarray(evaluator.get("weights", AQI_WEIGHTS))
+    scaled = []
+    ambiguities = []
+    for m in METRICS:
+        lo, hi = evaluator["min"][m], evaluator["max"][m]
+        scaled.append((metrics[m] - lo) / (hi - lo) if hi > lo else 0.0)
+
+        q1, q3 = evaluator["q1"][m], evaluator["q3"][m]
+        result[f"{m}_tag"] = _tag(metrics[m], q1, q3)
+        if metrics[m] < q1:
+            amb = q1 - metrics[m]
+        elif metrics[m] > q3:
+            amb = metrics[m] - q3
+        else:
+            amb = min(metrics[m] - q1, q3 - metrics[m])
+        result[f"{m}_acq_ambiguity"] = float(amb)
+        ambiguities.append(amb)
+
+    result["AQI"] = float(np.dot(scaled, weights))
+    result["acquisition_ambiguity"] = float(np.mean(ambiguities))
+
+    tagger = params.get("tagger")
+    if tagger:
+        result["AQI_tag"] = _tag(result["AQI"], tagger["aqi_q1"], tagger["aqi_q3"])
+        result["high_ambiguity_flag"] = result["acquisition_ambiguity"] >= tagger["ambiguity_q3"]
+
+    return result
+
+
+def model_input(img: np.ndarray, img_size=IMG_SIZE) -> np.ndarray:
+    """
+    3-channel, DenseNet-normalised float32 input (H, W, 3) as in 04/05.
+    """
+    img = cv2.resize(img, img_size).astype(np.float32)
+    img = np.repeat(img[..., None], 3, axis=-1)
+    return (img / 255.0 - DENSENET_MEAN) / DENSENET_STD
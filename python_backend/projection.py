@@ -0,0 +1,187 @@
+"""
+Out-of-core standardisation + PCA over the memory-mapped embeddings file,
+or over a product-quantised store from 10_embedding_compressor.py, which is
+decoded one chunk at a time.
+
+The 50-D clustering projection and the 2-D plotting projection are computed
+once in fixed-size chunks and cached as .npy artifacts that both
+06_model_clusterer.py and 07_cluster_interpreter.py load. Peak memory is a
+few chunks of the input plus the IncrementalPCA state, independent of N.
+The 2-D view is the first two components of the same fit (PCA components are
+nested), so no second PCA is needed.
+"""
+
+import json
+import os
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+from sklearn.decomposition import PCA, IncrementalPCA
+
+from pq_store import MANIFEST as STORE_MANIFEST, open_embeddings
+
+CHUNK_ROWS = 8192
+FIT_SAMPLE = 100_000
+METHODS = ("incremental", "randomized")
+MANIFEST = "manifest.json"
+
+PARAMS = ("scaler_mean", "scaler_scale", "pca_mean", "components", "explained_variance_ratio")
+
+
+def source_fingerprint(path: str) -> str:
+    """
+    Cheap identity of an embeddings file (path, size, mtime)
+    """
+    # A PQ store is identified by its manifest, which is rewritten last
+    st = os.stat(os.path.join(path, STORE_MANIFEST) if os.path.isdir(path) else path)
+    return f"{os.path.realpath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def iter_chunks(n_rows: int, chunk_rows: int, min_rows: int = 1) -> Iterator[Tuple[int, int]]:
+    """
+    Yield (start, stop) row ranges; a short tail is folded into the previous chunk.
+    """
+    starts = list(range(0, n_rows, chunk_rows))
+    if len(starts) > 1 and n_rows - starts[-1] < min_rows:
+        starts.pop()
+    for i, start in enumerate(starts):
+        yield start, starts[i + 1] if i + 1 < len(starts) else n_rows
+
+
+def _scaler_stats(X: np.ndarray, chunk_rows: int):
+    total = np.zeros(X.shape[1])
+    total_sq = np.zeros(X.shape[1])
+    for start, stop in iter_chunks(len(X), chunk_rows):
+        chunk = np.asarray(X[start:stop], dtype=np.float64)
+        total += chunk.sum(axis=0)
+        total_sq += np.square(chunk).sum(axis=0)
+
+    mean = total / len(X)
+    var = np.maximum(total_sq / len(X) - mean ** 2, 0.0)
+    scale = np.sqrt(var)
+    scale[scale < 10 * np.finfo(np.float64).eps] = 1.0  # same rule as StandardScaler
+    return mean, scale
+
+
+def _fit_pca(X, mean, scale, n_components, method, chunk_rows, random_state):
+    if method == "incremental":
+        pca = IncrementalPCA(n_components=n_components)
+        for start, stop in iter_chunks(len(X), chunk_rows, min_rows=n_components):
+            pca.partial_fit((np.asarray(X[start:stop], dtype=np.float64) - mean) / scale)
+        return pca
+
+    rng = np.random.default_rng(random_state)
+    idx = np.arange(len(X))
+    if len(X) > FIT_SAMPLE:
+        idx = np.sort(rng.choice(len(X), size=FIT_SAMPLE, replace=False))
+    sample = (np.asarray(X[idx], dtype=np.float64) - mean) / scale
+    return PCA(n_components=n_components, svd_solver="randomized", random_state=random_state).fit(sample)
+
+
+def compute_projection(
+    embeddings_path: str,
+    out_dir: str,
+    n_components: int = 50,
+    vis_dims: int = 2,
+    method: str = "incremental",
+    chunk_rows: int = CHUNK_ROWS,
+    random_state: int = 42
+) -> Dict:
+    """
+    Fit scaler + PCA out-of-core over a .npy file or PQ store directory and
+    write projection artifacts to out_dir.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown PCA method '{method}'. Expected one of: {METHODS}")
+
+    X = open_embeddings(embeddings_path)
+    print(f"[INFO] Projecting {X.shape} embeddings out-of-core ({method} PCA)...")
+
+    mean, scale = _scaler_stats(X, chunk_rows)
+    pca = _fit_pca(X, mean, scale, n_components, method, chunk_rows, random_state)
+
+    os.makedirs(out_dir, exist_ok=True)
+    pca_out = np.lib.format.open_memmap(
+        os.path.join(out_dir, "pca.npy"), mode="w+", dtype=np.float32, shape=(len(X), n_components)
+    )
+    for start, stop in iter_chunks(len(X), chunk_rows):
+        chunk = (np.asarray(X[start:stop], dtype=np.float64) - mean) / scale
+        pca_out[start:stop] = (chunk - pca.mean_) @ pca.components_.T
+    pca_out.flush()
+    np.save(os.path.join(out_dir, "vis.npy"), np.ascontiguousarray(pca_out[:, :vis_dims]))
+    del pca_out
+
+    params = {
+        "scaler_mean": mean,
+        "scaler_scale": scale,
+        "pca_mean": pca.mean_,
+        "components": pca.components_,
+        "explained_variance_ratio": pca.explained_variance_ratio_
+    }
+    for name in PARAMS:
+        np.save(os.path.join(out_dir, f"{name}.npy"), params[name])
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump({
+            "fingerprint": source_fingerprint(embeddings_path),
+            "n_samples": int(X.shape[0]),
+            "n_features": int(X.shape[1]),
+            "n_components": n_components,
+            "vis_dims": vis_dims,
+            "method": method
+        }, f, indent=2)
+
+    return load_projection(out_dir)
+
+
+def load_projection(out_dir: str) -> Dict:
+    """
+    Load cached projection artifacts (projections are memory-mapped).
+
+    Returns:
+        dict: pca (N, P), vis (N, 2), scaler_mean, scaler_scale, pca_mean,
+        components, explained_variance_ratio, manifest
+    """
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        result = {"manifest": json.load(f)}
+    result["pca"] = np.load(os.path.join(out_dir, "pca.npy"), mmap_mode="r")
+    result["vis"] = np.load(os.path.join(out_dir, "vis.npy"), mmap_mode="r")
+    for name in PARAMS:
+        result[name] = np.load(os.path.join(out_dir, f"{name}.npy"))
+    return result
+
+
+def load_or_compute_projection(
+    embeddings_path: str,
+    out_dir: str,
+    n_components: int = 50,
+    vis_dims: int = 2,
+    method: str = "incremental",
+    chunk_rows: int = CHUNK_ROWS,
+    random_state: int = 42
+) -> Dict:
+    """
+    Reuse the cached projection when it matches the embeddings file and settings.
+    """
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (
+            manifest.get("fingerprint") == source_fingerprint(embeddings_path)
+            and manifest.get("n_components") == n_components
+            and manifest.get("vis_dims") == vis_dims
+            and manifest.get("method") == method
+        ):
+            print(f"[INFO] Reusing cached projection from {out_dir}")
+            return load_projection(out_dir)
+
+    return compute_projection(
+        embeddings_path,
+        out_dir,
+        n_components=n_components,
+        vis_dims=vis_dims,
+        method=method,
+        chunk_rows=chunk_rows,
+        random_state=random_state
+    )
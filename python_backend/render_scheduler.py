@@ -0,0 +1,154 @@
+"""
+Incremental, parallel figure rendering for 08_aqi_visualizer.py.
+
+Each figure is a task naming its renderer, the DataFrame columns it reads
+and its drawing parameters. A fingerprint over those (plus the renderer's
+source code) is stored in a manifest next to the outputs; unchanged figures
+are skipped, and the stale ones are drawn in a process pool on the Agg
+backend.
+
+Task dict keys:
+    name      unique figure name
+    renderer  top-level function renderer(frame, out_path, **params, **inputs)
+    columns   DataFrame columns the figure depends on
+    params    JSON-serialisable drawing parameters (part of the fingerprint)
+    inputs    extra precomputed data derived from columns (not fingerprinted)
+    settings  JSON-serialisable values that shape the inputs (fingerprinted,
+              not passed to the renderer)
+    output    output file name inside out_dir
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+MANIFEST = ".render_manifest.json"
+
+
+def task_fingerprint(task: Dict, df: pd.DataFrame) -> str:
+    """
+    Hash of a task's renderer source, parameters and input column contents
+    """
+    renderer = task["renderer"]
+    h = hashlib.sha1()
+    h.update(f"{renderer.__module__}.{renderer.__qualname__}".encode())
+    try:
+        h.update(inspect.getsource(renderer).encode())
+    except (OSError, TypeError):
+        pass
+    h.update(json.dumps(task.get("params", {}), sort_keys=True, default=str).encode())
+    h.update(json.dumps(task.get("settings", {}), sort_keys=True, default=str).encode())
+
+    for col in task["columns"]:
+        h.update(col.encode())
+        if col in df.columns:
+            h.update(pd.util.hash_pandas_object(df[col], index=False).values.tobytes())
+        else:
+            h.update(b"<missing>")
+
+    return h.hexdigest()
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(renderer, frame: pd.DataFrame, out_path: str, params: Dict, inputs: Dict) -> str:
+    import matplotlib.pyplot as plt
+
+    renderer(frame, out_path, **params, **inputs)
+    plt.close("all")
+    return out_path
+
+
+def _load_manifest(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path: str, manifest: Dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def render_figures(
+    tasks: List[Dict],
+    df: pd.DataFrame,
+    out_dir: str,
+    max_workers: Optional[int] = None,
+    force: bool = False
+) -> Dict[str, str]:
+    """
+    Render stale figures in parallel and skip unchanged ones.
+
+    Returns:
+        dict: figure name -> "rendered", "skipped" or "failed: <error>"
+    """
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = _load_manifest(manifest_path)
+
+    status = {}
+    stale = []
+    for task in tasks:
+        fp = task_fingerprint(task, df)
+        out_path = os.path.join(out_dir, task["output"])
+        if not force and manifest.get(task["name"]) == fp and os.path.exists(out_path):
+            status[task["name"]] = "skipped"
+        else:
+            stale.append((task, fp, out_path))
+
+    if not stale:
+        return {task["name"]: status[task["name"]] for task in tasks}
+
+    def submit_args(task, out_path):
+        columns = [c for c in task["columns"] if c in df.columns]
+        return (task["renderer"], df[columns], out_path, task.get("params", {}), task.get("inputs", {}))
+
+    workers = min(len(stale), max_workers or os.cpu_count() or 1)
+
+    if workers <= 1:
+        _init_worker()
+        outcomes = []
+        for task, fp, out_path in stale:
+            try:
+                _render(*submit_args(task, out_path))
+                outcomes.append((task, fp, None))
+            except Exception as e:
+                outcomes.append((task, fp, e))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [
+                (task, fp, pool.submit(_render, *submit_args(task, out_path)))
+                for task, fp, out_path in stale
+            ]
+            outcomes = []
+            for task, fp, future in futures:
+                try:
+                    future.result()
+                    outcomes.append((task, fp, None))
+                except Exception as e:
+                    outcomes.append((task, fp, e))
+
+    for task, fp, error in outcomes:
+        if error is None:
+            manifest[task["name"]] = fp
+            status[task["name"]] = "rendered"
+        else:
+            manifest.pop(task["name"], None)
+            status[task["name"]] = f"failed: {error}"
+
+    _save_manifest(manifest_path, manifest)
+    return {task["name"]: status[task["name"]] for task in tasks}
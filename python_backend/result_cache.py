@@ -0,0 +1,214 @@
+"""
+Content-addressed cache of analysis results for inference.py.
+
+Results are keyed by a SHA-256 of the decoded pixel data (with its shape and
+dtype) together with the version of every model artifact that produced them,
+so re-analysing the same study is a lookup and any model change misses the
+old entries automatically.
+
+The in-process tier is an LRU bounded by entry count, total serialised size
+and a TTL. An optional on-disk tier (one JSON file per key) survives
+restarts; entries found there are promoted back into memory. It is pruned
+(expired entries, then the oldest beyond max_disk_entries) when the cache is
+created and every prune_every writes, so it never holds more than
+max_disk_entries + prune_every files.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+MAX_ENTRIES = 1024
+MAX_BYTES = 64 * 1024 * 1024
+TTL_S = 24 * 3600
+MAX_DISK_ENTRIES = 20_000
+DISK_PRUNE_EVERY = 256
+
+
+def pixel_key(img: np.ndarray, version: str) -> str:
+    """
+    Cache key of a decoded image under a given model/artifact version.
+    """
+    img = np.ascontiguousarray(img)
+    h = hashlib.sha256()
+    h.update(f"{version}|{img.dtype.str}|{img.shape}|".encode())
+    h.update(img)
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU + TTL result cache with an optional on-disk tier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = MAX_ENTRIES,
+        max_bytes: int = MAX_BYTES,
+        ttl_s: float = TTL_S,
+        disk_dir: Optional[str] = None,
+        max_disk_entries: int = MAX_DISK_ENTRIES,
+        prune_every: int = DISK_PRUNE_EVERY
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self.prune_every = max(1, prune_every)
+        self._disk_writes = 0
+        self._prune_lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (created, serialised result)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.prune_disk()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_s is not None and time.time() - created > self.ttl_s
+
+    def _store(self, key: str, created: float, payload: bytes) -> None:
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key)[1])
+        if len(payload) > self.max_bytes:
+            return
+        self._entries[key] = (created, payload)
+        self._bytes += len(payload)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str):
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                record = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        if self._expired(record["created"]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return record["created"], json.dumps(record["result"]).encode()
+
+    def _disk_put(self, key: str, created: float, result: Dict) -> None:
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"created": created, "result": result}, f)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Cached result for key, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                self._bytes -= len(self._entries.pop(key)[1])
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+
+        if self.disk_dir:
+            entry = self._disk_get(key)
+            if entry is not None:
+                with self._lock:
+                    self._store(key, *entry)
+                    self.disk_hits += 1
+                return json.loads(entry[1])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, result: Dict) -> None:
+        """
+        Store a JSON-serialisable result.
+        """
+        created = time.time()
+        payload = json.dumps(result).encode()
+        with self._lock:
+            self._store(key, created, payload)
+        if self.disk_dir:
+            try:
+                self._disk_put(key, created, result)
+            except OSError as e:
+                print(f"[WARNING] Could not write result cache entry: {e}")
+                return
+            with self._lock:
+                self._disk_writes += 1
+                due = self._disk_writes % self.prune_every == 0
+            if due:
+                self.prune_disk()
+
+    def prune_disk(self) -> int:
+        """
+        Remove expired on-disk entries and the oldest beyond max_disk_entries.
+
+        Runs on creation and every prune_every writes; a prune already in
+        progress (another thread) makes this call a no-op.
+        """
+        if not self.disk_dir or not self._prune_lock.acquire(blocking=False):
+            return 0
+        try:
+            return self._prune_disk()
+        finally:
+            self._prune_lock.release()
+
+    def _prune_disk(self) -> int:
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        files.append((os.path.getmtime(path), path))
+                    except OSError:
+                        pass
+        files.sort()
+        now = time.time()
+        excess = len(files) - self.max_disk_entries
+        removed = 0
+        for i, (mtime, path) in enumerate(files):
+            if i < excess or (self.ttl_s is not None and now - mtime > self.ttl_s):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses
+            }
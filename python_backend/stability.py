@@ -0,0 +1,141 @@
+"""
+Resampling-based cluster stability for 07_cluster_interpreter.py.
+
+Each round refits a clustering on a random subsample of the cached PCA
+projection and compares the refit with the reference labels: per-cluster Jaccard
+(best-matching refit cluster, Hennig 2007) and overall ARI. Rounds run in
+parallel worker processes on a fixed seed schedule, so results do not depend
+on the number of workers, and stop early once every cluster's mean Jaccard
+has a standard error below the tolerance.
+
+The refit is KMeans with as many clusters as the reference labels unless a
+different refit(X, n_clusters, seed) -> labels is passed. KMeans scores how
+reproducible the partition is as a centroid partition, which understates the
+stability of labels from a density or linkage method (e.g. DBSCAN clusters
+that are not convex); pass a matching refit for those.
+"""
+
+from typing import Callable, Dict
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import adjusted_rand_score
+
+from kmeans_selection import make_kmeans
+
+MAX_BOOTSTRAPS = 48
+MIN_BOOTSTRAPS = 16
+ROUND_SIZE = 8
+SUBSAMPLE_FRACTION = 0.8
+MAX_SUBSAMPLE = 20_000
+TOLERANCE = 0.01
+
+
+def _clusterwise_jaccard(ref: np.ndarray, new: np.ndarray, clusters: np.ndarray) -> np.ndarray:
+    """
+    Jaccard of each reference cluster with its best-matching new cluster.
+    """
+    new_values, new_codes = np.unique(new, return_inverse=True)
+    new_sizes = np.bincount(new_codes, minlength=len(new_values))
+    jaccard = np.full(len(clusters), np.nan)
+
+    for i, c in enumerate(clusters):
+        members = ref == c
+        size = members.sum()
+        if size == 0:
+            continue
+        overlap = np.bincount(new_codes[members], minlength=len(new_values))
+        jaccard[i] = np.max(overlap / (size + new_sizes - overlap))
+
+    return jaccard
+
+
+def kmeans_refit(X: np.ndarray, n_clusters: int, seed: int) -> np.ndarray:
+    """
+    Default refit: KMeans (mini-batch for large samples) with n_clusters.
+    """
+    return make_kmeans(n_clusters, len(X), n_init=3, random_state=seed).fit_predict(X)
+
+
+def _resample_run(X, ref_labels: np.ndarray, clusters: np.ndarray, sample_size: int, seed: int, refit: Callable):
+    rng = np.random.default_rng(seed)
+    idx = np.sort(rng.choice(len(X), size=sample_size, replace=False))
+    ref = ref_labels[idx]
+
+    new = np.asarray(refit(np.asarray(X[idx]), len(clusters), seed))
+
+    clustered = ref >= 0
+    return (
+        _clusterwise_jaccard(ref, new, clusters),
+        adjusted_rand_score(ref[clustered], new[clustered])
+    )
+
+
+def bootstrap_stability(
+    X: np.ndarray,
+    labels: np.ndarray,
+    max_bootstraps: int = MAX_BOOTSTRAPS,
+    min_bootstraps: int = MIN_BOOTSTRAPS,
+    tolerance: float = TOLERANCE,
+    max_subsample: int = MAX_SUBSAMPLE,
+    n_jobs: int = -1,
+    random_state: int = 42,
+    refit: Callable[[np.ndarray, int, int], np.ndarray] = kmeans_refit
+) -> Dict:
+    """
+    Estimate per-cluster stability of labels (noise label -1 is ignored).
+
+    refit(X_sample, n_clusters, seed) clusters each subsample (KMeans by
+    default, see the module docstring); it must be picklable for n_jobs != 1.
+    Subsamples hold at least as many rows as there are clusters.
+
+    Returns:
+        dict: {
+            "clusters": cluster ids,
+            "jaccard_mean", "jaccard_std": per-cluster arrays,
+            "ari_mean", "ari_std": float,
+            "n_bootstraps": int,
+            "converged": bool
+        }
+    """
+    labels = np.asarray(labels)
+    if len(labels) != len(X):
+        raise ValueError(f"Got {len(labels)} labels for {len(X)} rows")
+    clusters = np.unique(labels[labels >= 0])
+    if len(clusters) == 0:
+        raise ValueError("No clustered rows to resample (every label is noise)")
+    sample_size = int(min(max_subsample, SUBSAMPLE_FRACTION * len(X)))
+    # A refit needs at least one row per cluster
+    sample_size = min(len(X), max(sample_size, len(clusters)))
+    seeds = random_state + np.arange(max_bootstraps)
+
+    jaccards, aris = [], []
+    converged = False
+
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for start in range(0, max_bootstraps, ROUND_SIZE):
+            results = parallel(
+                delayed(_resample_run)(X, labels, clusters, sample_size, int(seed), refit)
+                for seed in seeds[start:start + ROUND_SIZE]
+            )
+            for jac, ari in results:
+                jaccards.append(jac)
+                aris.append(ari)
+
+            if len(jaccards) >= min_bootstraps:
+                stack = np.vstack(jaccards)
+                std_err = np.nanstd(stack, axis=0) / np.sqrt(np.sum(~np.isnan(stack), axis=0))
+                if np.all(std_err < tolerance):
+                    converged = True
+                    break
+
+    stack = np.vstack(jaccards)
+    return {
+        "clusters": clusters,
+        "jaccard_mean": np.nanmean(stack, axis=0),
+        "jaccard_std": np.nanstd(stack, axis=0),
+        "ari_mean": float(np.mean(aris)),
+        "ari_std": float(np.std(aris)),
+        "n_bootstraps": len(jaccards),
+        "converged": converged
+    }
@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IvfIndex  # noqa: E402
+
+DIM = 32
+
+
+def stored_ids(root):
+    reloaded = IvfIndex.load(root)
+    return np.sort(np.concatenate([seg.ids for seg in reloaded._segments]))
+
+
+def test_add_right_after_save_snapshot_is_kept(tmp_path):
+    rng = np.random.default_rng(0)
+    index = IvfIndex(rng.normal(size=(8, DIM)), nprobe=8)
+    index.add(rng.normal(size=(100, DIM)))
+
+    # An add() from another thread landing between the snapshot and the
+    # pending bookkeeping of save()
+    snapshot = index._snapshot
+
+    def racing_snapshot():
+        taken = snapshot()
+        index.add(rng.normal(size=(5, DIM)))
+        return taken
+
+    index._snapshot = racing_snapshot
+    index.save(str(tmp_path))
+    del index._snapshot
+
+    assert len(index) == 105
+    assert len(stored_ids(str(tmp_path))) == 100
+    index.save(str(tmp_path))
+    assert np.array_equal(stored_ids(str(tmp_path)), np.arange(105))
+
+
+def test_concurrent_adds_during_saves(tmp_path):
+    rng = np.random.default_rng(1)
+    index = IvfIndex(rng.normal(size=(8, DIM)), nprobe=8)
+    index.add(rng.normal(size=(500, DIM)))
+
+    stop = threading.Event()
+    added = []
+
+    def writer():
+        local = np.random.default_rng(2)
+        while not stop.is_set():
+            added.extend(index.add(local.normal(size=(3, DIM))))
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(20):
+            index.save(str(tmp_path))
+    finally:
+        stop.set()
+        thread.join()
+    index.save(str(tmp_path))
+
+    expected = 500 + len(added)
+    assert len(index) == expected
+    assert np.array_equal(stored_ids(str(tmp_path)), np.arange(expected))
@@ -0,0 +1,45 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference  # noqa: E402
+
+
+class BlockingAnalyzer:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def run_preprocessing_pipeline(self, image_path, heatmap):
+        self.release.wait(5)
+        return {"input": image_path}
+
+    def analyze_prepared(self, prepared):
+        return [{"source": p["input"]} for p in prepared]
+
+
+def test_timed_out_request_holds_its_slot_until_the_work_finishes(monkeypatch):
+    analyzer = BlockingAnalyzer()
+    monkeypatch.setattr(inference, "get_analyzer", lambda: analyzer)
+    monkeypatch.setattr(inference, "MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(inference, "MICRO_BATCHING", False)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await inference.analyze_xray_async("a", timeout=0.05)
+        # the abandoned decode is still running, so no slot is free
+        assert inference._in_flight_semaphore().locked()
+        with pytest.raises(asyncio.TimeoutError):
+            await inference.analyze_xray_async("b", timeout=0.05)
+
+        analyzer.release.set()
+        return await inference.analyze_xray_async("c", timeout=5)
+
+    try:
+        assert asyncio.run(scenario()) == {"source": "c"}
+    finally:
+        analyzer.release.set()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knn_graph import build_knn_graph, dbscan_from_graph, radius_graph  # noqa: E402
+
+
+def test_duplicate_rows_stay_neighbours():
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(40, 4)) * 10
+    X = np.vstack([base, base, base])
+    graph = build_knn_graph(X, k=5, n_jobs=1)
+
+    dist = radius_graph(graph, eps=0.5)
+    assert dist.nnz == 2 * len(X)
+    assert (dist != dist.T).nnz == 0
+
+    expected = DBSCAN(eps=0.5, min_samples=3).fit_predict(X)
+    np.testing.assert_array_equal(dbscan_from_graph(graph, 0.5, 3) >= 0, expected >= 0)
@@ -0,0 +1,34 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from micro_batcher import MicroBatcher  # noqa: E402
+
+
+def test_results_routed_to_each_caller():
+    batcher = MicroBatcher(lambda items: [i * 2 for i in items], max_batch=4, max_wait_ms=1)
+    futures = [batcher.submit(i) for i in range(10)]
+    assert [f.result(timeout=5) for f in futures] == [i * 2 for i in range(10)]
+    batcher.close()
+
+
+def test_base_exception_resolves_every_pending_future():
+    release = threading.Event()
+
+    def process_batch(items):
+        release.wait(5)
+        raise SystemExit("worker stopping")
+
+    batcher = MicroBatcher(process_batch, max_batch=1, max_wait_ms=0)
+    running = batcher.submit(0)
+    queued = [batcher.submit(i) for i in range(1, 4)]
+    release.set()
+
+    for future in [running] + queued:
+        assert isinstance(future.exception(timeout=5), SystemExit)
+    with pytest.raises(RuntimeError):
+        batcher.submit(99)
@@ -0,0 +1,32 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache  # noqa: E402
+
+
+def disk_files(root):
+    return [name for _, _, names in os.walk(root) for name in names if name.endswith(".json")]
+
+
+def test_disk_tier_stays_bounded(tmp_path):
+    cache = ResultCache(max_entries=4, disk_dir=str(tmp_path), max_disk_entries=20, prune_every=5)
+    for i in range(200):
+        cache.put(f"{i:064x}", {"i": i})
+        assert len(disk_files(tmp_path)) <= 20 + 5
+
+    # The newest entries survive pruning
+    assert cache.get(f"{199:064x}") == {"i": 199}
+
+
+def test_expired_disk_entries_pruned_on_startup(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path), ttl_s=0.05)
+    for i in range(10):
+        cache.put(f"{i:064x}", {"i": i})
+    assert len(disk_files(tmp_path)) == 10
+
+    time.sleep(0.1)
+    ResultCache(disk_dir=str(tmp_path), ttl_s=0.05)
+    assert disk_files(tmp_path) == []
@@ -0,0 +1,534 @@
+import { spawn, type ChildProcessWithoutNullStreams } from "child_process";
+import { createInterface } from "readline";
+import os from "os";
+import path from "path";
+import { log } from "./log";
+
+/**
+ * Pool of long-lived Python inference workers (python_backend/inference_worker.py).
+ *
+ * Each worker loads TensorFlow and the model artifacts once and then answers
+ * JSON-lines requests on stdin/stdout, so a request only pays for the analysis.
+ * Uploaded images are streamed to the worker as a raw payload right after the
+ * request's header line and decoded from memory, without a temp file.
+ * Requests go to the ready worker with the fewest in-flight requests and wait
+ * in a queue when every worker is at maxInFlight. Workers are pinged
+ * periodically; one that exits or misses a health check is killed, its
+ * pending requests are failed, and it is respawned with backoff. A request
+ * that times out is failed for the caller, but keeps its in-flight slot until
+ * the worker actually replies (or dies), so a worker still busy with it is
+ * not handed more work than maxInFlight.
+ * metrics() collects each worker's pipeline metrics and renders them, with a
+ * worker label, in the Prometheus text format.
+ *
+ * With EXODIA_FORK_SERVER=1 the pool first starts one fork server that does
+ * the heavy imports (and, without TensorFlow, loads the models) once; each
+ * worker is then a lightweight launcher that the server forks a copy-on-write
+ * worker onto, so (re)spawning a worker skips interpreter and import startup.
+ * TensorFlow cannot be used before fork(), so with it installed each forked
+ * worker still loads and warms up its own model; only the imports are shared
+ * (see EXODIA_PRELOAD in inference_worker.py).
+ */
+
+export interface AnalyzerPoolOptions {
+  size: number;
+  pythonBin: string;
+  workerScript: string;
+  maxInFlight: number;
+  requestTimeoutMs: number;
+  healthIntervalMs: number;
+  healthTimeoutMs: number;
+  startupTimeoutMs: number;
+  respawnDelayMs: number;
+  maxRespawnDelayMs: number;
+  forkServer: boolean;
+  socketPath: string;
+}
+
+export interface WorkerStatus {
+  id: number;
+  pid: number | undefined;
+  state: WorkerState;
+  inFlight: number;
+  served: number;
+  failed: number;
+  restarts: number;
+  lastPingMs: number | null;
+}
+
+type WorkerState = "starting" | "ready" | "dead";
+
+interface Pending {
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+  isAnalysis: boolean;
+  // Caller already rejected; the entry stays until the worker replies
+  timedOut: boolean;
+}
+
+interface MetricFamily {
+  name: string;
+  type: string;
+  help: string;
+  samples: [string, Record<string, string>, number][];
+}
+
+interface QueuedRequest {
+  message: Record<string, unknown>;
+  payload?: Buffer;
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  deadline: number;
+  timer: NodeJS.Timeout;
+}
+
+const forkServer = process.env.EXODIA_FORK_SERVER === "1" && process.platform !== "win32";
+
+const defaultOptions: AnalyzerPoolOptions = {
+  size: parseInt(process.env.EXODIA_WORKERS || "2", 10),
+  pythonBin: process.env.EXODIA_PYTHON || "python3",
+  workerScript: path.resolve(process.cwd(), "python_backend", "inference_worker.py"),
+  maxInFlight: parseInt(process.env.EXODIA_WORKER_MAX_IN_FLIGHT || "4", 10),
+  requestTimeoutMs: parseInt(process.env.EXODIA_REQUEST_TIMEOUT_MS || "60000", 10),
+  healthIntervalMs: 10_000,
+  healthTimeoutMs: 5_000,
+  startupTimeoutMs: 180_000,
+  // A forked worker skips interpreter and import startup, so it can be retried sooner
+  respawnDelayMs: forkServer ? 100 : 1000,
+  maxRespawnDelayMs: 30_000,
+  forkServer,
+  socketPath: path.join(os.tmpdir(), `exodia-fork-${process.pid}.sock`),
+};
+
+function logPythonStderr(child: ChildProcessWithoutNullStreams, name: string): void {
+  createInterface({ input: child.stderr }).on("line", (line) => {
+    if (line.startsWith("[ERROR]") || line.startsWith("[WARNING]") || line.startsWith("Traceback")) {
+      log(`${name}: ${line}`, "analyzer");
+    }
+  });
+}
+
+class PythonWorker {
+  readonly id: number;
+  state: WorkerState = "starting";
+  inFlight = 0;
+  served = 0;
+  failed = 0;
+  restarts = 0;
+  lastPingMs: number | null = null;
+
+  private child: ChildProcessWithoutNullStreams | null = null;
+  private pending = new Map<string, Pending>();
+  private nextId = 0;
+  private healthTimer: NodeJS.Timeout | null = null;
+  private startupTimer: NodeJS.Timeout | null = null;
+  private stopped = false;
+
+  constructor(
+    id: number,
+    private readonly options: AnalyzerPoolOptions,
+    private readonly onAvailable: () => void,
+  ) {
+    this.id = id;
+  }
+
+  get pid(): number | undefined {
+    return this.child?.pid;
+  }
+
+  start(): void {
+    this.state = "starting";
+    const args = this.options.forkServer
+      ? ["-u", this.options.workerScript, "--connect", this.options.socketPath]
+      : ["-u", this.options.workerScript];
+    const child = spawn(this.options.pythonBin, args, {
+      cwd: path.dirname(this.options.workerScript),
+      env: { ...process.env, PYTHONUNBUFFERED: "1" },
+      stdio: ["pipe", "pipe", "pipe"],
+    });
+    this.child = child;
+
+    // Events from a previous, already replaced child are ignored
+    const current = () => this.child === child;
+
+    createInterface({ input: child.stdout }).on("line", (line) => {
+      if (current()) this.onLine(line);
+    });
+    logPythonStderr(child, `worker ${this.id}`);
+
+    child.stdin.on("error", (err) => {
+      if (current()) this.fail(`stdin closed: ${err.message}`);
+    });
+    child.on("error", (err) => {
+      if (current()) this.fail(`spawn failed: ${err.message}`);
+    });
+    child.on("exit", (code, signal) => {
+      if (current()) this.fail(`exited (code ${code}, signal ${signal})`);
+    });
+
+    this.startupTimer = setTimeout(
+      () => this.fail("did not become ready in time"),
+      this.options.startupTimeoutMs,
+    );
+  }
+
+  stop(): void {
+    this.stopped = true;
+    this.clearTimers();
+    this.child?.kill();
+  }
+
+  request(message: Record<string, unknown>, timeoutMs: number, payload?: Buffer): Promise<any> {
+    if (!this.child || this.state !== "ready") {
+      return Promise.reject(new Error(`analysis worker ${this.id} is not ready`));
+    }
+    const child = this.child;
+    const id = String(++this.nextId);
+    const isAnalysis = message.op === "analyze";
+    if (isAnalysis) this.inFlight++;
+
+    return new Promise((resolve, reject) => {
+      const timer = setTimeout(() => this.timeout(id, timeoutMs), timeoutMs);
+      this.pending.set(id, { resolve, reject, timer, isAnalysis, timedOut: false });
+
+      // Header and payload are written back to back, so no other request
+      // can be interleaved between them
+      const header = payload ? { ...message, id, bytes: payload.length } : { ...message, id };
+      child.stdin.write(JSON.stringify(header) + "\n");
+      if (payload) child.stdin.write(payload);
+    });
+  }
+
+  private finished(ok: boolean): void {
+    this.inFlight--;
+    if (ok) this.served++;
+    else this.failed++;
+    this.onAvailable();
+  }
+
+  private timeout(id: string, timeoutMs: number): void {
+    const pending = this.pending.get(id);
+    if (!pending) return;
+    // The worker is still running the request, so its slot is only released
+    // by the reply (or by the worker dying), not here
+    pending.timedOut = true;
+    pending.reject(new Error(`worker ${this.id} timed out after ${timeoutMs}ms`));
+  }
+
+  private settle(id: string, error: Error | null, value?: unknown): void {
+    const pending = this.pending.get(id);
+    if (!pending) return;
+    this.pending.delete(id);
+    clearTimeout(pending.timer);
+    if (pending.isAnalysis) this.finished(!error && !pending.timedOut);
+    if (pending.timedOut) return;
+    if (error) pending.reject(error);
+    else pending.resolve(value);
+  }
+
+  private onLine(line: string): void {
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      log(`worker ${this.id}: unexpected output: ${line}`, "analyzer");
+      return;
+    }
+
+    if (message.op === "ready") {
+      if (this.startupTimer) clearTimeout(this.startupTimer);
+      this.state = "ready";
+      log(`worker ${this.id} ready (pid ${message.pid}, ${message.mode}, loaded in ${message.load_ms}ms)`, "analyzer");
+      this.healthTimer = setInterval(() => this.healthCheck(), this.options.healthIntervalMs);
+      this.onAvailable();
+      return;
+    }
+
+    if (message.id == null) return;
+    this.settle(
+      String(message.id),
+      message.ok ? null : new Error(message.error || "analysis failed"),
+      message.result,
+    );
+  }
+
+  private async healthCheck(): Promise<void> {
+    const start = Date.now();
+    try {
+      await this.request({ op: "ping" }, this.options.healthTimeoutMs);
+      this.lastPingMs = Date.now() - start;
+    } catch {
+      this.fail("missed health check");
+    }
+  }
+
+  private clearTimers(): void {
+    if (this.healthTimer) clearInterval(this.healthTimer);
+    if (this.startupTimer) clearTimeout(this.startupTimer);
+    this.healthTimer = null;
+    this.startupTimer = null;
+  }
+
+  private fail(reason: string): void {
+    if (this.state === "dead") return;
+    this.state = "dead";
+    this.clearTimers();
+
+    const error = new Error(`analysis worker ${this.id} ${reason}`);
+    for (const id of Array.from(this.pending.keys())) this.settle(id, error);
+
+    const child = this.child;
+    this.child = null;
+    if (child && child.exitCode === null) child.kill("SIGKILL");
+    if (this.stopped) return;
+
+    const delay = Math.min(this.options.respawnDelayMs * 2 ** this.restarts, this.options.maxRespawnDelayMs);
+    this.restarts++;
+    log(`worker ${this.id} ${reason}; respawning in ${delay}ms`, "analyzer");
+    setTimeout(() => {
+      if (!this.stopped) this.start();
+    }, delay);
+  }
+
+  status(): WorkerStatus {
+    return {
+      id: this.id,
+      pid: this.pid,
+      state: this.state,
+      inFlight: this.inFlight,
+      served: this.served,
+      failed: this.failed,
+      restarts: this.restarts,
+      lastPingMs: this.lastPingMs,
+    };
+  }
+}
+
+export class AnalyzerPool {
+  private readonly options: AnalyzerPoolOptions;
+  private readonly workers: PythonWorker[] = [];
+  private readonly queue: QueuedRequest[] = [];
+  private started = false;
+  private stopped = false;
+  private forkServer: ChildProcessWithoutNullStreams | null = null;
+  private forkServerRestarts = 0;
+
+  constructor(options: Partial<AnalyzerPoolOptions> = {}) {
+    this.options = { ...defaultOptions, ...options };
+  }
+
+  start(): void {
+    if (this.started) return;
+    this.started = true;
+    if (this.options.forkServer) {
+      this.startForkServer();
+    } else {
+      this.startWorkers();
+    }
+  }
+
+  private startWorkers(): void {
+    for (let i = 0; i < Math.max(1, this.options.size); i++) {
+      const worker = new PythonWorker(i, this.options, () => this.drain());
+      this.workers.push(worker);
+      worker.start();
+    }
+    log(`starting ${this.workers.length} analysis worker(s)`, "analyzer");
+  }
+
+  // Workers are only launched once the server has loaded the models; after a
+  // server restart they reconnect through their normal respawn backoff
+  private startForkServer(): void {
+    const child = spawn(
+      this.options.pythonBin,
+      ["-u", this.options.workerScript, "--fork-server", this.options.socketPath],
+      {
+        cwd: path.dirname(this.options.workerScript),
+        env: { ...process.env, PYTHONUNBUFFERED: "1" },
+        stdio: ["pipe", "pipe", "pipe"],
+      },
+    );
+    this.forkServer = child;
+
+    createInterface({ input: child.stdout }).on("line", (line) => {
+      let message: any;
+      try {
+        message = JSON.parse(line);
+      } catch {
+        return;
+      }
+      if (message.op !== "ready") return;
+      this.forkServerRestarts = 0;
+      log(`fork server ready (pid ${message.pid}, preloaded ${message.preload} in ${message.load_ms}ms)`, "analyzer");
+      if (this.workers.length === 0) this.startWorkers();
+    });
+    logPythonStderr(child, "fork server");
+
+    child.stdin.on("error", () => {});
+    child.on("error", (err) => log(`fork server failed to start: ${err.message}`, "analyzer"));
+    child.on("exit", (code, signal) => {
+      if (this.forkServer !== child) return;
+      this.forkServer = null;
+      if (this.stopped) return;
+      const delay = Math.min(1000 * 2 ** this.forkServerRestarts, this.options.maxRespawnDelayMs);
+      this.forkServerRestarts++;
+      log(`fork server exited (code ${code}, signal ${signal}); restarting in ${delay}ms`, "analyzer");
+      setTimeout(() => {
+        if (!this.stopped) this.startForkServer();
+      }, delay);
+    });
+  }
+
+  stop(): void {
+    this.stopped = true;
+    this.forkServer?.kill();
+    this.forkServer = null;
+    for (const worker of this.workers) worker.stop();
+    for (const queued of this.queue.splice(0)) {
+      clearTimeout(queued.timer);
+      queued.reject(new Error("analyzer pool stopped"));
+    }
+  }
+
+  analyzeFile(imagePath: string, timeoutMs = this.options.requestTimeoutMs, heatmap = true): Promise<any> {
+    return this.submit({ op: "analyze", path: imagePath, heatmap }, timeoutMs);
+  }
+
+  analyzeBuffer(image: Buffer, timeoutMs = this.options.requestTimeoutMs, heatmap = true): Promise<any> {
+    return this.submit({ op: "analyze", heatmap }, timeoutMs, image);
+  }
+
+  health() {
+    const workers = this.workers.map((w) => w.status());
+    return {
+      status: workers.some((w) => w.state === "ready") ? "ok" : "unavailable",
+      queued: this.queue.length,
+      workers,
+      ...(this.options.forkServer
+        ? { forkServer: { pid: this.forkServer?.pid, restarts: this.forkServerRestarts } }
+        : {}),
+    };
+  }
+
+  async metrics(timeoutMs = this.options.healthTimeoutMs): Promise<string> {
+    const families = new Map<string, MetricFamily>();
+    const add = (family: MetricFamily, labels: Record<string, string>) => {
+      let merged = families.get(family.name);
+      if (!merged) {
+        merged = { ...family, samples: [] };
+        families.set(family.name, merged);
+      }
+      for (const [name, sampleLabels, value] of family.samples) {
+        merged.samples.push([name, { ...labels, ...sampleLabels }, value]);
+      }
+    };
+
+    const ready = this.workers.filter((w) => w.state === "ready");
+    const replies = await Promise.allSettled(
+      ready.map((w) => w.request({ op: "metrics" }, timeoutMs)),
+    );
+    replies.forEach((reply, i) => {
+      if (reply.status !== "fulfilled") return;
+      for (const family of reply.value as MetricFamily[]) {
+        add(family, { worker: String(ready[i].id) });
+      }
+    });
+
+    const statuses = this.workers.map((w) => w.status());
+    add(
+      {
+        name: "exodia_pool_workers",
+        type: "gauge",
+        help: "Analysis workers by state",
+        samples: (["starting", "ready", "dead"] as WorkerState[]).map((state) => [
+          "exodia_pool_workers",
+          { state },
+          statuses.filter((w) => w.state === state).length,
+        ]),
+      },
+      {},
+    );
+    add(
+      {
+        name: "exodia_pool_queued",
+        type: "gauge",
+        help: "Requests waiting for a free worker",
+        samples: [["exodia_pool_queued", {}, this.queue.length]],
+      },
+      {},
+    );
+    add(
+      {
+        name: "exodia_pool_worker_restarts",
+        type: "counter",
+        help: "Times each worker has been respawned",
+        samples: statuses.map((w) => ["exodia_pool_worker_restarts", { worker: String(w.id) }, w.restarts]),
+      },
+      {},
+    );
+
+    return renderMetrics(Array.from(families.values()));
+  }
+
+  private submit(message: Record<string, unknown>, timeoutMs: number, payload?: Buffer): Promise<any> {
+    this.start();
+    return new Promise((resolve, reject) => {
+      const queued: QueuedRequest = {
+        message,
+        payload,
+        resolve,
+        reject,
+        deadline: Date.now() + timeoutMs,
+        timer: setTimeout(() => {
+          const index = this.queue.indexOf(queued);
+          if (index === -1) return;
+          this.queue.splice(index, 1);
+          reject(new Error("timed out waiting for an analysis worker"));
+        }, timeoutMs),
+      };
+      this.queue.push(queued);
+      this.drain();
+    });
+  }
+
+  private pickWorker(): PythonWorker | undefined {
+    let best: PythonWorker | undefined;
+    for (const worker of this.workers) {
+      if (worker.state !== "ready" || worker.inFlight >= this.options.maxInFlight) continue;
+      if (!best || worker.inFlight < best.inFlight) best = worker;
+    }
+    return best;
+  }
+
+  private drain(): void {
+    while (this.queue.length > 0) {
+      const worker = this.pickWorker();
+      if (!worker) return;
+
+      const queued = this.queue.shift()!;
+      clearTimeout(queued.timer);
+      const remaining = Math.max(1, queued.deadline - Date.now());
+      worker.request(queued.message, remaining, queued.payload).then(queued.resolve, queued.reject);
+    }
+  }
+}
+
+function escapeLabel(value: string): string {
+  return value.replace(/\\/g, "\\\\").replace(/"/g, '\\"').replace(/\n/g, "\\n");
+}
+
+function renderMetrics(families: MetricFamily[]): string {
+  const lines: string[] = [];
+  for (const family of families) {
+    lines.push(`# HELP ${family.name} ${family.help}`);
+    lines.push(`# TYPE ${family.name} ${family.type}`);
+    for (const [name, labels, value] of family.samples) {
+      const pairs = Object.entries(labels).map(([k, v]) => `${k}="${escapeLabel(String(v))}"`);
+      lines.push(`${name}${pairs.length ? `{${pairs.join(",")}}` : ""} ${value}`);
+    }
+  }
+  return lines.join("\n") + "\n";
+}
+
+export const analyzerPool = new AnalyzerPool();
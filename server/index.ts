@@ -2,6 +2,8 @@ import express, { type Request, Response, NextFunction } from "express";
 import { registerRoutes } from "./routes";
 import { serveStatic } from "./static";
 import { createServer } from "http";
+import { analyzerPool } from "./analyzer-pool";
+import { log } from "./log";
 
 const app = express();
 const httpServer = createServer(app);
@@ -22,17 +24,6 @@ app.use(
 
 app.use(express.urlencoded({ extended: false }));
 
-export function log(message: string, source = "express") {
-  const formattedTime = new Date().toLocaleTimeString("en-US", {
-    hour: "numeric",
-    minute: "2-digit",
-    second: "2-digit",
-    hour12: true,
-  });
-
-  console.log(`${formattedTime} [${source}] ${message}`);
-}
-
 app.use((req, res, next) => {
   const start = Date.now();
   const path = req.path;
@@ -96,3 +87,22 @@ app.use((req, res, next) => {
     },
   );
 })();
+
+// Stop taking connections, let in-flight requests finish, then stop the
+// analysis workers; the process exits once nothing is left running
+const SHUTDOWN_TIMEOUT_MS = parseInt(process.env.EXODIA_SHUTDOWN_TIMEOUT_MS || "10000", 10);
+
+function shutdown(signal: NodeJS.Signals) {
+  log(`${signal} received, shutting down`);
+  httpServer.close(() => analyzerPool.stop());
+  httpServer.closeIdleConnections();
+  // Dev-only handles (the Vite watcher) would otherwise keep the process up
+  setTimeout(() => {
+    analyzerPool.stop();
+    process.exit(0);
+  }, SHUTDOWN_TIMEOUT_MS).unref();
+}
+
+process.once("SIGTERM", shutdown);
+process.once("SIGINT", shutdown);
+process.once("exit", () => analyzerPool.stop());
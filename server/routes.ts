@@ -1,6 +1,10 @@
 import type { Express } from "express";
+import express from "express";
 import { createServer, type Server } from "http";
 import { storage } from "./storage";
+import { analyzerPool } from "./analyzer-pool";
+
+const MAX_UPLOAD = process.env.EXODIA_MAX_UPLOAD || "64mb";
 
 export async function registerRoutes(
   httpServer: Server,
@@ -12,5 +16,47 @@ export async function registerRoutes(
   // use storage to perform CRUD operations on the storage interface
   // e.g. storage.insertUser(user) or storage.getUserByUsername(username)
 
+  // Python workers load the models once at boot; requests only pay for analysis.
+  // The pool is stopped by the shutdown handler in index.ts
+  analyzerPool.start();
+
+  // The X-ray is sent as the raw request body (DICOM, PNG or JPEG) and handed
+  // to a worker in memory, without touching disk. ?heatmap=0 skips Grad-CAM
+  app.post(
+    "/api/analyze",
+    express.raw({
+      type: ["application/dicom", "application/octet-stream", "image/*"],
+      limit: MAX_UPLOAD,
+    }),
+    async (req, res, next) => {
+      if (!Buffer.isBuffer(req.body) || req.body.length === 0) {
+        return res.status(400).json({ message: "Expected an X-ray image as the request body" });
+      }
+
+      try {
+        const heatmap = req.query.heatmap !== "0" && req.query.heatmap !== "false";
+        const result = await analyzerPool.analyzeBuffer(req.body, undefined, heatmap);
+        res.json({ ...result, heatmapPoints: result.heatmap_regions });
+      } catch (err: any) {
+        next(Object.assign(err, { status: err.status || 502 }));
+      }
+    },
+  );
+
+  app.get("/api/health", (_req, res) => {
+    const health = analyzerPool.health();
+    res.status(health.status === "ok" ? 200 : 503).json(health);
+  });
+
+  // Prometheus scrape target: per-stage latencies, cache and batch counters
+  // and RSS from every ready worker, plus pool state
+  app.get("/api/metrics", async (_req, res, next) => {
+    try {
+      res.type("text/plain; version=0.0.4").send(await analyzerPool.metrics());
+    } catch (err) {
+      next(err);
+    }
+  });
+
   return httpServer;
 }